@@ -3,6 +3,7 @@ Admin routes for CPSC Regulation System
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 from app.models.auth_database import get_auth_db, UserRole
@@ -15,8 +16,12 @@ from app.models.schemas import (
 from app.auth.dependencies import get_current_active_user
 from app.auth.auth_service import AuthService
 from app.pipeline.data_pipeline import DataPipeline
+from app.pipeline.run_store import PIPELINE_STAGES
 from app.services.analysis_service import AnalysisService
 from app.services.clustering_service import ClusteringService
+from app.services.near_duplicate import find_near_duplicates
+from app.services.model_registry import model_registry
+from app.config import NEAR_DUPLICATE_THRESHOLD
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 auth_service = AuthService()
@@ -29,12 +34,25 @@ pipeline_status_global = {
     'state': 'idle',
     'current_step': None,
     'progress': 0,
-    'total_steps': 6,
+    'total_steps': len(PIPELINE_STAGES),
     'steps_completed': [],
     'error_message': None,
     'start_time': None,
     'end_time': None,
-    'stats': {}
+    'stats': {},
+    'volume_timings': [],
+    'stage_metrics': []
+}
+
+# Progress of the most recent analysis run
+analysis_status_global = {
+    'state': 'idle',
+    'level': None,
+    'workers': 1,
+    'progress': 0,
+    'units_done': 0,
+    'total_units': 0,
+    'error_message': None
 }
 
 @router.get("/stats", response_model=AdminStats)
@@ -48,7 +66,7 @@ async def get_admin_stats(
         user_stats = auth_service.get_user_stats(auth_db)
 
         # Get data statistics
-        total_sections = cfr_db.query(Section).count()
+        total_sections = cfr_db.query(Section).filter(Section.removed_at.is_(None)).count()
         total_chapters = cfr_db.query(Chapter).count()
         total_subchapters = cfr_db.query(Subchapter).count()
 
@@ -60,7 +78,8 @@ async def get_admin_stats(
             regular_users=user_stats["regular_users"],
             total_sections=total_sections,
             total_chapters=total_chapters,
-            total_subchapters=total_subchapters
+            total_subchapters=total_subchapters,
+            loaded_models=model_registry.stats()
         )
     except Exception as e:
         raise HTTPException(
@@ -192,14 +211,20 @@ async def run_pipeline(
     current_user = Depends(get_current_active_user),
     auth_db: Session = Depends(get_auth_db)
 ):
-    """Run the complete data pipeline"""
+    """Run the complete data pipeline, optionally resuming the last unfinished run"""
     global pipeline_instance, pipeline_status_global
     
+    if request.from_stage is not None and request.from_stage not in PIPELINE_STAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid stage: {request.from_stage}. Must be one of {', '.join(PIPELINE_STAGES)}"
+        )
+    
     def run_pipeline_task():
         global pipeline_instance, pipeline_status_global
         try:
-            pipeline_instance = DataPipeline(urls=request.urls)
-            pipeline_instance.run_full_pipeline()
+            pipeline_instance = DataPipeline(urls=request.urls, offline=request.offline, streaming=request.streaming)
+            pipeline_instance.run_full_pipeline(resume=request.resume, from_stage=request.from_stage)
             pipeline_status_global = pipeline_instance.get_status()
         except Exception as e:
             pipeline_status_global = {
@@ -217,12 +242,14 @@ async def run_pipeline(
         'state': 'running',
         'current_step': 'Starting',
         'progress': 0,
-        'total_steps': 6,
+        'total_steps': len(PIPELINE_STAGES),
         'steps_completed': [],
         'error_message': None,
         'start_time': None,
         'end_time': None,
-        'stats': {}
+        'stats': {},
+        'volume_timings': [],
+        'stage_metrics': []
     }
     
     # Log activity
@@ -267,7 +294,9 @@ async def reset_pipeline(
 
         # Reset CFR database only
         from app.models.cfr_database import reset_cfr_db
+        from app.services.embedding_store import embedding_store
         reset_cfr_db()
+        embedding_store.invalidate()
 
         # Clear data directories with proper error handling
         for directory in [DATA_DIR, OUTPUT_DIR, VISUALIZATIONS_DIR]:
@@ -316,13 +345,46 @@ async def reset_pipeline(
 @router.post("/analysis/run")
 async def run_analysis(
     level: str,
+    workers: int = 1,
+    persist_all: bool = False,
+    incremental: bool = False,
     current_user = Depends(get_current_active_user),
     auth_db: Session = Depends(get_auth_db),
     cfr_db: Session = Depends(get_cfr_db)
 ):
-    """Run analysis on specified level"""
+    """
+    Run analysis on specified level, optionally sharded across worker processes
+    
+    With incremental=true only pairs involving items added or changed since
+    the previous run are scored; the remaining pairs are carried over.
+    """
+    global analysis_status_global
+    
+    def report_progress(units_done: int, total_units: int):
+        analysis_status_global['units_done'] = units_done
+        analysis_status_global['total_units'] = total_units
+        analysis_status_global['progress'] = int(100 * units_done / total_units) if total_units else 100
+    
+    analysis_status_global = {
+        'state': 'running',
+        'level': level,
+        'workers': workers,
+        'incremental': incremental,
+        'progress': 0,
+        'units_done': 0,
+        'total_units': 0,
+        'error_message': None
+    }
+    
     try:
-        results = analysis_service.analyze_semantic_similarity(level, cfr_db)
+        # Run off the event loop so /admin/analysis/status can be polled meanwhile
+        results = await run_in_threadpool(
+            analysis_service.analyze_semantic_similarity,
+            level, cfr_db, workers=workers, progress_callback=report_progress,
+            persist_all=persist_all, incremental=incremental
+        )
+        analysis_status_global['state'] = 'completed'
+        analysis_status_global['progress'] = 100
 
         # Log activity
         auth_service.log_activity(
@@ -338,11 +400,42 @@ async def run_analysis(
             "results": results
         }
     except Exception as e:
+        analysis_status_global['state'] = 'error'
+        analysis_status_global['error_message'] = str(e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error running analysis: {str(e)}"
         )
 
+@router.get("/analysis/status")
+async def get_analysis_status(
+    current_user = Depends(get_current_active_user)
+):
+    """Get progress of the current or most recent analysis run"""
+    return analysis_status_global
+
+@router.get("/analysis/duplicates")
+async def get_text_duplicates(
+    threshold: float = None,
+    current_user = Depends(get_current_active_user),
+    cfr_db: Session = Depends(get_cfr_db)
+):
+    """Find sections with near-duplicate text using MinHash/LSH, without a pairwise run"""
+    try:
+        duplicates = await run_in_threadpool(
+            find_near_duplicates, cfr_db, threshold or NEAR_DUPLICATE_THRESHOLD
+        )
+        return {
+            "threshold": threshold or NEAR_DUPLICATE_THRESHOLD,
+            "total_pairs": len(duplicates),
+            "results": duplicates
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error finding duplicates: {str(e)}"
+        )
+
 @router.post("/clustering/run")
 async def run_clustering(
     level: str,
@@ -40,6 +40,7 @@ def get_sqlite_url(db_name):
 # Database configuration - Dual databases for clean separation
 AUTH_DATABASE_URL = get_sqlite_url('auth.db')
 CFR_DATABASE_URL = get_sqlite_url('cfr_data.db')
+EMBEDDING_CACHE_DATABASE_URL = get_sqlite_url('embedding_cache.db')  # Kept across CFR database resets
 
 # Legacy support - some old imports might still use DATABASE_URL
 DATABASE_URL = CFR_DATABASE_URL  # Deprecated - use CFR_DATABASE_URL or AUTH_DATABASE_URL
@@ -47,6 +48,19 @@ DATABASE_URL = CFR_DATABASE_URL  # Deprecated - use CFR_DATABASE_URL or AUTH_DAT
 # Embedding model configuration
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 EMBEDDING_DIMENSION = 384
+EMBEDDING_BACKEND = "torch"  # 'torch' (SentenceTransformer) or 'onnx' (onnxruntime, see services/onnx_embedding.py)
+EMBEDDING_ONNX_QUANTIZE = True  # Run the ONNX backend with dynamically quantized int8 weights
+EMBEDDING_MAX_SEQ_LENGTH = 256  # Tokens the model reads per text; longer texts are truncated
+EMBEDDING_TOKEN_BUDGET = None  # Padded tokens per embedding batch (None = sized from available memory)
+EMBEDDING_BYTES_PER_TOKEN = 64 * 1024  # Peak activation memory per padded token, used to size the budget
+EMBEDDING_MEMORY_FRACTION = 0.25  # Share of available memory an embedding batch may use
+EMBEDDING_MIN_TOKEN_BUDGET = 2048
+EMBEDDING_MAX_TOKEN_BUDGET = 65536
+EMBEDDING_MAX_BATCH_SIZE = 256  # Texts per batch, however short
+EMBEDDING_SORT_WINDOW = 8192  # Sections loaded and length-sorted together when embedding
+EMBEDDING_WORKERS = 1  # Processes encoding embeddings during ingest, each with its own model (None = one per CPU core)
+EMBEDDING_WORKER_THREADS = None  # Torch threads per embedding worker (None = CPU cores / workers)
+EMBEDDING_CACHE_ENABLED = True  # Reuse embeddings of previously seen texts (see services/embedding_cache.py)
 
 # Clustering configuration
 CLUSTERING_ALGORITHM = "kmeans"  # Only K-Means is supported
@@ -58,6 +72,16 @@ DEFAULT_N_CLUSTERS = 5  # Default number of clusters for K-Means
 SIMILARITY_THRESHOLD = 0.75
 OVERLAP_THRESHOLD = 0.80
 REDUNDANCY_THRESHOLD = 0.85
+SIMILARITY_TILE_MEMORY_MB = 64  # Score block size for all-pairs similarity
+SIMILARITY_WRITE_CHUNK_SIZE = 5000  # Rows per bulk INSERT of similarity results
+SIMILARITY_RUNS_TO_KEEP = 1  # Completed analysis runs retained per level
+SIMILARITY_INCREMENTAL_MAX_FRACTION = 0.5  # Above this share of changed items, rerun in full
+
+# Text near-duplicate detection (MinHash + LSH)
+NEAR_DUPLICATE_THRESHOLD = 0.9  # Minimum Jaccard similarity of section-text shingles
+NEAR_DUPLICATE_SHINGLE_SIZE = 5  # Words per shingle
+MINHASH_NUM_PERM = 128  # Signature length
+LSH_BANDS = 32  # Bands of MINHASH_NUM_PERM / LSH_BANDS rows; more bands = higher recall
 
 # RAG configuration
 TOP_K_RESULTS = 10
@@ -65,10 +89,43 @@ LLM_MODEL = "sentence-transformers/all-MiniLM-L6-v2"  # For embeddings
 CHUNK_SIZE = 512
 CHUNK_OVERLAP = 50
 
+# Approximate nearest-neighbour index for section search
+ANN_INDEX_TYPE = "ivf_flat"  # 'ivf_flat', or 'exact' to disable the index
+ANN_MIN_ITEMS = 2000  # Below this many sections exact search is fast enough
+ANN_N_LISTS = None  # Number of IVF lists (default: ~4 * sqrt(n))
+ANN_DEFAULT_NPROBE = 8  # Lists scanned per query; higher = better recall, slower
+
+# Hierarchical (coarse-to-fine) section search
+HIERARCHICAL_BRANCHES = 3  # Subchapters kept after scoring subchapter centroids
+HIERARCHICAL_PARTS_PER_BRANCH = 4  # Parts kept per subchapter branch
+
+# Data pipeline
+PARSE_WORKERS = None  # Processes used to parse XML volumes (None = one per CPU core)
+PIPELINE_STREAMING = False  # Run parse, store and embed concurrently (see pipeline/streaming.py)
+PIPELINE_QUEUE_SIZE = 4  # Items buffered between streaming stages (volumes, then embedding batches)
+PIPELINE_EMBED_BATCH_SIZE = 256  # Sections per embedding batch in streaming mode
+DOWNLOAD_WORKERS = 4  # Bulk-data ZIPs downloaded concurrently
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes written to disk per chunk
+DOWNLOAD_RETRIES = 3  # Resume attempts after a dropped connection
+DOWNLOAD_TIMEOUT = 30  # Seconds to wait for the server (connect and between chunks)
+EXTRACT_CHUNK_SIZE = 1024 * 1024  # Bytes copied per chunk when extracting ZIP members
+BULK_INSERT_BATCH_SIZE = 5000  # Rows per executemany INSERT when storing parsed data
+SQLITE_BULK_PRAGMAS = {  # Applied while storing parsed data, restored afterwards
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": -262144,  # KiB (256 MB)
+}
+
 # Application settings
 DATA_DIR = os.path.join(BASE_DIR, "cfr_data")
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 VISUALIZATIONS_DIR = os.path.join(BASE_DIR, "visualizations")
+ANN_INDEX_PATH = os.path.join(DATA_DIR, "indexes", "section_ivf_flat.npz")
+EMBEDDING_ONNX_DIR = os.path.join(BASE_DIR, "onnx_models")  # Exported ONNX models and their tokenizers (kept across resets)
+DOWNLOAD_CACHE_DIR = os.path.join(DATA_DIR, "cache")  # Downloaded archives and their validators
+DOWNLOAD_OFFLINE = os.getenv("CFR_OFFLINE", "").lower() in ("1", "true", "yes")  # Read archives from the cache only
+PIPELINE_REPORT_DIR = os.path.join(BASE_DIR, "pipeline_reports")  # JSON run reports (kept across resets)
+STAGE_RSS_SAMPLE_INTERVAL = 0.1  # Seconds between RSS samples while a pipeline stage runs
 
 # FastAPI settings
 API_HOST = "0.0.0.0"
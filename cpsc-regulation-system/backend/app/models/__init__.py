@@ -23,8 +23,13 @@ from app.models.cfr_database import (
     ChapterEmbedding,
     SubchapterEmbedding,
     SectionEmbedding,
+    AggregateEmbedding,
+    EmbeddingGeneration,
+    SectionSignature,
     Cluster,
+    SimilarityRun,
     SimilarityResult,
+    PipelineRun,
     ParityCheck,
     init_cfr_db,
     reset_cfr_db
@@ -49,8 +54,13 @@ __all__ = [
     'ChapterEmbedding',
     'SubchapterEmbedding',
     'SectionEmbedding',
+    'AggregateEmbedding',
+    'EmbeddingGeneration',
+    'SectionSignature',
     'Cluster',
+    'SimilarityRun',
     'SimilarityResult',
+    'PipelineRun',
     'ParityCheck',
     'init_cfr_db',
     'reset_cfr_db',
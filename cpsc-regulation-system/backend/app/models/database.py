@@ -2,7 +2,7 @@
 Enhanced Database models for CPSC Regulation System with Authentication
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, ForeignKey, DateTime, Boolean, Enum, UniqueConstraint
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Text, LargeBinary, Float, ForeignKey, DateTime, Boolean, Enum, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -21,6 +21,7 @@ class Chapter(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(500), nullable=False)
+    natural_key = Column(String(700), index=True)  # Title and chapter name, stable across editions
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -33,6 +34,7 @@ class Subchapter(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     chapter_id = Column(Integer, ForeignKey('chapters.id'), nullable=False)
     name = Column(String(500), nullable=False)
+    natural_key = Column(String(1200), index=True)  # Chapter key and subchapter name
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -46,6 +48,7 @@ class Part(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     subchapter_id = Column(Integer, ForeignKey('subchapters.id'), nullable=False)
     heading = Column(String(500), nullable=False)
+    natural_key = Column(String(600), index=True)  # Title and part number
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -62,18 +65,22 @@ class Section(Base):
     text = Column(Text)
     citation = Column(String(500))
     section_label = Column(String(100))
+    natural_key = Column(String(800), index=True)  # Title, part number and section number
+    content_hash = Column(String(64))  # SHA-256 of the stored section fields
+    removed_at = Column(DateTime, index=True)  # Set when a refresh no longer contains the section
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     part = relationship("Part", back_populates="sections")
     embeddings = relationship("SectionEmbedding", back_populates="section", cascade="all, delete-orphan")
+    signatures = relationship("SectionSignature", back_populates="section", cascade="all, delete-orphan")
 
 class ChapterEmbedding(Base):
     __tablename__ = 'chapter_embeddings'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     chapter_id = Column(Integer, ForeignKey('chapters.id'), nullable=False)
-    embedding = Column(Text, nullable=False)  # Stored as JSON string
+    embedding = Column(LargeBinary, nullable=False)  # Packed float32 BLOB (see embedding_service.pack_embedding)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -84,7 +91,7 @@ class SubchapterEmbedding(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     subchapter_id = Column(Integer, ForeignKey('subchapters.id'), nullable=False)
-    embedding = Column(Text, nullable=False)  # Stored as JSON string
+    embedding = Column(LargeBinary, nullable=False)  # Packed float32 BLOB (see embedding_service.pack_embedding)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -94,13 +101,41 @@ class SectionEmbedding(Base):
     __tablename__ = 'section_embeddings'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    section_id = Column(Integer, ForeignKey('sections.id'), nullable=False)
-    embedding = Column(Text, nullable=False)  # Stored as JSON string
+    section_id = Column(Integer, ForeignKey('sections.id'), nullable=False, index=True)
+    embedding = Column(LargeBinary, nullable=False)  # Packed float32 BLOB (see embedding_service.pack_embedding)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     section = relationship("Section", back_populates="embeddings")
 
+class AggregateEmbedding(Base):
+    __tablename__ = 'aggregate_embeddings'
+    __table_args__ = (UniqueConstraint('level', 'item_id', name='uq_aggregate_embedding_item'),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    level = Column(String(50), nullable=False)  # 'chapter', 'subchapter', 'part'
+    item_id = Column(Integer, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # Mean of the item's section embeddings, packed float32
+    num_sections = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class EmbeddingGeneration(Base):
+    __tablename__ = 'embedding_generations'
+    
+    level = Column(String(50), primary_key=True)  # 'chapter', 'subchapter', 'section'
+    generation = Column(Integer, nullable=False)  # Raised whenever the level's embeddings change (see embedding_store)
+
+class SectionSignature(Base):
+    __tablename__ = 'section_signatures'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    section_id = Column(Integer, ForeignKey('sections.id'), nullable=False, index=True)
+    signature = Column(LargeBinary, nullable=False)  # Packed uint32 MinHash (see near_duplicate.pack_signature)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    section = relationship("Section", back_populates="signatures")
+
 class Cluster(Base):
     __tablename__ = 'clusters'
     
@@ -114,10 +149,43 @@ class Cluster(Base):
     name = Column(String(200))  # LLM-suggested name
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class SimilarityRun(Base):
+    __tablename__ = 'similarity_runs'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    level = Column(String(50), nullable=False, index=True)  # 'chapter', 'subchapter', 'section'
+    status = Column(String(20), nullable=False, default='running')  # running, completed, error
+    similarity_threshold = Column(Float)
+    persist_threshold = Column(Float)  # Lowest score written to similarity_results
+    pair_count = Column(Integer, default=0)
+    mode = Column(String(20), default='full')  # full, incremental
+    base_run_id = Column(Integer, ForeignKey('similarity_runs.id'))  # Run an incremental run was derived from
+    embedding_fingerprint = Column(Integer)  # Highest section embedding id when the run was computed
+    item_ids = Column(LargeBinary)  # Packed int64 ids of the items analysed
+    item_digests = Column(LargeBinary)  # Packed 8-byte digests of their vectors, parallel to item_ids
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime)
+
+class PipelineRun(Base):
+    __tablename__ = 'pipeline_runs'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    status = Column(String(20), nullable=False, default='running')  # running, completed, error
+    current_stage = Column(String(50))
+    completed_stages = Column(Text, default='[]')  # JSON list of finished stages, in order
+    checkpoint = Column(Text, default='{}')  # JSON state needed to resume (parsed outputs, embedding progress)
+    options = Column(Text)  # JSON of the options the run was started with
+    error_message = Column(Text)
+    resume_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime)
+
 class SimilarityResult(Base):
     __tablename__ = 'similarity_results'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(Integer, ForeignKey('similarity_runs.id'), index=True)  # Partition key; NULL for legacy rows
     item1_type = Column(String(50), nullable=False)
     item1_id = Column(Integer, nullable=False)
     item2_type = Column(String(50), nullable=False)
@@ -195,9 +263,51 @@ class ActivityLog(Base):
 engine = create_engine(DATABASE_URL, echo=False)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Columns added to existing tables after their first release; create_all()
+# only creates missing tables, so these are added by upgrade_schema()
+ADDED_COLUMNS = {
+    'similarity_results': ['run_id'],
+    'similarity_runs': ['mode', 'base_run_id', 'embedding_fingerprint', 'item_ids', 'item_digests'],
+    'chapters': ['natural_key'],
+    'subchapters': ['natural_key'],
+    'parts': ['natural_key'],
+    'sections': ['natural_key', 'content_hash', 'removed_at'],
+}
+
+# Indexes on existing columns added after their table's first release
+ADDED_INDEXES = {
+    'section_embeddings': ['section_id'],
+}
+
+def upgrade_schema():
+    """Add columns and indexes introduced after a table was first created"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table_name, column_names in ADDED_COLUMNS.items():
+            if not inspector.has_table(table_name):
+                continue
+            table = Base.metadata.tables[table_name]
+            existing = {column['name'] for column in inspector.get_columns(table_name)}
+            for name in column_names:
+                if name in existing:
+                    continue
+                column_type = table.c[name].type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}"))
+                for index in table.indexes:
+                    if name in index.columns:
+                        index.create(conn, checkfirst=True)
+                print(f"Added column {table_name}.{name}")
+        for table_name, column_names in ADDED_INDEXES.items():
+            if not inspector.has_table(table_name):
+                continue
+            for index in Base.metadata.tables[table_name].indexes:
+                if any(name in index.columns for name in column_names):
+                    index.create(conn, checkfirst=True)
+
 def init_db():
     """Initialize database and create all tables"""
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
 
 def reset_db():
     """Reset database - drop all tables and recreate"""
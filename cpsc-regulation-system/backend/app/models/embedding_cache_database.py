@@ -0,0 +1,38 @@
+"""
+Embedding Cache Database for CPSC Regulation System
+Separate database so cached embeddings survive a reset of the CFR database
+"""
+
+from sqlalchemy import create_engine, Column, Integer, String, LargeBinary, DateTime, PrimaryKeyConstraint
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime
+from app.config import EMBEDDING_CACHE_DATABASE_URL
+
+Base = declarative_base()
+
+class CachedEmbedding(Base):
+    __tablename__ = 'cached_embeddings'
+    __table_args__ = (PrimaryKeyConstraint('model_name', 'text_hash', name='pk_cached_embedding'),)
+
+    model_name = Column(String(200), nullable=False)
+    text_hash = Column(String(64), nullable=False)  # SHA-256 of the normalized text
+    dimension = Column(Integer, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # Packed float32 BLOB (see embedding_service.pack_embedding)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+engine = create_engine(
+    EMBEDDING_CACHE_DATABASE_URL,
+    echo=False,
+    connect_args={"check_same_thread": False, "timeout": 30}
+)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def init_embedding_cache_db():
+    """Create the embedding cache table if it does not exist"""
+    Base.metadata.create_all(bind=engine)
+
+def reset_embedding_cache_db():
+    """Drop all cached embeddings"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
@@ -69,6 +69,9 @@ class SearchRequest(BaseModel):
     query: str
     level: str = "all"  # 'chapter', 'subchapter', 'section', 'all'
     top_k: Optional[int] = 20
+    search_mode: str = "auto"  # 'auto', 'ann', 'exact', 'hierarchical' (section search)
+    nprobe: Optional[int] = None  # ANN lists scanned; higher = better recall
+    branches: Optional[int] = None  # Subchapter branches kept in hierarchical mode
 
 class SearchResponse(BaseModel):
     query: str
@@ -80,6 +83,10 @@ class SearchResponse(BaseModel):
 # Pipeline schemas
 class PipelineRequest(BaseModel):
     urls: List[str]
+    offline: bool = False  # Use cached archives only, without contacting govinfo.gov
+    streaming: bool = False  # Overlap parse, store and embed through bounded queues
+    resume: bool = False  # Continue the newest unfinished pipeline run from its last checkpoint
+    from_stage: Optional[str] = None  # Start at this stage: crawl, parse, store, embeddings, index, statistics
 
 class PipelineResponse(BaseModel):
     message: str
@@ -97,6 +104,10 @@ class PipelineStatus(BaseModel):
     start_time: Optional[str] = None  # Changed to str (ISO format) to avoid serialization issues
     end_time: Optional[str] = None    # Changed to str (ISO format) to avoid serialization issues
     stats: dict
+    volume_timings: List[dict] = []  # Per-volume parse timings
+    run_id: Optional[int] = None  # PipelineRun holding the checkpoints
+    stage_metrics: List[dict] = []  # Per-stage wall/CPU time, peak RSS and throughput
+    report_path: Optional[str] = None  # JSON run report of the finished run
 
 # Analysis schemas
 class AnalysisRequest(BaseModel):
@@ -132,6 +143,7 @@ class AdminStats(BaseModel):
     total_sections: int
     total_chapters: int
     total_subchapters: int
+    loaded_models: List[dict] = []  # Models loaded in this worker, with load time and memory
 
 class UserManagementRequest(BaseModel):
     user_id: int
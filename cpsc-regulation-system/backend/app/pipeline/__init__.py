@@ -2,13 +2,20 @@
 Data Pipeline module for CFR Agentic AI Application
 """
 
-from app.pipeline.crawler import download_and_extract_zip
-from app.pipeline.cfr_parser import parse_chapter_subchapter_part_sections, save_json, save_csv
+from app.pipeline.crawler import (
+    download_and_extract_zip, download_and_extract_all, download_file
+)
+from app.pipeline.cfr_parser import (
+    parse_chapter_subchapter_part_sections, iter_cfr_records, save_json, save_csv
+)
 from app.pipeline.data_pipeline import DataPipeline
 
 __all__ = [
     'download_and_extract_zip',
+    'download_and_extract_all',
+    'download_file',
     'parse_chapter_subchapter_part_sections',
+    'iter_cfr_records',
     'save_json',
     'save_csv',
     'DataPipeline'
@@ -0,0 +1,297 @@
+"""
+Bulk loader for parsed CFR data
+Upserts the Chapter → Subchapter → Part → Section hierarchy with batched Core statements
+"""
+
+import re
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+from sqlalchemy import insert, update, delete, func, bindparam
+from sqlalchemy.orm import Session
+
+from app.models.cfr_database import (
+    Chapter, Subchapter, Part, Section, SectionEmbedding, SectionSignature, SessionLocal, engine
+)
+from app.services.embedding_store import bump_embedding_generation
+from app.config import BULK_INSERT_BATCH_SIZE, SQLITE_BULK_PRAGMAS
+
+
+@contextmanager
+def bulk_load_session(pragmas: Dict[str, Any] = SQLITE_BULK_PRAGMAS) -> Iterator[Session]:
+    """
+    Session for a bulk load, with SQLite pragmas applied for its duration
+
+    Pragmas are per connection, so the session is bound to one pooled
+    connection for the whole load, across its commits, and the previous
+    values are restored on that connection before it goes back to the pool.
+    No pragmas are changed for other databases.
+
+    Args:
+        pragmas: Pragma name -> value to use during the load
+
+    Yields:
+        Database session; the caller commits
+    """
+    with engine.connect() as connection:
+        previous = {}
+        if connection.dialect.name == 'sqlite':
+            for name, value in pragmas.items():
+                previous[name] = connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                connection.exec_driver_sql(f"PRAGMA {name} = {value}")
+            # Set outside the session's transactions, as SQLite ignores some pragmas (e.g. synchronous) inside one
+            connection.commit()
+
+        db = SessionLocal(bind=connection)
+        try:
+            yield db
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+            for name, value in previous.items():
+                connection.exec_driver_sql(f"PRAGMA {name} = {value}")
+            connection.commit()
+
+
+def part_number(heading: str) -> str:
+    """Part number from a heading such as 'PART 1000—COMMISSION ORGANIZATION', else the heading"""
+    match = re.match(r'\s*PARTS?\s+([0-9A-Za-z.\-]+)', heading or '')
+    return match.group(1) if match else (heading or '').strip()
+
+
+def section_content_hash(section_data: Dict[str, Any]) -> str:
+    """SHA-256 of the section fields stored in the database"""
+    fields = ('section_number', 'subject', 'text', 'citation', 'section_label')
+    content = '\x1f'.join(section_data.get(field) or '' for field in fields)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _next_id(db: Session, model) -> int:
+    return (db.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _execute_batches(db: Session, statement, rows: List[Dict[str, Any]], batch_size: int):
+    for start in range(0, len(rows), batch_size):
+        db.execute(statement, rows[start:start + batch_size])
+
+
+def _update_by_id(model):
+    table = model.__table__
+    return update(table).where(table.c.id == bindparam('row_id'))
+
+
+class HierarchyUpserter:
+    """
+    Upserts parsed volumes by natural key, writing only what changed
+
+    Every level gets a natural key that is stable across editions: sections
+    are keyed by (title, part number, section number) and carry a SHA-256 of
+    their content. Rows already stored under the same key are reused; a
+    section is rewritten only if its hash changed or it was tombstoned, and
+    its embeddings and MinHash signature are then deleted so the later
+    pipeline steps regenerate them.
+
+    New rows get client-assigned IDs continuing from each table's maximum
+    and are written with executemany Core inserts, parents first. The key
+    maps are loaded once, so upsert() can be called for one volume at a time
+    by a streaming loader; finish() then tombstones, by setting removed_at,
+    active sections of the loaded titles that were not seen, and sections
+    stored before natural keys existed. Titles with a volume that failed to
+    parse are never tombstoned, as their unseen sections may only be missing
+    from this load. The caller commits.
+    """
+
+    def __init__(self, db: Session, batch_size: int = BULK_INSERT_BATCH_SIZE, incomplete_titles=()):
+        """
+        Args:
+            db: Database session
+            batch_size: Rows per INSERT/UPDATE batch
+            incomplete_titles: Titles with a volume that failed to parse
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.incomplete_titles = set(incomplete_titles)
+        self.next_ids = {model: _next_id(db, model) for model in (Chapter, Subchapter, Part, Section)}
+
+        self.chapters = dict(db.query(Chapter.natural_key, Chapter.id).filter(Chapter.natural_key.isnot(None)))
+        self.subchapters = dict(
+            db.query(Subchapter.natural_key, Subchapter.id).filter(Subchapter.natural_key.isnot(None))
+        )
+        self.parts = {
+            key: (row_id, subchapter_id, heading)
+            for key, row_id, subchapter_id, heading in db.query(
+                Part.natural_key, Part.id, Part.subchapter_id, Part.heading
+            ).filter(Part.natural_key.isnot(None))
+        }
+        self.sections = {
+            key: (row_id, part_id, content_hash, removed_at)
+            for key, row_id, part_id, content_hash, removed_at in db.query(
+                Section.natural_key, Section.id, Section.part_id, Section.content_hash, Section.removed_at
+            ).filter(Section.natural_key.isnot(None))
+        }
+
+        self.titles = set()
+        self.seen_sections = set()
+        self.counts = {
+            'chapters': 0, 'subchapters': 0, 'parts': 0, 'sections_inserted': 0,
+            'sections_updated': 0, 'sections_unchanged': 0, 'sections_removed': 0
+        }
+
+    def upsert(self, parsed_data_list: List[Dict[str, Any]]) -> List[int]:
+        """
+        Write the new and changed rows of some parsed volumes
+
+        Args:
+            parsed_data_list: Outputs of parse_volume, with the CFR title under "title"
+
+        Returns:
+            IDs of the sections whose embeddings must be (re)generated
+        """
+        new_rows = {model: [] for model in self.next_ids}
+        updates = {model: [] for model in self.next_ids}
+        stale_ids = []
+
+        def add(model, **values):
+            values['id'] = self.next_ids[model]
+            self.next_ids[model] += 1
+            new_rows[model].append(values)
+            return values['id']
+
+        for parsed_data in parsed_data_list:
+            title = str(parsed_data.get("title") or "")
+            self.titles.add(title)
+            for chapter_data in parsed_data.get("chapters", []):
+                chapter_key = f"{title}|{chapter_data['chapter_name']}"
+                if chapter_key not in self.chapters:
+                    self.chapters[chapter_key] = add(
+                        Chapter, name=chapter_data["chapter_name"], natural_key=chapter_key
+                    )
+                chapter_id = self.chapters[chapter_key]
+
+                for subchapter_data in chapter_data.get("subchapters", []):
+                    subchapter_key = f"{chapter_key}|{subchapter_data['subchapter_name']}"
+                    if subchapter_key not in self.subchapters:
+                        self.subchapters[subchapter_key] = add(
+                            Subchapter, chapter_id=chapter_id, name=subchapter_data["subchapter_name"],
+                            natural_key=subchapter_key
+                        )
+                    subchapter_id = self.subchapters[subchapter_key]
+
+                    for part_data in subchapter_data.get("parts", []):
+                        part_key = f"{title}|{part_number(part_data['heading'])}"
+                        if part_key not in self.parts:
+                            part_id = add(Part, subchapter_id=subchapter_id, heading=part_data["heading"],
+                                          natural_key=part_key)
+                        else:
+                            part_id, stored_subchapter_id, stored_heading = self.parts[part_key]
+                            if (stored_subchapter_id, stored_heading) != (subchapter_id, part_data["heading"]):
+                                updates[Part].append({
+                                    'row_id': part_id, 'subchapter_id': subchapter_id,
+                                    'heading': part_data["heading"]
+                                })
+                        self.parts[part_key] = (part_id, subchapter_id, part_data["heading"])
+
+                        for position, section_data in enumerate(part_data.get("sections", []), 1):
+                            self._upsert_section(part_key, part_id, position, section_data,
+                                                 add, updates[Section], stale_ids)
+
+        # Parents first, so foreign keys always point at existing rows
+        for model in (Chapter, Subchapter, Part, Section):
+            _execute_batches(self.db, insert(model.__table__), new_rows[model], self.batch_size)
+            _execute_batches(self.db, _update_by_id(model), updates[model], self.batch_size)
+        self._delete_derived(stale_ids)
+
+        self.counts['chapters'] += len(new_rows[Chapter])
+        self.counts['subchapters'] += len(new_rows[Subchapter])
+        self.counts['parts'] += len(new_rows[Part])
+        self.counts['sections_inserted'] += len(new_rows[Section])
+        self.counts['sections_updated'] += len(updates[Section])
+        return [row['id'] for row in new_rows[Section]] + stale_ids
+
+    def _upsert_section(self, part_key, part_id, position, section_data, add, updates, stale_ids):
+        number = (section_data.get("section_number") or "").strip() or f"#{position}"
+        section_key = f"{part_key}|{number}"
+        # Repeated numbers in one part (e.g. several reserved sections) stay distinct
+        occurrence = 1
+        while section_key in self.seen_sections:
+            occurrence += 1
+            section_key = f"{part_key}|{number}#{occurrence}"
+        self.seen_sections.add(section_key)
+
+        values = {
+            'part_id': part_id,
+            'section_number': section_data.get("section_number", ""),
+            'subject': section_data.get("subject", ""),
+            'text': section_data.get("text", ""),
+            'citation': section_data.get("citation", ""),
+            'section_label': section_data.get("section_label", ""),
+            'content_hash': section_content_hash(section_data)
+        }
+        stored = self.sections.get(section_key)
+        if stored is None:
+            row_id = add(Section, natural_key=section_key, **values)
+        else:
+            row_id = stored[0]
+            if stored[2] != values['content_hash'] or stored[3] is not None:
+                updates.append({'row_id': row_id, 'removed_at': None, **values})
+                stale_ids.append(row_id)
+            elif stored[1] != part_id:
+                updates.append({'row_id': row_id, 'removed_at': None, **values})
+            else:
+                self.counts['sections_unchanged'] += 1
+        self.sections[section_key] = (row_id, part_id, values['content_hash'], None)
+
+    def finish(self) -> Dict[str, int]:
+        """
+        Tombstone sections that the loaded titles no longer contain
+
+        Titles in incomplete_titles are skipped; more can be added to it
+        until finish() is called.
+
+        Returns:
+            Counts of new chapters, subchapters and parts, and of inserted,
+            updated, unchanged and removed sections
+        """
+        complete_titles = self.titles - self.incomplete_titles
+        removed_ids = [
+            row_id for row_id, key in self.db.query(Section.id, Section.natural_key).filter(
+                Section.removed_at.is_(None)
+            )
+            if key is None or (key.split('|', 1)[0] in complete_titles and key not in self.seen_sections)
+        ]
+        removal = [{'row_id': row_id, 'removed_at': datetime.utcnow()} for row_id in removed_ids]
+        _execute_batches(self.db, _update_by_id(Section), removal, self.batch_size)
+        self._delete_derived(removed_ids)
+
+        self.counts['sections_removed'] += len(removed_ids)
+        return dict(self.counts)
+
+    def _delete_derived(self, section_ids: List[int]):
+        """Delete embeddings and MinHash signatures of sections whose content is gone or stale"""
+        if not section_ids:
+            return
+        for start in range(0, len(section_ids), 500):
+            chunk = section_ids[start:start + 500]
+            self.db.execute(delete(SectionEmbedding).where(SectionEmbedding.section_id.in_(chunk)))
+            self.db.execute(delete(SectionSignature).where(SectionSignature.section_id.in_(chunk)))
+        bump_embedding_generation(self.db, 'section')
+
+
+def bulk_upsert_hierarchy(db: Session, parsed_data_list: List[Dict[str, Any]],
+                          batch_size: int = BULK_INSERT_BATCH_SIZE, incomplete_titles=()) -> Dict[str, int]:
+    """
+    Upsert parsed volumes in one pass and tombstone removed sections
+
+    See HierarchyUpserter; sections of incomplete_titles are not tombstoned.
+    The caller commits, so the whole load is one transaction.
+
+    Returns:
+        Counts of new chapters, subchapters and parts, and of inserted,
+        updated, unchanged and removed sections
+    """
+    upserter = HierarchyUpserter(db, batch_size, incomplete_titles)
+    upserter.upsert(parsed_data_list)
+    return upserter.finish()
@@ -3,70 +3,175 @@ import json
 import csv
 import os
 
+# XPath evaluated on each closed SECTION element; sections are small, so
+# this keeps the text extraction identical to the original whole-tree parser
+SECTION_TEXT_XPATH = etree.XPath(".//P/text()|.//NOTE/P/text()|.//LIST/LI/text()")
+HED_TEXT_XPATH = etree.XPath("text()")
+
+
+def _heading_text(hd):
+    """First text node of an HD[@SOURCE='HED'] element, or None"""
+    if hd.get("SOURCE") != "HED":
+        return None
+    texts = HED_TEXT_XPATH(hd)
+    return texts[0].strip() if texts else None
+
+
+def _section_record(section):
+    """Extract the stored fields of one closed SECTION element"""
+    sectno = section.xpath("SECTNO/text()")
+    subject = section.xpath("SUBJECT/text()")
+    citation = section.xpath("CITA/text()")
+    # Extract section label (if present)
+    section_label = section.xpath("@N")  # Section label attribute
+    text_elements = SECTION_TEXT_XPATH(section)
+    return {
+        "section_number": sectno[0] if sectno else "",
+        "subject": subject[0] if subject else "",
+        "text": " ".join([t.strip() for t in text_elements if t.strip()]),
+        "citation": citation[0] if citation else "",
+        "section_label": section_label[0] if section_label else ""
+    }
+
+
+def iter_cfr_records(xml_file):
+    """
+    Stream Chapter → Subchapter → Part → Section records from a CFR volume.
+
+    Built on lxml.etree.iterparse: each SECTION is turned into a record as
+    soon as its closing tag is read, and every processed element is cleared
+    and detached from the tree, so peak memory stays flat regardless of the
+    volume size.
+
+    Yields one dict per section with chapter_name, subchapter_name,
+    part_heading and the section fields under "section". A part without
+    sections yields a single record with "section" set to None, so callers
+    can still create the empty part. chapter_index, subchapter_index and
+    part_index identify the enclosing elements, as headings may repeat.
+    Only parts inside a SUBCHAP inside a CHAPTER are reported, matching
+    parse_chapter_subchapter_part_sections.
+
+    xml_file may be a path or a binary file object.
+    """
+    chapters, subchapters, parts = [], [], []
+    counters = {"CHAPTER": 0, "SUBCHAP": 0, "PART": 0}
+    section_depth = 0
+
+    for event, elem in etree.iterparse(xml_file, events=("start", "end")):
+        tag = elem.tag
+
+        if event == "start":
+            if tag == "SECTION":
+                section_depth += 1
+            elif section_depth == 0 and tag in counters:
+                counters[tag] += 1
+                context = {"index": counters[tag], "elem": elem, "name": None, "sections": 0}
+                {"CHAPTER": chapters, "SUBCHAP": subchapters, "PART": parts}[tag].append(context)
+            continue
+
+        if tag == "SECTION":
+            section_depth -= 1
+
+        # Elements inside an open SECTION are kept until the section closes
+        if section_depth > 0:
+            continue
+
+        parent = elem.getparent()
+
+        if tag == "HD":
+            heading = _heading_text(elem)
+            if heading is not None and parent is not None:
+                if parts and parent is parts[-1]["elem"]:
+                    parts[-1]["name"] = parts[-1]["name"] or heading
+                elif subchapters and parent is subchapters[-1]["elem"]:
+                    subchapters[-1]["name"] = subchapters[-1]["name"] or heading
+                elif chapters and (parent is chapters[-1]["elem"] or (
+                        parent.tag == "TOCHD" and parent.getparent() is not None
+                        and parent.getparent().tag == "TOC"
+                        and parent.getparent().getparent() is chapters[-1]["elem"])):
+                    chapters[-1]["name"] = chapters[-1]["name"] or heading
+
+        elif tag == "SECTION":
+            if chapters and subchapters and parts and parent is parts[-1]["elem"]:
+                parts[-1]["sections"] += 1
+                yield _record(chapters[-1], subchapters[-1], parts[-1], _section_record(elem))
+
+        elif tag == "PART" and parts and parts[-1]["elem"] is elem:
+            part = parts.pop()
+            if chapters and subchapters and part["sections"] == 0:
+                yield _record(chapters[-1], subchapters[-1], part, None)
+
+        elif tag == "SUBCHAP" and subchapters and subchapters[-1]["elem"] is elem:
+            subchapters.pop()
+
+        elif tag == "CHAPTER" and chapters and chapters[-1]["elem"] is elem:
+            chapters.pop()
+
+        # Free the processed element and any siblings already handled
+        elem.clear()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+
+
+def _record(chapter, subchapter, part, section):
+    return {
+        "chapter_index": chapter["index"],
+        "chapter_name": chapter["name"] or "Unknown Chapter",
+        "subchapter_index": subchapter["index"],
+        "subchapter_name": subchapter["name"] or "Unknown Subchapter",
+        "part_index": part["index"],
+        "part_heading": part["name"] or "Unknown Part",
+        "section": section
+    }
+
+
 def parse_chapter_subchapter_part_sections(xml_file):
     """Extract Chapter → Subchapter → Part → Sections hierarchy, excluding subchapters with no parts and metadata."""
-    # Parse XML with lxml
-    tree = etree.parse(xml_file)
-    
     # Initialize results dictionary for JSON
     results = {
         "chapters": []
     }
     
-    # Find all chapters
-    chapters = tree.xpath("//CHAPTER")
-    for chapter in chapters:
-        # Get chapter name from TOCHD/HD or CHAPTER/HD
-        chapter_name = chapter.xpath("TOC/TOCHD/HD[@SOURCE='HED']/text() | HD[@SOURCE='HED']/text()")
-        chapter_name = chapter_name[0].strip() if chapter_name else "Unknown Chapter"
-        chapter_data = {
-            "chapter_name": chapter_name,
-            "subchapters": []
-        }
+    # Records arrive in document order, so each level is appended when its index changes
+    chapter_data = subchapter_data = part_data = None
+    for record in iter_cfr_records(xml_file):
+        if chapter_data is None or chapter_data["_index"] != record["chapter_index"]:
+            chapter_data = {
+                "_index": record["chapter_index"],
+                "chapter_name": record["chapter_name"],
+                "subchapters": []
+            }
+            results["chapters"].append(chapter_data)
+            subchapter_data = None
         
-        # Find subchapters with at least one part
-        subchapters = chapter.xpath(".//SUBCHAP[.//PART]")
-        for subchapter in subchapters:
-            subchapter_name = subchapter.xpath("HD[@SOURCE='HED']/text()")[0].strip() if subchapter.xpath("HD[@SOURCE='HED']/text()") else "Unknown Subchapter"
+        if subchapter_data is None or subchapter_data["_index"] != record["subchapter_index"]:
             subchapter_data = {
-                "subchapter_name": subchapter_name,
+                "_index": record["subchapter_index"],
+                "subchapter_name": record["subchapter_name"],
                 "parts": []
             }
-            
-            # Find all parts within the subchapter
-            parts = subchapter.xpath(".//PART")
-            for part in parts:
-                part_heading = part.xpath("HD[@SOURCE='HED']/text()")[0].strip() if part.xpath("HD[@SOURCE='HED']/text()") else "Unknown Part"
-                part_data = {
-                    "heading": part_heading,
-                    "sections": []
-                }
-                
-                # Find all sections within the part
-                sections = part.xpath("SECTION")
-                for section in sections:
-                    sectno = section.xpath("SECTNO/text()")
-                    subject = section.xpath("SUBJECT/text()")
-                    citation = section.xpath("CITA/text()")
-                    # Extract section label (if present)
-                    section_label = section.xpath("@N")  # Section label attribute
-                    text_elements = section.xpath(".//P/text()|.//NOTE/P/text()|.//LIST/LI/text()")
-                    text = " ".join([t.strip() for t in text_elements if t.strip()])
-                    part_data["sections"].append({
-                        "section_number": sectno[0] if sectno else "",
-                        "subject": subject[0] if subject else "",
-                        "text": text,
-                        "citation": citation[0] if citation else "",
-                        "section_label": section_label[0] if section_label else ""
-                    })
-                
-                subchapter_data["parts"].append(part_data)
-            
             chapter_data["subchapters"].append(subchapter_data)
+            part_data = None
         
-        # Only add chapter if it has subchapters with parts
-        if chapter_data["subchapters"]:
-            results["chapters"].append(chapter_data)
+        if part_data is None or part_data["_index"] != record["part_index"]:
+            part_data = {
+                "_index": record["part_index"],
+                "heading": record["part_heading"],
+                "sections": []
+            }
+            subchapter_data["parts"].append(part_data)
+        
+        if record["section"] is not None:
+            part_data["sections"].append(record["section"])
+    
+    # Drop the grouping keys so the output matches the original format
+    for chapter_data in results["chapters"]:
+        del chapter_data["_index"]
+        for subchapter_data in chapter_data["subchapters"]:
+            del subchapter_data["_index"]
+            for part_data in subchapter_data["parts"]:
+                del part_data["_index"]
     
     return results
 
@@ -2,13 +2,107 @@
 import requests
 import zipfile
 import os
-import io
-from app.config import CRAWL_URLS
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from app.config import (
+    CRAWL_URLS, DOWNLOAD_WORKERS, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_RETRIES, DOWNLOAD_TIMEOUT,
+    EXTRACT_CHUNK_SIZE
+)
 
-def download_and_extract_zip(url, extract_to='./data'):
+
+class DownloadError(IOError):
+    """Raised when a download cannot be completed or fails size verification"""
+
+
+def _expected_size(response, offset):
+    """Total size of the resource from Content-Range or Content-Length, or None"""
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range and not content_range.endswith('/*'):
+        return int(content_range.rsplit('/', 1)[1])
+    content_length = response.headers.get('Content-Length')
+    if content_length is not None:
+        return offset + int(content_length)
+    return None
+
+
+def download_file(url, dest_path, chunk_size=DOWNLOAD_CHUNK_SIZE, retries=DOWNLOAD_RETRIES,
+                  timeout=DOWNLOAD_TIMEOUT, session=None, headers=None, response_headers=None):
+    """
+    Streams a URL to disk, resuming partial downloads with HTTP Range requests.
+
+    Data is written in chunks to dest_path + '.part', which is renamed to
+    dest_path only once its size matches the size the server reported. If
+    the connection drops, or a previous run left a .part file behind, the
+    download continues from the bytes already on disk. Servers that ignore
+    Range are handled by restarting from zero.
+
+    headers are sent with the initial request only, e.g. If-None-Match or
+    If-Modified-Since for a conditional fetch; a resumed request never
+    carries them. If response_headers is a dict it receives the headers of
+    the final response.
+
+    Returns the path of the completed file, or None on 304 Not Modified.
+    """
+    http = session or requests
+    part_path = f"{dest_path}.part"
+    os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        request_headers = {'Range': f'bytes={offset}-'} if offset else dict(headers or {})
+
+        try:
+            with http.get(url, headers=request_headers, stream=True, timeout=timeout) as response:
+                if response_headers is not None:
+                    response_headers.clear()
+                    response_headers.update(response.headers)
+                if response.status_code == 304:
+                    return None
+                if response.status_code == 416:
+                    # Nothing left to fetch; the size check below decides if the .part is complete
+                    expected = _expected_size(response, 0)
+                    if expected is None or expected != offset:
+                        os.remove(part_path)
+                        raise DownloadError(f"Range not satisfiable for {url}, restarting")
+                else:
+                    response.raise_for_status()
+                    if offset and response.status_code != 206:
+                        print(f"  Server ignored Range request, restarting {os.path.basename(dest_path)}")
+                        offset = 0
+                    expected = _expected_size(response, offset)
+
+                    with open(part_path, 'ab' if offset else 'wb') as target:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            if chunk:
+                                target.write(chunk)
+
+            size = os.path.getsize(part_path)
+            if expected is not None and size != expected:
+                raise DownloadError(f"Size mismatch for {url}: got {size} bytes, expected {expected}")
+
+            os.replace(part_path, dest_path)
+            return dest_path
+        except (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError, DownloadError) as e:
+            if attempt == retries:
+                print(f"Error downloading from {url}: {e}")
+                raise
+            wait = 2 ** attempt
+            print(f"  Download of {os.path.basename(dest_path)} interrupted ({e}); resuming in {wait}s")
+            time.sleep(wait)
+        except requests.RequestException as e:
+            print(f"Error downloading from {url}: {e}")
+            raise
+
+
+def download_and_extract_zip(url, extract_to='./data', session=None):
     """
     Downloads a zip file from the given URL and extracts its contents.
     Handles cross-platform path issues.
+
+    The archive is streamed to extract_to/downloads rather than held in
+    memory, and an interrupted download resumes where it stopped.
     """
     # Ensure the extract path exists and is properly formatted
     extract_to = os.path.abspath(extract_to)
@@ -27,68 +121,114 @@ def download_and_extract_zip(url, extract_to='./data'):
         raise PermissionError(f"Directory {extract_to} is not writable")
 
     print(f"Downloading from {url}")
-    try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()  # Raise an exception for bad status codes
-    except requests.RequestException as e:
-        print(f"Error downloading from {url}: {e}")
-        raise
+    zip_path = os.path.join(extract_to, 'downloads', os.path.basename(url.rstrip('/')))
+    download_file(url, zip_path, session=session)
+
+    extract_zip(zip_path, extract_to)
+    return extract_to
+
 
+def extract_zip(zip_path, extract_to, chunk_size=EXTRACT_CHUNK_SIZE):
+    """
+    Extracts every file of a zip archive into extract_to, flattening paths.
+
+    Members are decompressed straight from the archive on disk into their
+    targets in chunk_size pieces, so memory use does not grow with the size
+    of the archive or of its largest member.
+
+    XML volumes are extracted rather than parsed from the archive: the parse
+    stages find volumes by globbing extract_to and hand their paths to worker
+    processes, and DownloadCache skips extraction of unchanged archives on
+    later runs, which keeps the extracted files as the parse input.
+
+    Returns the list of extracted file paths.
+    """
+    extracted = []
     try:
-        zip_file = zipfile.ZipFile(io.BytesIO(response.content))
-        
-        # Extract files one by one to handle cross-platform path issues
-        for member in zip_file.namelist():
-            try:
-                # Sanitize filename for cross-platform compatibility
-                filename = member.replace('\\', '/').strip()
-                if not filename:
-                    continue
+        with zipfile.ZipFile(zip_path) as zip_file:
+            # Extract files one by one to handle cross-platform path issues
+            for member in zip_file.namelist():
+                try:
+                    # Sanitize filename for cross-platform compatibility
+                    filename = member.replace('\\', '/').strip()
+                    if not filename:
+                        continue
                     
-                # Skip directory entries
-                if filename.endswith('/'):
-                    continue
+                    # Skip directory entries
+                    if filename.endswith('/'):
+                        continue
                     
-                # Get just the base filename (no path components)
-                base_filename = os.path.basename(filename)
+                    # Get just the base filename (no path components)
+                    base_filename = os.path.basename(filename)
                 
-                # Sanitize the filename to remove any invalid characters
-                # Remove or replace characters that might be problematic
-                base_filename = base_filename.replace(':', '_').replace('*', '_').replace('?', '_')
-                base_filename = base_filename.replace('"', '_').replace('<', '_').replace('>', '_')
-                base_filename = base_filename.replace('|', '_')
+                    # Sanitize the filename to remove any invalid characters
+                    # Remove or replace characters that might be problematic
+                    base_filename = base_filename.replace(':', '_').replace('*', '_').replace('?', '_')
+                    base_filename = base_filename.replace('"', '_').replace('<', '_').replace('>', '_')
+                    base_filename = base_filename.replace('|', '_')
                 
-                # Create target path using absolute path with forward slashes for cross-platform compatibility
-                target_path = os.path.abspath(os.path.join(extract_to, base_filename)).replace('\\', '/')
+                    # Create target path using absolute path with forward slashes for cross-platform compatibility
+                    target_path = os.path.abspath(os.path.join(extract_to, base_filename)).replace('\\', '/')
                 
-                # Additional validation for problematic characters
-                if ':' in os.path.basename(target_path):
-                    print(f"  SKIPPING: Invalid filename (contains colon): {base_filename}")
-                    continue
+                    # Additional validation for problematic characters
+                    if ':' in os.path.basename(target_path):
+                        print(f"  SKIPPING: Invalid filename (contains colon): {base_filename}")
+                        continue
                 
-                print(f"  Extracting: {base_filename} -> {target_path}")
+                    print(f"  Extracting: {base_filename} -> {target_path}")
                 
-                # Extract the file
-                try:
-                    with zip_file.open(member) as source:
-                        file_content = source.read()
-                        with open(target_path, 'wb') as target:
-                            target.write(file_content)
-                except OSError as e:
-                    print(f"  ERROR extracting {member} [Errno {e.errno}]: {str(e)}")
-                    print(f"  Hint: Check for invalid characters in filename or path issues")
-                    raise
-            except Exception as e:
-                print(f"  ERROR extracting {member}: {type(e).__name__}: {str(e)}")
-                # Continue with other files instead of failing completely
-                continue
+                    # Extract the file
+                    try:
+                        with zip_file.open(member) as source, open(target_path, 'wb') as target:
+                            shutil.copyfileobj(source, target, chunk_size)
+                        extracted.append(target_path)
+                    except OSError as e:
+                        print(f"  ERROR extracting {member} [Errno {e.errno}]: {str(e)}")
+                        print(f"  Hint: Check for invalid characters in filename or path issues")
+                        raise
+                except Exception as e:
+                    print(f"  ERROR extracting {member}: {type(e).__name__}: {str(e)}")
+                    # Continue with other files instead of failing completely
+                    continue
         
         print(f"Extracted to {extract_to}")
-        return extract_to
+        return extracted
     except (zipfile.BadZipFile, OSError, IOError) as e:
         print(f"Error extracting zip file: {e}")
         raise
 
+
+def download_and_extract_all(urls, extract_to='./data', max_workers=DOWNLOAD_WORKERS,
+                             cache=None, offline=False):
+    """
+    Downloads and extracts several zip files concurrently.
+
+    Downloads are I/O bound, so a thread pool overlaps them; each thread
+    uses its own requests session for connection reuse. Every URL is
+    attempted even if another fails.
+
+    With a DownloadCache, archives are fetched with conditional requests
+    and only extracted when their content changed; offline=True reads
+    from the cache alone.
+
+    Returns a list of (url, error, changed) tuples in input order, with
+    error None on success and changed False when extraction was skipped.
+    """
+    def fetch(url):
+        with requests.Session() as session:
+            try:
+                if cache is None:
+                    download_and_extract_zip(url, extract_to, session=session)
+                    return url, None, True
+                return url, None, cache.fetch_and_extract(url, extract_to, session=session, offline=offline)
+            except Exception as e:
+                return url, e, False
+
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+        return list(executor.map(fetch, urls))
+
 if __name__ == "__main__":
     download_path = "./cfr_data"
     for target_url_base in CRAWL_URLS:
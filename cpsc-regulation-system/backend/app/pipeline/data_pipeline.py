@@ -4,37 +4,138 @@ Integrates crawler, parser, and database storage with embeddings
 """
 
 import os
+import re
 import glob
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
-from app.pipeline.crawler import download_and_extract_zip
+from app.pipeline.crawler import download_and_extract_all
+from app.pipeline.download_cache import DownloadCache
+from app.pipeline.bulk_loader import bulk_upsert_hierarchy, bulk_load_session
+from app.pipeline.streaming import run_streaming_ingest
+from app.pipeline.instrumentation import StageMetrics, write_run_report
+from app.pipeline.run_store import (
+    PIPELINE_STAGES, start_pipeline_run, latest_unfinished_run, completed_stages,
+    load_checkpoint, save_checkpoint, mark_stage, finish_pipeline_run, previous_run
+)
 from app.pipeline.cfr_parser import parse_chapter_subchapter_part_sections, save_json, save_csv
 from app.models.cfr_database import (
     Chapter, Subchapter, Part, Section,
-    ChapterEmbedding, SubchapterEmbedding, SectionEmbedding,
+    ChapterEmbedding, SubchapterEmbedding, SectionEmbedding, SectionSignature,
     init_cfr_db, SessionLocal
 )
-from app.services.embedding_service import EmbeddingService
-from app.config import DEFAULT_CRAWL_URLS, DATA_DIR, OUTPUT_DIR
+from app.services.embedding_service import embedding_service, pack_embedding
+from app.services.embedding_batching import auto_token_budget, embed_in_token_batches
+from app.services.embedding_workers import embedding_worker_pool
+from app.services.embedding_store import embedding_store, bump_embedding_generation
+from app.services.ann_index import build_index
+from app.services.near_duplicate import build_section_signatures
+from app.services.aggregate_embeddings import build_aggregate_embeddings
+from app.config import (
+    DEFAULT_CRAWL_URLS, DATA_DIR, OUTPUT_DIR, PARSE_WORKERS, DOWNLOAD_OFFLINE, PIPELINE_STREAMING,
+    ANN_INDEX_TYPE, ANN_INDEX_PATH, ANN_MIN_ITEMS, EMBEDDING_SORT_WINDOW
+)
+
+
+# Status step shown while each stage runs
+STAGE_LABELS = {
+    'crawl': 'Crawling data',
+    'parse': 'Parsing XML',
+    'store': 'Storing in database',
+    'embeddings': 'Generating embeddings',
+    'index': 'Building search index',
+    'statistics': 'Calculating statistics'
+}
+
 
-# Create embedding service instance
-embedding_service = EmbeddingService()
+def volume_sort_key(xml_file: str):
+    """Sort CFR-YYYY-titleNN-volN.xml files by their numbers, so vol10 follows vol9"""
+    name = os.path.basename(xml_file)
+    return [int(token) if token.isdigit() else token for token in re.split(r'(\d+)', name)]
+
+
+def volume_title(xml_file: str) -> str:
+    """CFR title number from a CFR-YYYY-titleNN-volN.xml file name, or '' if absent"""
+    match = re.search(r'title-?(\d+)', os.path.basename(xml_file), re.IGNORECASE)
+    return match.group(1) if match else ''
+
+
+def parse_volume(xml_file: str, output_dir: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Parse one XML volume and save its JSON and CSV outputs
+    
+    Runs in a parse worker process, so failures are returned rather than raised.
+    
+    Returns:
+        Tuple of (parsed data or None on error, timing record for the volume)
+    """
+    start = time.perf_counter()
+    timing = {'volume': os.path.basename(xml_file), 'title': volume_title(xml_file),
+              'seconds': 0.0, 'sections': 0, 'error': None}
+    
+    try:
+        parsed_data = parse_chapter_subchapter_part_sections(xml_file)
+        parsed_data['title'] = volume_title(xml_file)
+        
+        # Save JSON and CSV outputs
+        base_name = os.path.splitext(os.path.basename(xml_file))[0]
+        # Sanitize base_name to avoid any path issues
+        base_name = base_name.replace(':', '_').replace('*', '_').replace('?', '_')
+        base_name = base_name.replace('"', '_').replace('<', '_').replace('>', '_')
+        base_name = base_name.replace('|', '_').replace('/', '_').replace('\\', '_')
+        
+        json_output = os.path.abspath(os.path.join(output_dir, f"{base_name}.json"))
+        csv_output = os.path.abspath(os.path.join(output_dir, f"{base_name}.csv"))
+        
+        save_json(parsed_data, json_output)
+        save_csv(parsed_data, csv_output)
+        timing['output'] = json_output
+        
+        timing['sections'] = sum(
+            len(part['sections'])
+            for chapter in parsed_data['chapters']
+            for subchapter in chapter['subchapters']
+            for part in subchapter['parts']
+        )
+    except Exception as e:
+        import traceback
+        parsed_data = None
+        timing['error'] = f"{type(e).__name__}: {e}"
+        print(f"    [ERROR] Traceback: {traceback.format_exc()}")
+    
+    timing['seconds'] = round(time.perf_counter() - start, 3)
+    return parsed_data, timing
 
 
 class DataPipeline:
-    def __init__(self, urls: List[str] = None):
+    def __init__(self, urls: List[str] = None, offline: bool = DOWNLOAD_OFFLINE,
+                 streaming: bool = PIPELINE_STREAMING):
         """
         Initialize data pipeline
         
         Args:
             urls: List of URLs to crawl. If None, uses DEFAULT_CRAWL_URLS
+            offline: Use cached archives only, without contacting the server
+            streaming: Run parse, store and embed concurrently through bounded queues
         """
         # Use absolute paths to avoid any path resolution issues
         self.data_dir = os.path.abspath(DATA_DIR)
         self.output_dir = os.path.abspath(OUTPUT_DIR)
         self.crawl_urls = urls if urls else DEFAULT_CRAWL_URLS
+        self.offline = offline
+        self.streaming = streaming
+        self.run_id = None
+        self.from_stage = None
+        self.checkpoint = {}
+        self.parsed_data_list = None
+        self.streamed = False
+        self.download_cache = DownloadCache()
+        self.data_changed = True
+        self._data_unchanged = None  # Memoized by data_unchanged()
         
         print(f"Initializing DataPipeline:")
         print(f"  data_dir: {self.data_dir}")
@@ -63,12 +164,16 @@ class DataPipeline:
             'state': 'idle',  # idle, running, completed, error
             'current_step': None,
             'progress': 0,
-            'total_steps': 6,
+            'total_steps': len(PIPELINE_STAGES),
             'steps_completed': [],
             'error_message': None,
             'start_time': None,
             'end_time': None,
-            'stats': {}
+            'stats': {},
+            'volume_timings': [],
+            'run_id': None,
+            'stage_metrics': [],
+            'report_path': None
         }
     
     def update_status(self, state: str = None, current_step: str = None, 
@@ -100,8 +205,26 @@ class DataPipeline:
         """Get current pipeline status"""
         return self.status.copy()
     
-    def run_full_pipeline(self):
-        """Run the complete data pipeline: crawl -> parse -> store -> embed"""
+    def run_full_pipeline(self, resume: bool = False, from_stage: str = None):
+        """
+        Run the complete data pipeline: crawl -> parse -> store -> embed -> index
+        
+        Progress is recorded in a PipelineRun: every stage is checkpointed when
+        it completes, and section embeddings after every batch. With resume the
+        newest unfinished run continues at its first incomplete stage, reusing
+        the parsed JSON outputs of a completed parse stage. from_stage starts at
+        the given stage instead, rerunning it and every stage after it. Stages
+        are idempotent (sections are upserted and only missing embeddings are
+        generated), so an interrupted stage only redoes uncommitted work.
+        
+        Args:
+            resume: Continue the newest unfinished run instead of starting a new one
+            from_stage: First stage to run, one of PIPELINE_STAGES
+        """
+        if from_stage is not None and from_stage not in PIPELINE_STAGES:
+            raise ValueError(f"Invalid stage: {from_stage}. Must be one of {', '.join(PIPELINE_STAGES)}")
+        
+        db = SessionLocal()
         try:
             self.update_status(state='running', current_step='Starting', progress=0)
             
@@ -109,34 +232,51 @@ class DataPipeline:
             print("Starting CFR Data Pipeline")
             print("=" * 80)
             
-            # Step 1: Crawl and download data
-            print("\n[1/6] Crawling and downloading CFR data...")
-            self.update_status(current_step='Crawling data', progress=17)
-            self.crawl_data()
-            
-            # Step 2: Parse XML files
-            print("\n[2/6] Parsing XML files...")
-            self.update_status(current_step='Parsing XML', progress=33)
-            parsed_data_list = self.parse_xml_files()
-            
-            # Step 3: Store in database
-            print("\n[3/6] Storing data in database...")
-            self.update_status(current_step='Storing in database', progress=50)
-            self.store_in_database(parsed_data_list)
-            
-            # Step 4: Generate embeddings
-            print("\n[4/6] Generating embeddings...")
-            self.update_status(current_step='Generating embeddings', progress=67)
-            self.generate_embeddings()
+            run = latest_unfinished_run(db) if resume else None
+            if run is not None:
+                run.status = 'running'
+                run.resume_count = (run.resume_count or 0) + 1
+                db.commit()
+                done = completed_stages(run)
+                self.checkpoint = load_checkpoint(run)
+                self.data_changed = self.checkpoint.get('data_changed', True)
+                print(f"  Resuming pipeline run {run.id} (completed: {', '.join(done) or 'none'})")
+            else:
+                if resume:
+                    print("  No unfinished pipeline run to resume, starting a new one")
+                run = start_pipeline_run(db, {
+                    'urls': self.crawl_urls, 'offline': self.offline, 'streaming': self.streaming,
+                    'from_stage': from_stage
+                })
+                done = []
+            self.run_id = self.status['run_id'] = run.id
+            self.from_stage = from_stage
             
-            # Step 5: Get statistics
-            print("\n[5/6] Calculating statistics...")
-            self.update_status(current_step='Calculating statistics', progress=83)
-            stats = self.get_statistics()
-            self.status['stats'] = stats
+            # A resumed run still skips the stages its original from_stage skipped
+            start_stage = from_stage or json.loads(run.options or '{}').get('from_stage')
+            first = PIPELINE_STAGES.index(start_stage) if start_stage else 0
+            for index, stage in enumerate(PIPELINE_STAGES):
+                step = f"[{index + 1}/{len(PIPELINE_STAGES)}]"
+                if index < first or (from_stage is None and stage in done):
+                    print(f"\n{step} Skipping {stage}")
+                    continue
+                
+                print(f"\n{step} {STAGE_LABELS[stage]}...")
+                self.update_status(current_step=STAGE_LABELS[stage],
+                                   progress=int(100 * index / len(PIPELINE_STAGES)))
+                mark_stage(db, run.id, stage)
+                metrics = StageMetrics(stage)
+                try:
+                    with metrics:
+                        self.run_stage(stage, metrics)
+                finally:
+                    self.status['stage_metrics'].append(metrics.record)
+                print(f"  [METRICS] {self.format_metrics(metrics.record)}")
+                mark_stage(db, run.id, stage, completed=True)
             
-            # Step 6: Complete
+            finish_pipeline_run(db, run.id)
             self.update_status(state='completed', current_step='Completed', progress=100)
+            self.write_report()
             
             print("\n" + "=" * 80)
             print("Pipeline completed successfully!")
@@ -144,7 +284,7 @@ class DataPipeline:
             
             # Display statistics
             print("\nDatabase Statistics:")
-            for key, value in stats.items():
+            for key, value in self.status['stats'].items():
                 print(f"  {key}: {value}")
                 
         except Exception as e:
@@ -154,230 +294,452 @@ class DataPipeline:
             print(f"\n[ERROR] Pipeline failed: {error_details}")
             print(f"[ERROR] Full traceback:")
             traceback.print_exc()
+            if self.run_id is not None:
+                db.rollback()
+                finish_pipeline_run(db, self.run_id, status='error', error_message=error_details)
+                print(f"[ERROR] Resume with resume=true to continue pipeline run {self.run_id}")
+            self.write_report()
             raise
+        finally:
+            db.close()
+    
+    def run_stage(self, stage: str, metrics: StageMetrics = None):
+        """
+        Run one pipeline stage (see PIPELINE_STAGES)
+        
+        Args:
+            stage: Stage name
+            metrics: Receives the stage's throughput counters
+        """
+        metrics = metrics or StageMetrics(stage)
+        if stage == 'crawl':
+            bytes_before = self.download_cache.bytes_downloaded
+            self.crawl_data()
+            metrics.count(items=len(self.crawl_urls), bytes=self.download_cache.bytes_downloaded - bytes_before)
+            self.save_checkpoint(data_changed=self.data_changed)
+        elif stage in ('parse', 'store', 'embeddings', 'index') and self.data_unchanged():
+            # Same archives as the last run: the stored data and embeddings are current
+            print("  [OK] Downloaded data unchanged, nothing to do")
+        elif stage == 'parse':
+            if self.streaming:
+                # Store and section embeddings overlap with parsing; the later stages catch up the rest
+                self.stream_parse_store_embed()
+                self.streamed = True
+                ingest = self.status['stats'].get('ingest', {})
+                metrics.count(rows=self.rows_written(ingest), sections_embedded=ingest.get('sections_embedded', 0))
+            else:
+                self.parsed_data_list = self.parse_xml_files()
+            metrics.count(items=len(self.status['volume_timings']),
+                          sections=sum(timing['sections'] for timing in self.status['volume_timings']))
+            failed = [timing['volume'] for timing in self.status['volume_timings'] if timing['error']]
+            if failed:
+                # Fail the run, so a rerun or resume parses every volume again instead of
+                # treating the stored data as current
+                raise RuntimeError(f"{len(failed)} volume(s) failed to parse: {', '.join(failed)}")
+            self.save_checkpoint(parsed_outputs=[
+                timing['output'] for timing in self.status['volume_timings'] if timing.get('output')
+            ])
+        elif stage == 'store':
+            if not self.streamed:
+                self.store_in_database(self.load_parsed_data())
+                ingest = self.status['stats'].get('ingest', {})
+                metrics.count(
+                    items=sum(ingest.get(key, 0) for key in
+                              ('sections_inserted', 'sections_updated', 'sections_unchanged')),
+                    rows=self.rows_written(ingest)
+                )
+            self.build_text_signatures()
+        elif stage == 'embeddings':
+            with embedding_worker_pool(embedding_service):
+                embedded = self.generate_embeddings()
+            metrics.count(items=embedded, sections=embedded)
+            self.compute_aggregate_embeddings()
+            # Resident search matrices are stale once new embeddings are written
+            embedding_store.invalidate()
+        elif stage == 'index':
+            metrics.count(items=self.build_search_index())
+        elif stage == 'statistics':
+            self.status['stats'].update(self.get_statistics())
+    
+    @staticmethod
+    def rows_written(ingest: Dict[str, int]) -> int:
+        """Rows inserted or updated by a store, from its upsert counts"""
+        keys = ('chapters', 'subchapters', 'parts', 'sections_inserted', 'sections_updated', 'sections_removed')
+        return sum(ingest.get(key, 0) for key in keys)
+    
+    @staticmethod
+    def format_metrics(record: Dict[str, Any]) -> str:
+        """One-line summary of a stage metrics record"""
+        parts = [f"{record['wall_seconds']:.2f}s wall", f"{record['cpu_seconds']:.2f}s CPU"]
+        if record.get('child_cpu_seconds'):
+            parts.append(f"{record['child_cpu_seconds']:.2f}s worker CPU")
+        if record.get('peak_rss_mb') is not None:
+            parts.append(f"peak RSS {record['peak_rss_mb']} MB")
+        for name in ('items', 'sections', 'rows', 'bytes'):
+            if record.get(name):
+                parts.append(f"{record[name]} {name} ({record[name + '_per_second']}/s)")
+        return ", ".join(parts)
+    
+    def write_report(self):
+        """Write the JSON run report and record its path in the status"""
+        try:
+            self.status['report_path'] = write_run_report({
+                'run_id': self.run_id,
+                'state': self.status['state'],
+                'error_message': self.status['error_message'],
+                'start_time': self.status['start_time'],
+                'end_time': self.status['end_time'],
+                'options': {
+                    'urls': self.crawl_urls, 'offline': self.offline,
+                    'streaming': self.streaming, 'from_stage': self.from_stage
+                },
+                'stage_metrics': self.status['stage_metrics'],
+                'stats': self.status['stats'],
+                'volume_timings': self.status['volume_timings']
+            }, self.run_id)
+            print(f"  Run report written to {self.status['report_path']}")
+        except OSError as e:
+            print(f"  [WARNING] Could not write run report: {e}")
+    
+    def data_unchanged(self) -> bool:
+        """
+        Whether the stored data is current, so parse through index can be skipped
+        
+        True only if the crawl found no new archives, the run before this one
+        completed, and every active section has an embedding. A run that died
+        after its crawl leaves the archives cached, so an unchanged crawl alone
+        does not mean the later stages ever finished.
+        """
+        if self.from_stage is not None or self.data_changed:
+            return False
+        if self._data_unchanged is None:
+            db = SessionLocal()
+            try:
+                previous = previous_run(db, self.run_id)
+                self._data_unchanged = (
+                    previous is not None and previous.status == 'completed'
+                    and self.has_stored_sections() and not self.has_missing_embeddings(db)
+                )
+            finally:
+                db.close()
+        return self._data_unchanged
+    
+    def save_checkpoint(self, **values):
+        """Merge values into the current run's checkpoint and commit"""
+        self.checkpoint.update(values)
+        if self.run_id is None:
+            return
+        db = SessionLocal()
+        try:
+            save_checkpoint(db, self.run_id, **values)
+            db.commit()
+        finally:
+            db.close()
+    
+    def load_parsed_data(self) -> List[Dict[str, Any]]:
+        """
+        Parsed volumes for the store stage
+        
+        Uses the output of this run's parse stage, or when resuming, the JSON
+        outputs recorded by the parse stage of the interrupted run. Parses the
+        XML files again if neither is available.
+        """
+        if self.parsed_data_list is not None:
+            return self.parsed_data_list
+        
+        outputs = self.checkpoint.get('parsed_outputs') or []
+        if outputs and all(os.path.exists(path) for path in outputs):
+            print(f"  Loading {len(outputs)} parsed volume(s) from the checkpoint...")
+            parsed_data_list = []
+            for path in outputs:
+                with open(path, 'r', encoding='utf-8') as f:
+                    parsed_data_list.append(json.load(f))
+            return parsed_data_list
+        
+        print("  No parsed outputs to resume from, parsing XML files again...")
+        return self.parse_xml_files()
     
     def crawl_data(self):
-        """Crawl and download CFR data from configured URLs"""
-        print(f"  Processing {len(self.crawl_urls)} URL(s)...")
+        """
+        Crawl and download CFR data from configured URLs, several at a time
+        
+        Archives go through the download cache, so an unchanged archive is
+        neither downloaded nor extracted again. Sets self.data_changed to
+        whether any archive was extracted.
+        """
+        print(f"  Processing {len(self.crawl_urls)} URL(s){' (offline)' if self.offline else ''}...")
         
+        zip_urls = []
         for target_url_base in self.crawl_urls:
-            try:
-                # Parse URL to construct zip filename
-                url_parts = [part for part in target_url_base.split('/') if part]
-                
-                if len(url_parts) < 2:
-                    print(f"  [WARNING] Invalid URL format: {target_url_base}")
-                    continue
-                    
-                year = url_parts[-2]
-                title_part = url_parts[-1]
-                
-                zip_filename = f"CFR-{year}-{title_part}.zip"
-                full_zip_url = f"https://www.govinfo.gov/bulkdata/CFR/{year}/{title_part}/{zip_filename}"
+            # Parse URL to construct zip filename
+            url_parts = [part for part in target_url_base.split('/') if part]
+            
+            if len(url_parts) < 2:
+                print(f"  [WARNING] Invalid URL format: {target_url_base}")
+                continue
                 
-                print(f"  Downloading: {full_zip_url}")
-                download_and_extract_zip(full_zip_url, self.data_dir)
-                print(f"  [OK] Downloaded and extracted successfully")
-            except Exception as e:
-                import traceback
-                print(f"  [ERROR] Error downloading from {target_url_base}: {e}")
-                print(f"  [ERROR] Traceback: {traceback.format_exc()}")
-                raise
+            year = url_parts[-2]
+            title_part = url_parts[-1]
+            
+            zip_filename = f"CFR-{year}-{title_part}.zip"
+            full_zip_url = f"https://www.govinfo.gov/bulkdata/CFR/{year}/{title_part}/{zip_filename}"
+            print(f"  Queued: {full_zip_url}")
+            zip_urls.append(full_zip_url)
+        
+        errors = []
+        changed = []
+        results = download_and_extract_all(zip_urls, self.data_dir, cache=self.download_cache, offline=self.offline)
+        for url, error, extracted in results:
+            if error is None:
+                print(f"  [OK] {'Downloaded and extracted' if extracted else 'Unchanged'} {url}")
+                changed.append(extracted)
+            else:
+                print(f"  [ERROR] Error downloading from {url}: {error}")
+                errors.append(error)
+        
+        self.data_changed = any(changed)
+        
+        if errors:
+            raise errors[0]
     
-    def parse_xml_files(self) -> List[Dict[str, Any]]:
-        """Parse all XML files in the data directory"""
+    @staticmethod
+    def has_missing_embeddings(db: Session) -> bool:
+        """Whether any active section has no embedding"""
+        return db.query(Section.id).filter(
+            Section.removed_at.is_(None),
+            Section.id.notin_(db.query(SectionEmbedding.section_id))
+        ).first() is not None
+    
+    def has_stored_sections(self) -> bool:
+        """Whether the database already holds parsed sections"""
+        db = SessionLocal()
+        try:
+            return db.query(Section.id).filter(Section.removed_at.is_(None)).first() is not None
+        finally:
+            db.close()
+    
+    def parse_xml_files(self, workers: int = None) -> List[Dict[str, Any]]:
+        """
+        Parse all XML files in the data directory
+        
+        Volumes are parsed in a process pool, one volume per task, and the
+        results are returned in volume order regardless of which finishes
+        first. Per-volume timings are recorded in self.status['volume_timings'].
+        
+        Args:
+            workers: Worker processes (default: PARSE_WORKERS, or one per CPU core)
+        """
         print(f"  Looking for XML files in: {self.data_dir}")
-        xml_files = glob.glob(os.path.join(self.data_dir, "*.xml"))
+        xml_files = sorted(glob.glob(os.path.join(self.data_dir, "*.xml")), key=volume_sort_key)
         
         if not xml_files:
             print(f"  [WARNING] No XML files found in data directory: {self.data_dir}")
             print(f"  [WARNING] Directory contents: {os.listdir(self.data_dir) if os.path.exists(self.data_dir) else 'Directory does not exist'}")
             return []
         
+        workers = min(workers or PARSE_WORKERS or os.cpu_count() or 1, len(xml_files))
+        print(f"  Parsing {len(xml_files)} volume(s) with {workers} worker(s)...")
+        
+        self.status['volume_timings'] = []
+        outcomes = {}
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(parse_volume, xml_file, self.output_dir): xml_file
+                    for xml_file in xml_files
+                }
+                for future in as_completed(futures):
+                    outcomes[futures[future]] = future.result()
+        else:
+            for xml_file in xml_files:
+                outcomes[xml_file] = parse_volume(xml_file, self.output_dir)
+        
         parsed_data_list = []
         for xml_file in xml_files:
-            try:
-                print(f"  Parsing: {os.path.basename(xml_file)}")
-                parsed_data = parse_chapter_subchapter_part_sections(xml_file)
-                
-                # Save JSON and CSV outputs
-                base_name = os.path.splitext(os.path.basename(xml_file))[0]
-                # Sanitize base_name to avoid any path issues
-                base_name = base_name.replace(':', '_').replace('*', '_').replace('?', '_')
-                base_name = base_name.replace('"', '_').replace('<', '_').replace('>', '_')
-                base_name = base_name.replace('|', '_').replace('/', '_').replace('\\', '_')
-                
-                json_output = os.path.abspath(os.path.join(self.output_dir, f"{base_name}.json"))
-                csv_output = os.path.abspath(os.path.join(self.output_dir, f"{base_name}.csv"))
-                
-                print(f"    Saving to:")
-                print(f"      JSON: {json_output}")
-                print(f"      CSV: {csv_output}")
-                
-                save_json(parsed_data, json_output)
-                save_csv(parsed_data, csv_output)
-                
+            parsed_data, timing = outcomes[xml_file]
+            self.status['volume_timings'].append(timing)
+            if parsed_data is not None:
                 parsed_data_list.append(parsed_data)
-                print(f"    [OK] Saved successfully")
-            except Exception as e:
-                import traceback
-                print(f"    [ERROR] Error parsing {xml_file}: {type(e).__name__}: {e}")
-                print(f"    [ERROR] Traceback: {traceback.format_exc()}")
+                print(f"    [OK] {timing['volume']}: {timing['sections']} sections in {timing['seconds']:.2f}s")
+            else:
                 # Continue with next file instead of crashing
+                print(f"    [ERROR] Error parsing {xml_file}: {timing['error']}")
         
         return parsed_data_list
     
+    def stream_parse_store_embed(self, workers: int = None):
+        """
+        Parse, store and embed all XML files as one streaming pipeline
+        
+        Each volume is upserted as soon as it is parsed and its new or changed
+        sections are embedded while later volumes are still being parsed, with
+        bounded queues between the stages (see run_streaming_ingest). Chapter
+        and subchapter embeddings are left to generate_embeddings.
+        
+        Args:
+            workers: Parse worker processes (default: PARSE_WORKERS, or one per CPU core)
+        """
+        xml_files = sorted(glob.glob(os.path.join(self.data_dir, "*.xml")), key=volume_sort_key)
+        if not xml_files:
+            print(f"  [WARNING] No XML files found in data directory: {self.data_dir}")
+            return
+        
+        workers = min(workers or PARSE_WORKERS or os.cpu_count() or 1, len(xml_files))
+        print(f"  Streaming {len(xml_files)} volume(s) with {workers} parse worker(s)...")
+        
+        self.status['volume_timings'] = []
+        with embedding_worker_pool(embedding_service):
+            counts = run_streaming_ingest(
+                xml_files, self.output_dir, workers, parse_volume, embedding_service,
+                on_volume=self.status['volume_timings'].append
+            )
+        self.status['stats']['ingest'] = counts
+        print(f"  Sections: {counts['sections_inserted']} inserted, {counts['sections_updated']} updated, "
+              f"{counts['sections_unchanged']} unchanged, {counts['sections_removed']} removed, "
+              f"{counts['sections_embedded']} embedded")
+        print("  [OK] Streaming ingest completed")
+    
     def store_in_database(self, parsed_data_list: List[Dict[str, Any]]):
-        """Store parsed data in SQLite database"""
+        """
+        Upsert parsed data into the SQLite database in one bulk transaction
+        
+        Only new or changed sections are written; sections missing from the
+        refreshed titles are tombstoned (see bulk_upsert_hierarchy).
+        """
         print(f"  Processing {len(parsed_data_list)} parsed file(s)...")
         
         if not parsed_data_list:
             print("  [WARNING] No parsed data to store!")
             return
             
-        db = SessionLocal()
-
         try:
-            for parsed_data in parsed_data_list:
-                chapters = parsed_data.get("chapters", [])
-                print(f"  Processing {len(chapters)} chapters...")
-                for idx, chapter_data in enumerate(chapters, 1):
-                    print(f"    Chapter {idx}/{len(chapters)}: {chapter_data.get('chapter_name', 'Unknown')}")
-                    # Create chapter
-                    chapter = Chapter(name=chapter_data["chapter_name"])
-                    db.add(chapter)
-                    db.flush()  # Get chapter ID
-                    
-                    # Process subchapters
-                    for subchapter_data in chapter_data.get("subchapters", []):
-                        subchapter = Subchapter(
-                            chapter_id=chapter.id,
-                            name=subchapter_data["subchapter_name"]
-                        )
-                        db.add(subchapter)
-                        db.flush()  # Get subchapter ID
-                        
-                        # Process parts
-                        for part_data in subchapter_data.get("parts", []):
-                            part = Part(
-                                subchapter_id=subchapter.id,
-                                heading=part_data["heading"]
-                            )
-                            db.add(part)
-                            db.flush()  # Get part ID
-                            
-                            # Process sections
-                            for section_data in part_data.get("sections", []):
-                                section = Section(
-                                    part_id=part.id,
-                                    section_number=section_data.get("section_number", ""),
-                                    subject=section_data.get("subject", ""),
-                                    text=section_data.get("text", ""),
-                                    citation=section_data.get("citation", ""),
-                                    section_label=section_data.get("section_label", "")
-                                )
-                                db.add(section)
-            
-            db.commit()
+            with bulk_load_session() as db:
+                counts = bulk_upsert_hierarchy(db, parsed_data_list)
+                db.commit()
+            self.status['stats']['ingest'] = counts
+            print(f"  New: {counts['chapters']} chapters, {counts['subchapters']} subchapters, "
+                  f"{counts['parts']} parts")
+            print(f"  Sections: {counts['sections_inserted']} inserted, {counts['sections_updated']} updated, "
+                  f"{counts['sections_unchanged']} unchanged, {counts['sections_removed']} removed")
             print("  [OK] Data stored successfully")
         except Exception as e:
-            db.rollback()
             print(f"  [ERROR] Error storing data: {e}")
             print(f"  [ERROR] Error type: {type(e).__name__}")
             import traceback
             print(f"  [ERROR] Traceback:")
             traceback.print_exc()
             raise
+    
+    def build_text_signatures(self):
+        """Compute MinHash signatures of new section texts for near-duplicate detection"""
+        db = SessionLocal()
+        
+        try:
+            written = build_section_signatures(db)
+            print(f"  [OK] MinHash signatures computed for {written} sections")
+        except Exception as e:
+            db.rollback()
+            print(f"  [ERROR] Error computing text signatures: {e}")
+            raise
         finally:
             db.close()
     
     def generate_embeddings(self):
-        """Generate embeddings for all chapters, subchapters, and sections"""
+        """
+        Generate embeddings for chapters, subchapters, and sections that have none
+        
+        The store step deletes the embeddings of changed and removed sections,
+        so a refresh only embeds the delta.
+        
+        Returns:
+            Number of section embeddings written
+        """
         db = SessionLocal()
         
         try:
             # Generate chapter embeddings
             print("  Generating chapter embeddings...")
-            chapters = db.query(Chapter).all()
-            print(f"    Found {len(chapters)} chapters")
-            
-            if len(chapters) == 0:
+            if db.query(Chapter.id).first() is None:
                 print("    [WARNING] No chapters found in database!")
-                return
+                return 0
             
-            for idx, chapter in enumerate(chapters, 1):
-                print(f"      Chapter {idx}/{len(chapters)}")
-                # Create text representation
-                text = chapter.name
-                
-                # Generate embedding
-                embedding = embedding_service.generate_embedding(text)
-                
-                # Store embedding
-                chapter_embedding = ChapterEmbedding(
-                    chapter_id=chapter.id,
-                    embedding=json.dumps(embedding)
-                )
-                db.add(chapter_embedding)
+            # NOT IN a subquery, as the embedding tables have no index on the item id to join on
+            chapters = db.query(Chapter).filter(
+                Chapter.id.notin_(db.query(ChapterEmbedding.chapter_id))
+            ).all()
+            print(f"    Found {len(chapters)} chapters without embeddings")
+            
+            # Embedded as one list, so names seen in an earlier run come from the embedding cache
+            embeddings = embedding_service.generate_embeddings([chapter.name for chapter in chapters])
+            for chapter, embedding in zip(chapters, embeddings):
+                db.add(ChapterEmbedding(chapter_id=chapter.id, embedding=pack_embedding(embedding)))
+            if chapters:
+                bump_embedding_generation(db, 'chapter')
             
             db.commit()
             
             # Generate subchapter embeddings
             print("  Generating subchapter embeddings...")
-            subchapters = db.query(Subchapter).all()
-            print(f"    Found {len(subchapters)} subchapters")
+            subchapters = db.query(Subchapter).filter(
+                Subchapter.id.notin_(db.query(SubchapterEmbedding.subchapter_id))
+            ).all()
+            print(f"    Found {len(subchapters)} subchapters without embeddings")
             
-            for idx, subchapter in enumerate(subchapters, 1):
-                if idx % 5 == 0 or idx == len(subchapters):
-                    print(f"      Subchapter {idx}/{len(subchapters)}")
-                # Create text representation
-                text = f"{subchapter.chapter.name} - {subchapter.name}"
-                
-                # Generate embedding
-                embedding = embedding_service.generate_embedding(text)
-                
-                # Store embedding
-                subchapter_embedding = SubchapterEmbedding(
-                    subchapter_id=subchapter.id,
-                    embedding=json.dumps(embedding)
-                )
-                db.add(subchapter_embedding)
+            embeddings = embedding_service.generate_embeddings(
+                [f"{subchapter.chapter.name} - {subchapter.name}" for subchapter in subchapters]
+            )
+            for subchapter, embedding in zip(subchapters, embeddings):
+                db.add(SubchapterEmbedding(subchapter_id=subchapter.id, embedding=pack_embedding(embedding)))
+            if subchapters:
+                bump_embedding_generation(db, 'subchapter')
             
             db.commit()
             
             # Generate section embeddings
             print("  Generating section embeddings...")
-            sections = db.query(Section).all()
-            print(f"    Found {len(sections)} sections")
-            print(f"    Processing sections in batches of 32...")
+            missing = (
+                Section.id.notin_(db.query(SectionEmbedding.section_id)),
+                Section.removed_at.is_(None)
+            )
+            section_ids = [section_id for (section_id,) in db.query(Section.id).filter(*missing).order_by(Section.id)]
+            token_budget = auto_token_budget()
+            print(f"    Found {len(section_ids)} sections without embeddings")
+            print(f"    Processing sections in length-sorted batches of up to {token_budget} tokens...")
             
-            # Batch process sections for efficiency
-            batch_size = 32
-            total_batches = (len(sections) + batch_size - 1) // batch_size
-            for batch_num, i in enumerate(range(0, len(sections), batch_size), 1):
-                print(f"      Batch {batch_num}/{total_batches}")
-                batch = sections[i:i+batch_size]
-                
-                # Prepare texts
-                texts = []
-                for section in batch:
-                    text = f"{section.subject} {section.text}"
-                    texts.append(text)
-                
-                # Generate embeddings in batch
-                embeddings = embedding_service.generate_embeddings(texts)
+            # Windows of sections are loaded and length-sorted together, so batches pad little
+            statement = insert(SectionEmbedding.__table__)
+            embedded = 0
+            for start in range(0, len(section_ids), EMBEDDING_SORT_WINDOW):
+                window = section_ids[start:start + EMBEDDING_SORT_WINDOW]
+                rows = db.query(Section.id, Section.subject, Section.text).filter(
+                    Section.id.between(window[0], window[-1]), *missing
+                ).order_by(Section.id).all()
                 
-                # Store embeddings
-                for section, embedding in zip(batch, embeddings):
-                    section_embedding = SectionEmbedding(
-                        section_id=section.id,
-                        embedding=json.dumps(embedding)
-                    )
-                    db.add(section_embedding)
+                def store_batch(indices, embeddings):
+                    nonlocal embedded
+                    db.execute(statement, [
+                        {'section_id': rows[i][0], 'embedding': pack_embedding(embedding)}
+                        for i, embedding in zip(indices, embeddings)
+                    ])
+                    embedded += len(indices)
+                    bump_embedding_generation(db, 'section')
+                    # Committed with the batch, so a resumed run knows exactly how far embedding got
+                    if self.run_id is not None:
+                        save_checkpoint(db, self.run_id, sections_embedded=embedded,
+                                        sections_to_embed=len(section_ids))
+                    db.commit()
                 
-                db.commit()
+                embed_in_token_batches(
+                    embedding_service, [f"{subject} {text}" for _, subject, text in rows],
+                    token_budget=token_budget, on_batch=store_batch
+                )
+                print(f"      {embedded}/{len(section_ids)} sections embedded")
 
+            cache = embedding_service.cache
+            if cache is not None:
+                print(f"    Embedding cache: {cache.hits} hits, {cache.misses} misses")
             print("  [OK] Embeddings generated successfully")
+            return len(section_ids)
         except Exception as e:
             import traceback
             db.rollback()
@@ -387,6 +749,52 @@ class DataPipeline:
         finally:
             db.close()
     
+    def compute_aggregate_embeddings(self):
+        """Store section-mean embeddings for every chapter, subchapter and part"""
+        db = SessionLocal()
+        
+        try:
+            counts = build_aggregate_embeddings(db)
+            print(f"  [OK] Aggregate embeddings: {counts['chapter']} chapters, "
+                  f"{counts['subchapter']} subchapters, {counts['part']} parts")
+        except Exception as e:
+            db.rollback()
+            print(f"  [ERROR] Error computing aggregate embeddings: {e}")
+            raise
+        finally:
+            db.close()
+    
+    def build_search_index(self):
+        """Build and persist the ANN index over section embeddings; returns the number of vectors indexed"""
+        if ANN_INDEX_TYPE == 'exact':
+            print("  ANN index disabled (ANN_INDEX_TYPE = 'exact')")
+            return 0
+        
+        db = SessionLocal()
+        
+        try:
+            store = embedding_store.get_level('section', db)
+            
+            if len(store) < ANN_MIN_ITEMS:
+                # Exact search is fast enough; drop any index left from a larger corpus
+                print(f"  {len(store)} sections (< {ANN_MIN_ITEMS}), using exact search")
+                if os.path.exists(ANN_INDEX_PATH):
+                    os.remove(ANN_INDEX_PATH)
+                return 0
+            
+            print(f"  Building {ANN_INDEX_TYPE} index over {len(store)} sections...")
+            index = build_index(store)
+            index.save(ANN_INDEX_PATH)
+            print(f"  [OK] Index with {index.n_lists} lists saved to {ANN_INDEX_PATH}")
+            return len(store)
+        except Exception as e:
+            import traceback
+            print(f"  [ERROR] Error building search index: {e}")
+            print(f"  [ERROR] Traceback: {traceback.format_exc()}")
+            raise
+        finally:
+            db.close()
+    
     def get_statistics(self):
         """Get statistics about the stored data"""
         db = SessionLocal()
@@ -396,10 +804,12 @@ class DataPipeline:
                 "chapters": db.query(Chapter).count(),
                 "subchapters": db.query(Subchapter).count(),
                 "parts": db.query(Part).count(),
-                "sections": db.query(Section).count(),
+                "sections": db.query(Section).filter(Section.removed_at.is_(None)).count(),
+                "removed_sections": db.query(Section).filter(Section.removed_at.isnot(None)).count(),
                 "chapter_embeddings": db.query(ChapterEmbedding).count(),
                 "subchapter_embeddings": db.query(SubchapterEmbedding).count(),
-                "section_embeddings": db.query(SectionEmbedding).count()
+                "section_embeddings": db.query(SectionEmbedding).count(),
+                "section_signatures": db.query(SectionSignature).count()
             }
             return stats
         finally:
@@ -0,0 +1,171 @@
+"""
+Download cache for CFR bulk data
+Content-addressed archive store with conditional re-fetching
+"""
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+from app.pipeline.crawler import download_file, extract_zip, DownloadError
+from app.config import DOWNLOAD_CACHE_DIR
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadCache:
+    """
+    Local artifact cache for downloaded archives
+
+    Archives are stored once under objects/<sha256[:2]>/<sha256> and an
+    index.json maps each URL to its ETag, Last-Modified, SHA-256 and size,
+    plus the files last extracted from it. A fetch sends If-None-Match /
+    If-Modified-Since; a 304, or a download whose SHA-256 matches the cached
+    one, leaves the archive unchanged and its extraction is skipped.
+    """
+
+    def __init__(self, cache_dir=DOWNLOAD_CACHE_DIR):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+        self.incoming_dir = os.path.join(self.cache_dir, 'incoming')
+        self.index_path = os.path.join(self.cache_dir, 'index.json')
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        self.bytes_downloaded = 0  # Bytes transferred by this instance, for pipeline metrics
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  [WARNING] Ignoring unreadable download cache index: {e}")
+            return {}
+
+    def _save_index(self):
+        """Write the index atomically; callers hold self._lock"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def object_path(self, sha256):
+        """Path of the cached archive with the given content hash"""
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def get(self, url):
+        """Index entry for a URL whose archive is present in the cache, or None"""
+        with self._lock:
+            entry = self._index.get(url)
+        if entry and os.path.exists(self.object_path(entry['sha256'])):
+            return dict(entry)
+        return None
+
+    def fetch(self, url, session=None, offline=False):
+        """
+        Make sure the current archive for a URL is in the cache
+
+        Args:
+            url: Archive URL
+            session: Optional requests session
+            offline: Use the cached archive without contacting the server
+
+        Returns:
+            Tuple of (index entry, status) where status is 'downloaded',
+            'not_modified' (304), 'unchanged' (same SHA-256) or 'offline'
+        """
+        entry = self.get(url)
+
+        if offline:
+            if entry is None:
+                raise DownloadError(f"{url} is not in the download cache (offline mode)")
+            return entry, 'offline'
+
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        # A stable incoming path per URL lets an interrupted download resume on the next run
+        incoming_path = os.path.join(self.incoming_dir, hashlib.sha256(url.encode('utf-8')).hexdigest())
+        part_path = f"{incoming_path}.part"
+        resumed_bytes = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        response_headers = {}
+        downloaded = download_file(url, incoming_path, session=session,
+                                   headers=headers, response_headers=response_headers)
+
+        now = datetime.utcnow().isoformat()
+        if downloaded is None:
+            entry['checked_at'] = now
+            self._update(url, entry)
+            return entry, 'not_modified'
+
+        with self._lock:
+            self.bytes_downloaded += max(0, os.path.getsize(incoming_path) - resumed_bytes)
+        sha256 = file_sha256(incoming_path)
+        object_path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(incoming_path, object_path)
+
+        status = 'unchanged' if entry and entry['sha256'] == sha256 else 'downloaded'
+        new_entry = dict(entry or {})
+        new_entry.update({
+            'sha256': sha256,
+            'size': os.path.getsize(object_path),
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+            'fetched_at': now,
+            'checked_at': now
+        })
+        self._update(url, new_entry, previous_sha256=entry['sha256'] if entry else None)
+        return new_entry, status
+
+    def fetch_and_extract(self, url, extract_to, session=None, offline=False):
+        """
+        Fetch an archive and extract it unless that content is already extracted
+
+        Returns:
+            True if files were extracted, False if extraction was skipped
+        """
+        extract_to = os.path.abspath(extract_to)
+        os.makedirs(extract_to, exist_ok=True)
+
+        entry, status = self.fetch(url, session=session, offline=offline)
+        name = os.path.basename(url.rstrip('/'))
+
+        extracted_files = entry.get('extracted_files') or []
+        if (entry.get('extracted_sha256') == entry['sha256'] and extracted_files
+                and all(os.path.exists(path) for path in extracted_files)):
+            print(f"  [CACHE] {name}: {status.replace('_', ' ')}, extraction skipped")
+            return False
+
+        print(f"  [CACHE] {name}: {status.replace('_', ' ')}, extracting")
+        files = extract_zip(self.object_path(entry['sha256']), extract_to)
+        entry['extracted_sha256'] = entry['sha256']
+        entry['extracted_files'] = files
+        self._update(url, entry)
+        return True
+
+    def _update(self, url, entry, previous_sha256=None):
+        """Store an index entry and drop the previous archive if nothing references it"""
+        with self._lock:
+            self._index[url] = entry
+            self._save_index()
+
+            if previous_sha256 and previous_sha256 != entry['sha256']:
+                still_used = any(e.get('sha256') == previous_sha256 for e in self._index.values())
+                if not still_used and os.path.exists(self.object_path(previous_sha256)):
+                    os.remove(self.object_path(previous_sha256))
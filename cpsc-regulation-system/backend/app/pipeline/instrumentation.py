@@ -0,0 +1,114 @@
+"""
+Pipeline instrumentation for CFR Agentic AI Application
+Per-stage wall time, CPU time, peak memory and throughput, plus JSON run reports
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows
+
+from app.config import PIPELINE_REPORT_DIR, STAGE_RSS_SAMPLE_INTERVAL
+from app.process_memory import current_rss
+
+
+def _children_cpu_seconds() -> float:
+    """CPU time of finished child processes, e.g. parse workers"""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageMetrics:
+    """
+    Measures one pipeline stage
+
+    Used as a context manager around the stage. Records wall time, CPU time
+    of this process and of child processes that finished during the stage,
+    and the peak RSS seen by a sampling thread. The stage reports its
+    throughput counters with count(); each counter also gets a per-second
+    rate over the stage's wall time.
+    """
+
+    def __init__(self, stage: str, sample_interval: float = STAGE_RSS_SAMPLE_INTERVAL):
+        self.stage = stage
+        self.sample_interval = sample_interval
+        self.counters: Dict[str, float] = {}
+        self.record: Dict[str, Any] = {}
+        self._peak_rss = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def count(self, **counters):
+        """Add to throughput counters, e.g. count(items=10, bytes=4096)"""
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + (value or 0)
+
+    def _sample(self):
+        while True:
+            rss = current_rss()
+            if rss is not None and (self._peak_rss is None or rss > self._peak_rss):
+                self._peak_rss = rss
+            if self._stop.wait(self.sample_interval):
+                return
+
+    def __enter__(self):
+        self._started_at = datetime.utcnow()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._child_cpu = _children_cpu_seconds()
+        self._sampler = threading.Thread(target=self._sample, name=f'rss-{self.stage}', daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        child_cpu = _children_cpu_seconds() - self._child_cpu
+        self._stop.set()
+        self._sampler.join()
+
+        self.record = {
+            'stage': self.stage,
+            'status': 'error' if exc_type else 'completed',
+            'started_at': self._started_at.isoformat(),
+            'wall_seconds': round(wall, 3),
+            'cpu_seconds': round(cpu, 3),
+            'child_cpu_seconds': round(child_cpu, 3),
+            'peak_rss_mb': None if self._peak_rss is None else round(self._peak_rss / 2 ** 20, 1),
+        }
+        self.counters.setdefault('items', 0)
+        for name, value in self.counters.items():
+            self.record[name] = value
+            self.record[f'{name}_per_second'] = round(value / wall, 2) if wall > 0 else None
+        return False
+
+
+def write_run_report(report: Dict[str, Any], run_id: Optional[int],
+                     report_dir: str = PIPELINE_REPORT_DIR) -> str:
+    """
+    Write a pipeline run report as JSON
+
+    Args:
+        report: Report contents (options, stage metrics, statistics, ...)
+        run_id: PipelineRun id, used in the file name
+        report_dir: Directory for reports
+
+    Returns:
+        Path of the written report
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+    name = f"pipeline_run_{run_id}_{stamp}.json" if run_id is not None else f"pipeline_run_{stamp}.json"
+    path = os.path.join(report_dir, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    return path
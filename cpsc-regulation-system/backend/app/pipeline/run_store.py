@@ -0,0 +1,94 @@
+"""
+Pipeline Run Store for CFR Agentic AI Application
+Durable run records and checkpoints for resumable pipeline runs
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+
+from app.models.cfr_database import PipelineRun
+
+# Pipeline stages in execution order; a run resumes at the first one not completed
+PIPELINE_STAGES = ('crawl', 'parse', 'store', 'embeddings', 'index', 'statistics')
+
+
+def start_pipeline_run(db: Session, options: Dict[str, Any]) -> PipelineRun:
+    """
+    Create and commit the record of a new pipeline run
+
+    Args:
+        db: Database session
+        options: Options the run was started with (urls, offline, streaming)
+
+    Returns:
+        The new PipelineRun
+    """
+    run = PipelineRun(status='running', options=json.dumps(options), completed_stages='[]', checkpoint='{}')
+    db.add(run)
+    db.commit()
+    return run
+
+
+def latest_unfinished_run(db: Session) -> Optional[PipelineRun]:
+    """Newest run that did not complete, or None if the last run completed"""
+    run = db.query(PipelineRun).order_by(PipelineRun.id.desc()).first()
+    if run is None or run.status == 'completed':
+        return None
+    return run
+
+
+def previous_run(db: Session, run_id: Optional[int]) -> Optional[PipelineRun]:
+    """Newest run started before run_id (before any run if run_id is None)"""
+    query = db.query(PipelineRun)
+    if run_id is not None:
+        query = query.filter(PipelineRun.id < run_id)
+    return query.order_by(PipelineRun.id.desc()).first()
+
+
+def completed_stages(run: PipelineRun) -> List[str]:
+    return json.loads(run.completed_stages or '[]')
+
+
+def load_checkpoint(run: PipelineRun) -> Dict[str, Any]:
+    return json.loads(run.checkpoint or '{}')
+
+
+def save_checkpoint(db: Session, run_id: int, **values):
+    """
+    Merge values into a run's checkpoint
+
+    Does not commit, so the checkpoint can be written in the same
+    transaction as the work it records.
+    """
+    run = db.get(PipelineRun, run_id)
+    checkpoint = load_checkpoint(run)
+    checkpoint.update(values)
+    run.checkpoint = json.dumps(checkpoint)
+    run.updated_at = datetime.utcnow()
+    db.flush()
+
+
+def mark_stage(db: Session, run_id: int, stage: str, completed: bool = False):
+    """Record the stage a run is in, or that it finished, and commit"""
+    run = db.get(PipelineRun, run_id)
+    run.current_stage = stage
+    if completed:
+        stages = completed_stages(run)
+        if stage not in stages:
+            stages.append(stage)
+        run.completed_stages = json.dumps(stages)
+    run.updated_at = datetime.utcnow()
+    db.commit()
+
+
+def finish_pipeline_run(db: Session, run_id: int, status: str = 'completed', error_message: str = None):
+    """Mark a run completed or failed and commit"""
+    run = db.get(PipelineRun, run_id)
+    run.status = status
+    run.error_message = error_message
+    run.updated_at = datetime.utcnow()
+    if status == 'completed':
+        run.completed_at = run.updated_at
+    db.commit()
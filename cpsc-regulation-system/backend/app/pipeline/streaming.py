@@ -0,0 +1,195 @@
+"""
+Streaming ingest for CFR Agentic AI Application
+Runs parse → store → embed concurrently, connected by bounded queues
+"""
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from sqlalchemy import insert
+
+from app.pipeline.bulk_loader import HierarchyUpserter, bulk_load_session
+from app.models.cfr_database import Section, SectionEmbedding, SessionLocal
+from app.services.embedding_service import pack_embedding
+from app.services.embedding_store import bump_embedding_generation
+from app.services.embedding_batching import auto_token_budget, embed_in_token_batches
+from app.config import PIPELINE_QUEUE_SIZE, PIPELINE_EMBED_BATCH_SIZE
+
+# Marks the end of a stage's output
+_END = object()
+
+
+class StageFailed(Exception):
+    """Raised inside a stage when another stage has failed and the run is stopping"""
+
+
+def _put(channel: queue.Queue, item, stop: threading.Event):
+    """Put an item, blocking while the queue is full (backpressure) unless the run stops"""
+    while True:
+        try:
+            channel.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            if stop.is_set():
+                raise StageFailed()
+
+
+def _drain(channel: queue.Queue, stop: threading.Event) -> Iterator[Any]:
+    """Yield items until the upstream stage ends, or stop if the run fails"""
+    while True:
+        try:
+            item = channel.get(timeout=0.5)
+        except queue.Empty:
+            if stop.is_set():
+                raise StageFailed()
+            continue
+        if item is _END:
+            return
+        yield item
+
+
+def iter_parsed_volumes(xml_files: List[str], output_dir: str, workers: int,
+                        parse: Callable) -> Iterator[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+    """
+    Parse volumes in a process pool, yielding (xml file, parsed data, timing) in volume order
+
+    At most `workers` volumes are submitted ahead of the consumer, so a slow
+    consumer also holds back parsing.
+    """
+    if workers <= 1:
+        for xml_file in xml_files:
+            yield (xml_file,) + tuple(parse(xml_file, output_dir))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for xml_file in xml_files:
+            pending.append((xml_file, executor.submit(parse, xml_file, output_dir)))
+            if len(pending) >= workers:
+                done_file, future = pending.popleft()
+                yield (done_file,) + tuple(future.result())
+        while pending:
+            done_file, future = pending.popleft()
+            yield (done_file,) + tuple(future.result())
+
+
+def run_streaming_ingest(xml_files: List[str], output_dir: str, workers: int, parse: Callable,
+                         embedding_service, queue_size: int = PIPELINE_QUEUE_SIZE,
+                         embed_batch_size: int = PIPELINE_EMBED_BATCH_SIZE,
+                         on_volume: Callable = None) -> Dict[str, int]:
+    """
+    Parse, store and embed volumes as one streaming pipeline
+
+    Three threads run concurrently:
+      parse  - parses volumes in a process pool and queues each parsed volume
+      store  - upserts each volume and commits it, then queues the IDs of
+               new and changed sections in batches of embed_batch_size
+      embed  - embeds each batch of sections in length-sorted, token-budget
+               sub-batches and writes the embeddings
+    Both queues hold at most queue_size items, so a slow stage blocks the
+    one before it and memory stays bounded by a few volumes rather than the
+    whole dataset. Removed sections are tombstoned once every volume is
+    stored, except in titles with a volume that failed to parse. If a stage
+    fails, the others stop and the first error is raised.
+
+    Args:
+        xml_files: Volumes in load order
+        output_dir: Directory for the per-volume JSON/CSV outputs
+        workers: Parse worker processes
+        parse: Per-volume parse function returning (parsed data or None, timing)
+        embedding_service: Service used to embed section texts
+        queue_size: Capacity of each inter-stage queue
+        embed_batch_size: Sections per embedding batch
+        on_volume: Called with each volume's timing record as it is parsed
+
+    Returns:
+        Upsert counts (see HierarchyUpserter.finish) plus sections_embedded
+        and failed_volumes
+    """
+    parsed_queue = queue.Queue(maxsize=queue_size)
+    embed_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    result = {'sections_embedded': 0, 'failed_volumes': 0}
+    failed_titles = set()
+
+    def stage(target, output):
+        def run():
+            try:
+                target()
+                if output is not None:
+                    _put(output, _END, stop)
+            except StageFailed:
+                pass
+            except Exception as e:
+                import traceback
+                print(f"  [ERROR] {threading.current_thread().name} stage failed: {e}")
+                traceback.print_exc()
+                errors.append(e)
+                stop.set()
+        return run
+
+    def parse_stage():
+        for xml_file, parsed_data, timing in iter_parsed_volumes(xml_files, output_dir, workers, parse):
+            if on_volume:
+                on_volume(timing)
+            if parsed_data is None:
+                print(f"    [ERROR] Error parsing {xml_file}: {timing['error']}")
+                # Read by the store stage only after this stage ends, when the set is complete
+                failed_titles.add(timing.get('title', ''))
+                result['failed_volumes'] += 1
+                continue
+            print(f"    [OK] Parsed {timing['volume']}: {timing['sections']} sections in {timing['seconds']:.2f}s")
+            _put(parsed_queue, parsed_data, stop)
+
+    def store_stage():
+        with bulk_load_session() as db:
+            upserter = HierarchyUpserter(db)
+            for parsed_data in _drain(parsed_queue, stop):
+                section_ids = upserter.upsert([parsed_data])
+                db.commit()
+                for start in range(0, len(section_ids), embed_batch_size):
+                    _put(embed_queue, section_ids[start:start + embed_batch_size], stop)
+            upserter.incomplete_titles.update(failed_titles)
+            result.update(upserter.finish())
+            db.commit()
+
+    def embed_stage():
+        db = SessionLocal()
+        statement = insert(SectionEmbedding.__table__)
+        token_budget = auto_token_budget()
+        try:
+            for section_ids in _drain(embed_queue, stop):
+                rows = db.query(Section.id, Section.subject, Section.text).filter(
+                    Section.id.in_(section_ids)
+                ).order_by(Section.id).all()
+                embeddings = embed_in_token_batches(
+                    embedding_service, [f"{subject} {text}" for _, subject, text in rows],
+                    token_budget=token_budget
+                )
+                db.execute(statement, [
+                    {'section_id': section_id, 'embedding': pack_embedding(embedding)}
+                    for (section_id, _, _), embedding in zip(rows, embeddings)
+                ])
+                bump_embedding_generation(db, 'section')
+                db.commit()
+                result['sections_embedded'] += len(rows)
+        finally:
+            db.close()
+
+    threads = [
+        threading.Thread(target=stage(parse_stage, parsed_queue), name='parse'),
+        threading.Thread(target=stage(store_stage, embed_queue), name='store'),
+        threading.Thread(target=stage(embed_stage, None), name='embed'),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return result
@@ -0,0 +1,37 @@
+"""
+Process memory readings for CFR Agentic AI Application
+Shared by the pipeline instrumentation and the services, without importing either package
+"""
+
+import os
+from typing import Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None  # Optional; readings come from /proc on Linux without it
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, or None if it cannot be read"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def available_memory() -> Optional[int]:
+    """Bytes of memory available to new allocations, or None if unknown"""
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
@@ -30,7 +30,10 @@ async def search_regulations(
             request.query,
             request.level,
             cfr_db,
-            top_k=request.top_k
+            top_k=request.top_k,
+            search_mode=request.search_mode,
+            nprobe=request.nprobe,
+            branches=request.branches
         )
 
         # Get context for RAG
@@ -115,7 +118,10 @@ async def get_section_details(
     try:
         from app.models.cfr_database import Section
 
-        section = cfr_db.query(Section).filter(Section.id == section_id).first()
+        section = cfr_db.query(Section).filter(
+            Section.id == section_id,
+            Section.removed_at.is_(None)
+        ).first()
         
         if not section:
             raise HTTPException(
@@ -167,8 +173,9 @@ async def get_sections_list(
     try:
         from app.models.cfr_database import Section
 
-        sections = cfr_db.query(Section).offset(skip).limit(limit).all()
-        total_count = cfr_db.query(Section).count()
+        active_sections = cfr_db.query(Section).filter(Section.removed_at.is_(None))
+        sections = active_sections.order_by(Section.id).offset(skip).limit(limit).all()
+        total_count = active_sections.count()
 
         # Log activity
         auth_service.log_activity(
@@ -204,7 +211,7 @@ async def get_search_stats(cfr_db: Session = Depends(get_cfr_db)):
     try:
         from app.models.cfr_database import Section, Chapter, Subchapter, SectionEmbedding, ChapterEmbedding, SubchapterEmbedding
 
-        total_sections = cfr_db.query(Section).count()
+        total_sections = cfr_db.query(Section).filter(Section.removed_at.is_(None)).count()
         total_chapters = cfr_db.query(Chapter).count()
         total_subchapters = cfr_db.query(Subchapter).count()
         total_embeddings = (
@@ -0,0 +1,151 @@
+"""
+Aggregate Embeddings for CFR Agentic AI Application
+Section-mean embeddings for each chapter, subchapter and part
+"""
+
+import numpy as np
+from typing import Dict, List, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import insert, delete
+
+from app.models.cfr_database import (
+    Chapter, Subchapter, Part, Section, SectionEmbedding, AggregateEmbedding
+)
+from app.services.embedding_service import embeddings_to_matrix, pack_embedding
+
+AGGREGATE_LEVELS = ('chapter', 'subchapter', 'part')
+
+
+def group_means(keys: np.ndarray, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Mean row of the matrix for every distinct key
+
+    Args:
+        keys: Group key per row
+        matrix: Row vectors to average
+
+    Returns:
+        Tuple of (group keys, mean matrix, rows per group)
+    """
+    group_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    sums = np.zeros((len(group_keys), matrix.shape[1]), dtype=np.float64)
+    np.add.at(sums, inverse, matrix)
+    return group_keys, (sums / counts[:, None]).astype(matrix.dtype), counts
+
+
+def build_aggregate_embeddings(db: Session, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Recompute the section-mean embedding of every chapter, subchapter and part
+
+    All section embeddings are read with their hierarchy ids in one joined
+    query, and each level is averaged with a single group-by over the
+    matrix. Existing aggregates are replaced.
+
+    Args:
+        db: Database session
+        batch_size: Rows per bulk INSERT
+
+    Returns:
+        Number of aggregates written per level
+    """
+    rows = db.query(
+        SectionEmbedding.section_id, SectionEmbedding.embedding,
+        Part.id, Subchapter.id, Subchapter.chapter_id
+    ).join(
+        Section, Section.id == SectionEmbedding.section_id
+    ).join(
+        Part, Part.id == Section.part_id
+    ).join(
+        Subchapter, Subchapter.id == Part.subchapter_id
+    ).order_by(SectionEmbedding.id).all()
+
+    # Keep the first embedding per section, as the per-section lookups did
+    unique_rows, seen = [], set()
+    for row in rows:
+        if row[0] not in seen:
+            seen.add(row[0])
+            unique_rows.append(row)
+    rows = unique_rows
+
+    db.execute(delete(AggregateEmbedding))
+    counts = {level: 0 for level in AGGREGATE_LEVELS}
+    if rows:
+        matrix = embeddings_to_matrix([row[1] for row in rows])
+        level_keys = {
+            'part': np.array([row[2] for row in rows], dtype=np.int64),
+            'subchapter': np.array([row[3] for row in rows], dtype=np.int64),
+            'chapter': np.array([row[4] for row in rows], dtype=np.int64),
+        }
+
+        statement = insert(AggregateEmbedding.__table__)
+        for level in AGGREGATE_LEVELS:
+            item_ids, means, num_sections = group_means(level_keys[level], matrix)
+            records = [
+                {
+                    'level': level,
+                    'item_id': item_id,
+                    'embedding': pack_embedding(mean),
+                    'num_sections': count
+                }
+                for item_id, mean, count in zip(item_ids.tolist(), means, num_sections.tolist())
+            ]
+            for start in range(0, len(records), batch_size):
+                db.execute(statement, records[start:start + batch_size])
+            counts[level] = len(records)
+
+    db.commit()
+    return counts
+
+
+def load_aggregate_embeddings(level: str, db: Session) -> List[Dict]:
+    """
+    Stored aggregates for a level with the item names, in item id order
+
+    Aggregates are built on first use if the table has none, e.g. for a
+    database populated before they existed.
+
+    Args:
+        level: 'chapter' or 'subchapter'
+        db: Database session
+
+    Returns:
+        List of dicts with id, name, embedding (packed bytes), num_sections,
+        and chapter_name for subchapters
+    """
+    if level not in ('chapter', 'subchapter'):
+        raise ValueError(f"Invalid aggregate level: {level}. Must be 'chapter' or 'subchapter'")
+
+    if db.query(AggregateEmbedding.id).first() is None and db.query(SectionEmbedding.id).first() is not None:
+        print("  No aggregate embeddings stored, building them now...")
+        build_aggregate_embeddings(db)
+
+    if level == 'chapter':
+        rows = db.query(
+            AggregateEmbedding.item_id, AggregateEmbedding.embedding,
+            AggregateEmbedding.num_sections, Chapter.name
+        ).join(
+            Chapter, Chapter.id == AggregateEmbedding.item_id
+        ).filter(AggregateEmbedding.level == 'chapter').order_by(AggregateEmbedding.item_id).all()
+        return [
+            {'id': item_id, 'name': name, 'embedding': embedding, 'num_sections': num_sections}
+            for item_id, embedding, num_sections, name in rows
+        ]
+
+    rows = db.query(
+        AggregateEmbedding.item_id, AggregateEmbedding.embedding,
+        AggregateEmbedding.num_sections, Subchapter.name, Chapter.name
+    ).join(
+        Subchapter, Subchapter.id == AggregateEmbedding.item_id
+    ).join(
+        Chapter, Chapter.id == Subchapter.chapter_id
+    ).filter(AggregateEmbedding.level == 'subchapter').order_by(AggregateEmbedding.item_id).all()
+    return [
+        {
+            'id': item_id,
+            'name': name,
+            'chapter_name': chapter_name,
+            'embedding': embedding,
+            'num_sections': num_sections
+        }
+        for item_id, embedding, num_sections, name, chapter_name in rows
+    ]
@@ -5,20 +5,31 @@ Handles semantic similarity, overlap detection, redundancy, and parity checks
 
 import json
 import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Callable
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import func
 
 from app.models.cfr_database import (
     Chapter, Subchapter, Section,
     ChapterEmbedding, SubchapterEmbedding, SectionEmbedding,
     SimilarityResult, ParityCheck, SessionLocal
 )
-from app.services.embedding_service import EmbeddingService
-from app.config import SIMILARITY_THRESHOLD, OVERLAP_THRESHOLD, REDUNDANCY_THRESHOLD
+from app.services.embedding_service import embedding_service
+from app.services.embedding_store import normalize_rows
+from app.services.similarity_engine import (
+    iter_similar_pairs, iter_similar_pairs_parallel, iter_similar_pairs_for_rows
+)
+from app.services.similarity_store import (
+    SimilarityResultWriter, DIGEST_SIZE, vector_digests, run_snapshot,
+    start_run, finish_run, carry_over_results, latest_run, latest_run_id
+)
+from app.services.near_duplicate import find_near_duplicates
+from app.services.aggregate_embeddings import load_aggregate_embeddings
+from app.config import (
+    SIMILARITY_THRESHOLD, OVERLAP_THRESHOLD, REDUNDANCY_THRESHOLD,
+    SIMILARITY_INCREMENTAL_MAX_FRACTION
+)
 
-# Create embedding service instance
-embedding_service = EmbeddingService()
 
 
 class AnalysisService:
@@ -28,178 +39,270 @@ class AnalysisService:
         self.overlap_threshold = OVERLAP_THRESHOLD
         self.redundancy_threshold = REDUNDANCY_THRESHOLD
     
-    def analyze_semantic_similarity(self, level: str, db: Session) -> List[Dict[str, Any]]:
+    def analyze_semantic_similarity(self, level: str, db: Session,
+                                    max_pairs: int = None, workers: int = 1,
+                                    progress_callback: Callable[[int, int], None] = None,
+                                    persist_all: bool = False,
+                                    incremental: bool = False) -> List[Dict[str, Any]]:
         """
         Analyze semantic similarity at specified level (chapter/subchapter/section)
         
         Args:
             level: One of 'chapter', 'subchapter', 'section'
             db: Database session
+            max_pairs: Optional cap on the number of (highest-scoring) pairs returned
+            workers: Worker processes for the pairwise pass (1 = in-process)
+            progress_callback: Optional callable(units_done, total_units)
+            persist_all: Store every pair, not only pairs above the similarity threshold
+            incremental: Only score pairs involving items added or changed since
+                the latest run, carrying the rest over
             
         Returns:
             List of similarity results
         """
         results = []
+        pairwise_options = {
+            'workers': workers,
+            'progress_callback': progress_callback,
+            'persist_all': persist_all,
+            'incremental': incremental
+        }
         
         if level == "chapter":
-            results = self._analyze_chapter_similarity(db)
+            results = self._analyze_chapter_similarity(db, **pairwise_options)
         elif level == "subchapter":
-            results = self._analyze_subchapter_similarity(db)
+            results = self._analyze_subchapter_similarity(db, **pairwise_options)
         elif level == "section":
-            results = self._analyze_section_similarity(db)
+            results = self._analyze_section_similarity(db, **pairwise_options)
         else:
             raise ValueError(f"Invalid level: {level}. Must be 'chapter', 'subchapter', or 'section'")
         
+        if max_pairs is not None:
+            results = results[:max_pairs]
+        
         return results
     
-    def _analyze_chapter_similarity(self, db: Session) -> List[Dict[str, Any]]:
+    def _analyze_chapter_similarity(self, db: Session, **pairwise_options) -> List[Dict[str, Any]]:
         """
         Analyze similarity between chapters based on their sections
-        Chapter similarity is computed from aggregated section embeddings
+        Chapter similarity uses the stored mean of each chapter's section embeddings
         """
-        chapters = db.query(Chapter).all()
-        embeddings_data = []
-        
-        # Collect and aggregate section embeddings for each chapter
-        for chapter in chapters:
-            section_embeddings = []
-            for subchapter in chapter.subchapters:
-                for part in subchapter.parts:
-                    for section in part.sections:
-                        emb = db.query(SectionEmbedding).filter(
-                            SectionEmbedding.section_id == section.id
-                        ).first()
-                        if emb:
-                            section_embeddings.append(json.loads(emb.embedding))
-            
-            if section_embeddings:
-                # Average all section embeddings
-                avg_embedding = np.mean(section_embeddings, axis=0).tolist()
-                embeddings_data.append({
-                    'id': chapter.id,
-                    'name': chapter.name,
-                    'embedding': json.dumps(avg_embedding),
-                    'num_sections': len(section_embeddings)
-                })
+        embeddings_data = load_aggregate_embeddings('chapter', db)
         
         print(f"Analyzing chapter similarity...")
-        return self._compute_pairwise_similarity(embeddings_data, 'chapter', db, max_comparisons=500)
+        return self._compute_pairwise_similarity(embeddings_data, 'chapter', db, **pairwise_options)
     
-    def _analyze_subchapter_similarity(self, db: Session) -> List[Dict[str, Any]]:
+    def _analyze_subchapter_similarity(self, db: Session, **pairwise_options) -> List[Dict[str, Any]]:
         """
         Analyze similarity between subchapters based on their sections
-        Subchapter similarity is computed from aggregated section embeddings
+        Subchapter similarity uses the stored mean of each subchapter's section embeddings
         """
-        subchapters = db.query(Subchapter).all()
-        embeddings_data = []
-        
-        # Collect and aggregate section embeddings for each subchapter
-        for subchapter in subchapters:
-            section_embeddings = []
-            for part in subchapter.parts:
-                for section in part.sections:
-                    emb = db.query(SectionEmbedding).filter(
-                        SectionEmbedding.section_id == section.id
-                    ).first()
-                    if emb:
-                        section_embeddings.append(json.loads(emb.embedding))
-            
-            if section_embeddings:
-                # Average all section embeddings
-                avg_embedding = np.mean(section_embeddings, axis=0).tolist()
-                embeddings_data.append({
-                    'id': subchapter.id,
-                    'name': subchapter.name,
-                    'chapter_name': subchapter.chapter.name,
-                    'embedding': json.dumps(avg_embedding),
-                    'num_sections': len(section_embeddings)
-                })
+        embeddings_data = load_aggregate_embeddings('subchapter', db)
         
         print(f"Analyzing subchapter similarity...")
-        return self._compute_pairwise_similarity(embeddings_data, 'subchapter', db, max_comparisons=1000)
+        return self._compute_pairwise_similarity(embeddings_data, 'subchapter', db, **pairwise_options)
     
-    def _analyze_section_similarity(self, db: Session) -> List[Dict[str, Any]]:
+    def _analyze_section_similarity(self, db: Session, **pairwise_options) -> List[Dict[str, Any]]:
         """Analyze similarity between sections"""
-        sections = db.query(Section).all()
-        embeddings_data = []
+        rows = db.query(
+            Section.id, Section.section_number, Section.subject, SectionEmbedding.embedding
+        ).join(
+            SectionEmbedding, SectionEmbedding.section_id == Section.id
+        ).filter(Section.removed_at.is_(None)).order_by(Section.id, SectionEmbedding.id)
         
-        # Collect embeddings
-        for section in sections:
-            emb = db.query(SectionEmbedding).filter(SectionEmbedding.section_id == section.id).first()
-            if emb:
-                embeddings_data.append({
-                    'id': section.id,
-                    'section_number': section.section_number,
-                    'subject': section.subject,
-                    'embedding': emb.embedding
-                })
+        # Collect embeddings in one query, keeping the first per section
+        embeddings_data = []
+        for section_id, section_number, subject, embedding in rows:
+            if embeddings_data and embeddings_data[-1]['id'] == section_id:
+                continue
+            embeddings_data.append({
+                'id': section_id,
+                'section_number': section_number,
+                'subject': subject,
+                'embedding': embedding
+            })
         
-        return self._compute_pairwise_similarity(embeddings_data, 'section', db)
+        return self._compute_pairwise_similarity(embeddings_data, 'section', db, **pairwise_options)
     
     def _compute_pairwise_similarity(self, embeddings_data: List[Dict], 
-                                    item_type: str, db: Session) -> List[Dict[str, Any]]:
-        """Compute pairwise similarity for all items"""
+                                    item_type: str, db: Session, workers: int = 1,
+                                    progress_callback: Callable[[int, int], None] = None,
+                                    persist_all: bool = False,
+                                    incremental: bool = False) -> List[Dict[str, Any]]:
+        """
+        Compute pairwise similarity for all items
+        
+        Scores are computed tile by tile over the normalized embedding matrix
+        (see similarity_engine), sharded across worker processes when
+        workers > 1. Pairs are streamed into a new similarity run with bulk
+        inserts; superseded runs for the level are dropped when it completes.
+        
+        Every run records a snapshot of the item ids and vector digests it
+        analysed. With incremental=True, pairs between unchanged items are
+        carried over from the latest run and only (new or changed) x all
+        pairs are scored; pairs of deleted items are retired. It falls back
+        to a full run when there is no comparable previous run or too many
+        items changed.
+        """
         results = []
         n = len(embeddings_data)
+        persist_threshold = -1.0 if persist_all else self.similarity_threshold
         
-        for i in range(n):
-            for j in range(i + 1, n):
-                item1 = embeddings_data[i]
-                item2 = embeddings_data[j]
-                
-                # Compute similarity
-                similarity = embedding_service.compute_similarity(
-                    item1['embedding'],
-                    item2['embedding']
+        matrix = normalize_rows(embedding_service.to_matrix(
+            [item['embedding'] for item in embeddings_data]
+        ))
+        item_ids = np.array([item['id'] for item in embeddings_data], dtype=np.int64)
+        digests = vector_digests(matrix)
+        fingerprint = db.query(func.max(SectionEmbedding.id)).scalar()
+        
+        base_run, changed_rows, deleted_ids = None, None, set()
+        if incremental:
+            base_run, changed_rows, deleted_ids = self._incremental_plan(
+                item_type, db, item_ids, digests, persist_threshold
+            )
+        
+        run = start_run(
+            db, item_type, self.similarity_threshold, persist_threshold,
+            item_ids=item_ids, item_digests=digests, embedding_fingerprint=fingerprint,
+            mode='incremental' if base_run else 'full',
+            base_run_id=base_run.id if base_run else None
+        )
+        # Committed up front so a failed analysis still leaves its run, marked 'error'
+        db.commit()
+        writer = SimilarityResultWriter(
+            db, run.id, item_type, item_ids,
+            self.overlap_threshold, self.redundancy_threshold
+        )
+        
+        try:
+            carried = 0
+            if base_run:
+                stale_ids = set(item_ids[changed_rows].tolist()) | deleted_ids
+                carried = carry_over_results(db, base_run.id, run.id, stale_ids)
+                tiles = iter_similar_pairs_for_rows(
+                    matrix, changed_rows, persist_threshold, progress_callback=progress_callback
                 )
-                
-                # Determine overlap and redundancy
-                is_overlap = similarity >= self.overlap_threshold
-                is_redundant = similarity >= self.redundancy_threshold
-                
-                # Store in database
-                sim_result = SimilarityResult(
-                    item1_type=item_type,
-                    item1_id=item1['id'],
-                    item2_type=item_type,
-                    item2_id=item2['id'],
-                    similarity_score=similarity,
-                    is_overlap=is_overlap,
-                    is_redundant=is_redundant
+            elif workers > 1:
+                tiles = iter_similar_pairs_parallel(
+                    matrix, persist_threshold,
+                    workers=workers, progress_callback=progress_callback
                 )
-                db.add(sim_result)
+            else:
+                # Stream tile by tile so persist_all never holds every pair at once
+                tiles = iter_similar_pairs(
+                    matrix, persist_threshold, progress_callback=progress_callback
+                )
+            
+            for rows, cols, scores in tiles:
+                writer.write(rows, cols, scores)
                 
-                # Add to results if above threshold
-                if similarity >= self.similarity_threshold:
-                    result = {
-                        'item1_id': item1['id'],
-                        'item2_id': item2['id'],
-                        'similarity_score': similarity,
-                        'is_overlap': is_overlap,
-                        'is_redundant': is_redundant
-                    }
-                    
-                    # Add names based on type
-                    if item_type == 'chapter':
-                        result['item1_name'] = item1['name']
-                        result['item2_name'] = item2['name']
-                    elif item_type == 'subchapter':
-                        result['item1_name'] = f"{item1['chapter_name']} - {item1['name']}"
-                        result['item2_name'] = f"{item2['chapter_name']} - {item2['name']}"
-                    elif item_type == 'section':
-                        result['item1_name'] = f"{item1['section_number']}: {item1['subject']}"
-                        result['item2_name'] = f"{item2['section_number']}: {item2['subject']}"
-                    
-                    results.append(result)
+                if base_run:
+                    continue
+                keep = scores >= self.similarity_threshold
+                for i, j, similarity in zip(rows[keep].tolist(), cols[keep].tolist(), scores[keep].tolist()):
+                    results.append(self._format_pair(embeddings_data[i], embeddings_data[j], similarity, item_type))
+            
+            finish_run(db, run, carried + writer.rows_written)
+            if base_run:
+                results = self._run_results(run.id, embeddings_data, item_type, db)
+            db.commit()
+        except Exception:
+            # Drops the partial results; the run itself was committed
+            db.rollback()
+            finish_run(db, run, 0, status='error')
+            db.commit()
+            raise
         
-        db.commit()
-        print(f"  [OK] Found {len(results)} similar pairs (from {comparisons_done} comparisons)")
+        if base_run:
+            comparisons_done = len(changed_rows) * n - len(changed_rows) * (len(changed_rows) + 1) // 2
+            print(f"  [OK] Incremental run over {len(changed_rows)} new/changed and {len(deleted_ids)} "
+                  f"deleted {item_type}s: {carried} pairs carried over from run {base_run.id}")
+        else:
+            comparisons_done = n * (n - 1) // 2
+        print(f"  [OK] Found {len(results)} similar pairs (from {comparisons_done} comparisons, "
+              f"{writer.rows_written} stored in run {run.id})")
         
         # Sort by similarity score (descending)
         results.sort(key=lambda x: x['similarity_score'], reverse=True)
         
         return results
     
+    def _incremental_plan(self, item_type: str, db: Session, item_ids: np.ndarray,
+                          digests: bytes, persist_threshold: float):
+        """
+        Compare the current items against the latest run's snapshot
+        
+        Returns:
+            Tuple of (base run or None for a full run, matrix rows of new or
+            changed items, ids of deleted items)
+        """
+        base_run = latest_run(db, item_type)
+        snapshot = run_snapshot(base_run) if base_run else None
+        if snapshot is None:
+            print(f"  No previous {item_type} run with a snapshot, running full analysis")
+            return None, None, set()
+        if base_run.persist_threshold != persist_threshold or base_run.similarity_threshold != self.similarity_threshold:
+            print(f"  Thresholds changed since run {base_run.id}, running full analysis")
+            return None, None, set()
+        
+        changed_rows = np.array([
+            row for row, item_id in enumerate(item_ids.tolist())
+            if snapshot.get(item_id) != digests[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE]
+        ], dtype=np.int64)
+        deleted_ids = set(snapshot) - set(item_ids.tolist())
+        
+        if len(changed_rows) > SIMILARITY_INCREMENTAL_MAX_FRACTION * len(item_ids):
+            print(f"  {len(changed_rows)} of {len(item_ids)} {item_type}s changed, running full analysis")
+            return None, None, set()
+        return base_run, changed_rows, deleted_ids
+    
+    def _run_results(self, run_id: int, embeddings_data: List[Dict], item_type: str,
+                     db: Session) -> List[Dict[str, Any]]:
+        """Format the stored pairs of a run that are at or above the similarity threshold"""
+        items = {item['id']: item for item in embeddings_data}
+        pairs = db.query(
+            SimilarityResult.item1_id, SimilarityResult.item2_id, SimilarityResult.similarity_score
+        ).filter(
+            SimilarityResult.run_id == run_id,
+            SimilarityResult.similarity_score >= self.similarity_threshold
+        ).all()
+        return [
+            self._format_pair(items[item1_id], items[item2_id], score, item_type)
+            for item1_id, item2_id, score in pairs
+        ]
+    
+    def _format_pair(self, item1: Dict, item2: Dict, similarity: float,
+                     item_type: str) -> Dict[str, Any]:
+        """Build the API result for one similar pair"""
+        result = {
+            'item1_id': item1['id'],
+            'item2_id': item2['id'],
+            'similarity_score': similarity,
+            'is_overlap': similarity >= self.overlap_threshold,
+            'is_redundant': similarity >= self.redundancy_threshold
+        }
+        
+        # Add names based on type
+        if item_type == 'chapter':
+            result['item1_name'] = item1['name']
+            result['item2_name'] = item2['name']
+        elif item_type == 'subchapter':
+            result['item1_name'] = f"{item1['chapter_name']} - {item1['name']}"
+            result['item2_name'] = f"{item2['chapter_name']} - {item2['name']}"
+        elif item_type == 'section':
+            result['item1_name'] = f"{item1['section_number']}: {item1['subject']}"
+            result['item2_name'] = f"{item2['section_number']}: {item2['subject']}"
+        
+        return result
+    
+    def _latest_results(self, level: str, db: Session):
+        """Query over the similarity results of the newest completed run for a level"""
+        query = db.query(SimilarityResult).filter(SimilarityResult.item1_type == level)
+        run_id = latest_run_id(db, level)
+        if run_id is not None:
+            query = query.filter(SimilarityResult.run_id == run_id)
+        return query
+    
     def check_overlaps(self, level: str, db: Session) -> List[Dict[str, Any]]:
         """
         Check for overlaps at specified level
@@ -211,11 +314,8 @@ class AnalysisService:
         Returns:
             List of overlapping items
         """
-        overlaps = db.query(SimilarityResult).filter(
-            and_(
-                SimilarityResult.item1_type == level,
-                SimilarityResult.is_overlap == True
-            )
+        overlaps = self._latest_results(level, db).filter(
+            SimilarityResult.is_overlap == True
         ).all()
         
         return [
@@ -227,22 +327,34 @@ class AnalysisService:
             for o in overlaps
         ]
     
-    def check_redundancy(self, level: str, db: Session) -> List[Dict[str, Any]]:
+    def check_redundancy(self, level: str, db: Session, method: str = 'auto') -> List[Dict[str, Any]]:
         """
         Check for redundancy at specified level
         
         Args:
             level: One of 'chapter', 'subchapter', 'section'
             db: Database session
+            method: 'embedding' reads the latest similarity run, 'text' runs
+                the MinHash/LSH near-duplicate detector (sections only), and
+                'auto' uses 'text' for sections with no similarity run yet
             
         Returns:
             List of redundant items
         """
-        redundancies = db.query(SimilarityResult).filter(
-            and_(
-                SimilarityResult.item1_type == level,
-                SimilarityResult.is_redundant == True
-            )
+        if level == 'section' and (
+            method == 'text' or (method == 'auto' and latest_run_id(db, level) is None)
+        ):
+            return [
+                {
+                    'item1_id': pair['item1_id'],
+                    'item2_id': pair['item2_id'],
+                    'similarity_score': pair['text_similarity']
+                }
+                for pair in find_near_duplicates(db)
+            ]
+        
+        redundancies = self._latest_results(level, db).filter(
+            SimilarityResult.is_redundant == True
         ).all()
         
         return [
@@ -314,7 +426,7 @@ class AnalysisService:
                 })
         
         elif level == "section":
-            sections = db.query(Section).all()
+            sections = db.query(Section).filter(Section.removed_at.is_(None)).all()
             for section in sections:
                 # Check if section has text
                 has_text = bool(section.text and section.text.strip())
@@ -356,29 +468,21 @@ class AnalysisService:
         elif level == "subchapter":
             item_count = db.query(Subchapter).count()
         elif level == "section":
-            item_count = db.query(Section).count()
+            item_count = db.query(Section).filter(Section.removed_at.is_(None)).count()
         else:
             item_count = 0
         
         # Count similarity results
-        similarity_count = db.query(SimilarityResult).filter(
-            SimilarityResult.item1_type == level
-        ).count()
+        similarity_count = self._latest_results(level, db).count()
         
         # Count overlaps
-        overlap_count = db.query(SimilarityResult).filter(
-            and_(
-                SimilarityResult.item1_type == level,
-                SimilarityResult.is_overlap == True
-            )
+        overlap_count = self._latest_results(level, db).filter(
+            SimilarityResult.is_overlap == True
         ).count()
         
         # Count redundancies
-        redundancy_count = db.query(SimilarityResult).filter(
-            and_(
-                SimilarityResult.item1_type == level,
-                SimilarityResult.is_redundant == True
-            )
+        redundancy_count = self._latest_results(level, db).filter(
+            SimilarityResult.is_redundant == True
         ).count()
         
         # Count parity checks
@@ -0,0 +1,262 @@
+"""
+Approximate Nearest-Neighbour Index for CFR Agentic AI Application
+CPU-only IVF-flat index over the resident section embedding matrix
+"""
+
+import os
+import threading
+import numpy as np
+from typing import List, Optional, Tuple
+
+from app.services.embedding_store import LevelMatrix, top_k_indices
+from app.config import ANN_INDEX_TYPE, ANN_INDEX_PATH, ANN_N_LISTS, ANN_DEFAULT_NPROBE
+
+
+class ExactIndex:
+    """Brute-force search over the resident matrix; the fallback for every index type"""
+
+    kind = 'exact'
+
+    def search(self, store: LevelMatrix, query_vec: np.ndarray, top_k: int,
+               **params) -> List[Tuple[int, float]]:
+        return store.search(query_vec, top_k)
+
+
+class IVFFlatIndex:
+    """
+    Inverted-file index with exact (flat) scoring inside each list
+
+    Vectors are partitioned by spherical k-means into n_lists cells. A query
+    scores the centroids, then only the vectors in the nprobe closest cells.
+    The index stores item ids per cell rather than vectors; vectors are read
+    from the LevelMatrix at query time so nothing is held twice.
+    """
+
+    kind = 'ivf_flat'
+
+    def __init__(self, centroids: np.ndarray, list_ids: np.ndarray,
+                 list_offsets: np.ndarray, fingerprint: Optional[int] = None):
+        self.centroids = centroids
+        self.list_ids = list_ids
+        self.list_offsets = list_offsets
+        self.fingerprint = fingerprint
+        self._bound_store = None
+        self._list_rows = None
+        self._lock = threading.Lock()
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, ids: np.ndarray, matrix: np.ndarray, n_lists: int = None,
+              n_iter: int = 10, seed: int = 42, fingerprint: Optional[int] = None) -> 'IVFFlatIndex':
+        """
+        Train centroids and assign every vector to its nearest list
+
+        Args:
+            ids: Item ids, parallel to matrix rows
+            matrix: L2-normalized embedding matrix
+            n_lists: Number of lists (default: ~4 * sqrt(n))
+            n_iter: k-means iterations
+            seed: Random seed for centroid initialisation and sampling
+            fingerprint: LevelMatrix.fingerprint (embedding generation) the index
+                was built from; get_index_for only serves it while they match
+
+        Returns:
+            Built IVFFlatIndex
+        """
+        n = len(matrix)
+        if n == 0:
+            raise ValueError("Cannot build an index over zero vectors")
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+
+        rng = np.random.default_rng(seed)
+
+        # Train on a sample, as IVF training quality saturates quickly
+        sample_size = min(n, 256 * n_lists)
+        sample = matrix[rng.choice(n, sample_size, replace=False)] if sample_size < n else matrix
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assignments = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=n_lists)
+
+            # Re-seed empty lists from random sample points
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = (sums / np.maximum(norms, 1e-10)).astype(matrix.dtype)
+
+        assignments = cls._assign(matrix, centroids)
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        return cls(centroids, np.asarray(ids, dtype=np.int64)[order], list_offsets, fingerprint)
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+        """Nearest centroid (by inner product) for each vector, in chunks to bound memory"""
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            block = vectors[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def save(self, path: str):
+        """Persist the index as an uncompressed .npz file, replacing any previous one atomically"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            kind=np.array(self.kind),
+            centroids=self.centroids,
+            list_ids=self.list_ids,
+            list_offsets=self.list_offsets,
+            fingerprint=np.array(-1 if self.fingerprint is None else self.fingerprint, dtype=np.int64)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'IVFFlatIndex':
+        """Load an index written by save()"""
+        with np.load(path) as data:
+            fingerprint = int(data['fingerprint'])
+            return cls(
+                data['centroids'],
+                data['list_ids'],
+                data['list_offsets'],
+                None if fingerprint < 0 else fingerprint
+            )
+
+    def _rows_for(self, store: LevelMatrix) -> np.ndarray:
+        """Map list ids to rows of the given store, cached per store instance"""
+        if self._bound_store is not store:
+            with self._lock:
+                if self._bound_store is not store:
+                    self._list_rows = np.array(
+                        [store.positions.get(int(item_id), -1) for item_id in self.list_ids],
+                        dtype=np.int64
+                    )
+                    self._bound_store = store
+        return self._list_rows
+
+    def search(self, store: LevelMatrix, query_vec: np.ndarray, top_k: int,
+               nprobe: int = None, **params) -> List[Tuple[int, float]]:
+        """
+        Search the nprobe closest lists
+
+        Args:
+            store: Resident matrix the index was built from
+            query_vec: Query embedding
+            top_k: Number of results to return
+            nprobe: Lists to scan (default: ANN_DEFAULT_NPROBE)
+
+        Returns:
+            List of (row, cosine similarity) tuples, best first
+        """
+        query_vec = np.asarray(query_vec, dtype=store.matrix.dtype)
+        query_norm = np.linalg.norm(query_vec)
+        if query_norm == 0 or len(store) == 0:
+            return store.search(query_vec, top_k)
+        query_vec = query_vec / query_norm
+
+        nprobe = max(1, min(nprobe or ANN_DEFAULT_NPROBE, self.n_lists))
+        probe = top_k_indices(self.centroids @ query_vec, nprobe)
+
+        list_rows = self._rows_for(store)
+        rows = np.concatenate([
+            list_rows[self.list_offsets[cell]:self.list_offsets[cell + 1]] for cell in probe
+        ])
+        rows = rows[rows >= 0]
+        if len(rows) == 0:
+            return []
+
+        scores = store.matrix[rows] @ query_vec
+        best = top_k_indices(scores, top_k)
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+
+# Available index implementations, selected with ANN_INDEX_TYPE
+ANN_INDEX_TYPES = {
+    'ivf_flat': IVFFlatIndex,
+}
+
+_exact_index = ExactIndex()
+_loaded_index = None
+_loaded_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def build_index(store: LevelMatrix, index_type: str = ANN_INDEX_TYPE, **params):
+    """Build an index of the configured type over a resident matrix"""
+    if index_type not in ANN_INDEX_TYPES:
+        raise ValueError(f"Unknown ANN index type: {index_type}")
+    params.setdefault('n_lists', ANN_N_LISTS)
+    return ANN_INDEX_TYPES[index_type].build(
+        store.ids, store.matrix, fingerprint=store.fingerprint, **params
+    )
+
+
+def load_index(path: str = ANN_INDEX_PATH):
+    """Load the persisted index, reusing the cached copy until the file changes"""
+    global _loaded_index, _loaded_index_mtime
+
+    if not os.path.exists(path):
+        _loaded_index = None
+        _loaded_index_mtime = None
+        return None
+
+    mtime = os.path.getmtime(path)
+    if _loaded_index is not None and _loaded_index_mtime == mtime:
+        return _loaded_index
+
+    with _index_lock:
+        if _loaded_index is None or _loaded_index_mtime != mtime:
+            with np.load(path) as data:
+                kind = str(data['kind'])
+            index_cls = ANN_INDEX_TYPES.get(kind)
+            if index_cls is None:
+                print(f"[ANN] Ignoring index of unknown type '{kind}' at {path}")
+                return None
+            _loaded_index = index_cls.load(path)
+            _loaded_index_mtime = mtime
+            print(f"[ANN] Loaded {kind} index with {_loaded_index.n_lists} lists")
+        return _loaded_index
+
+
+def get_index_for(store: LevelMatrix, search_mode: str = 'auto', path: str = ANN_INDEX_PATH):
+    """
+    Pick the index to serve a query against a resident matrix
+
+    Args:
+        store: Resident section matrix
+        search_mode: 'auto' or 'ann' use the persisted index when it matches
+            the current embeddings; 'exact' always brute-forces
+        path: Persisted index file
+
+    Returns:
+        An index object with a search(store, query_vec, top_k, **params) method
+    """
+    if search_mode == 'exact' or ANN_INDEX_TYPE == 'exact':
+        return _exact_index
+
+    try:
+        index = load_index(path)
+    except Exception as e:
+        print(f"[ANN] Failed to load index, using exact search: {e}")
+        return _exact_index
+
+    if index is None or index.fingerprint != store.fingerprint:
+        if search_mode == 'ann':
+            print("[ANN] No up-to-date index available, using exact search")
+        return _exact_index
+
+    return index
@@ -16,6 +16,8 @@ from app.models.cfr_database import (
 )
 from app.config import CLUSTERING_ALGORITHM, DEFAULT_N_CLUSTERS
 from app.services.llm_service import get_llm_service
+from app.services.embedding_service import unpack_embedding
+from app.services.aggregate_embeddings import load_aggregate_embeddings
 
 
 class ClusteringService:
@@ -77,64 +79,21 @@ class ClusteringService:
         embeddings = []
         items = []
         
-        if level == 'chapter':
-            chapters = db.query(Chapter).all()
-            for chapter in chapters:
-                # Aggregate embeddings from all sections within this chapter
-                section_embeddings = []
-                for subchapter in chapter.subchapters:
-                    for part in subchapter.parts:
-                        for section in part.sections:
-                            emb = db.query(SectionEmbedding).filter(
-                                SectionEmbedding.section_id == section.id
-                            ).first()
-                            if emb:
-                                section_embeddings.append(json.loads(emb.embedding))
-                
-                if section_embeddings:
-                    # Average all section embeddings for this chapter
-                    avg_embedding = np.mean(section_embeddings, axis=0).tolist()
-                    embeddings.append(avg_embedding)
-                    items.append({
-                        'id': chapter.id,
-                        'name': chapter.name,
-                        'type': 'chapter',
-                        'num_sections': len(section_embeddings)
-                    })
-        
-        elif level == 'subchapter':
-            subchapters = db.query(Subchapter).all()
-            for subchapter in subchapters:
-                # Aggregate embeddings from all sections within this subchapter
-                section_embeddings = []
-                for part in subchapter.parts:
-                    for section in part.sections:
-                        emb = db.query(SectionEmbedding).filter(
-                            SectionEmbedding.section_id == section.id
-                        ).first()
-                        if emb:
-                            section_embeddings.append(json.loads(emb.embedding))
-                
-                if section_embeddings:
-                    # Average all section embeddings for this subchapter
-                    avg_embedding = np.mean(section_embeddings, axis=0).tolist()
-                    embeddings.append(avg_embedding)
-                    items.append({
-                        'id': subchapter.id,
-                        'name': subchapter.name,
-                        'chapter_name': subchapter.chapter.name,
-                        'type': 'subchapter',
-                        'num_sections': len(section_embeddings)
-                    })
+        if level in ('chapter', 'subchapter'):
+            # Section-mean embeddings precomputed by the pipeline
+            for item in load_aggregate_embeddings(level, db):
+                embeddings.append(unpack_embedding(item.pop('embedding')))
+                item['type'] = level
+                items.append(item)
         
         elif level == 'section':
-            sections = db.query(Section).all()
+            sections = db.query(Section).filter(Section.removed_at.is_(None)).all()
             for section in sections:
                 emb = db.query(SectionEmbedding).filter(
                     SectionEmbedding.section_id == section.id
                 ).first()
                 if emb:
-                    embeddings.append(json.loads(emb.embedding))
+                    embeddings.append(unpack_embedding(emb.embedding))
                     items.append({
                         'id': section.id,
                         'section_number': section.section_number,
@@ -0,0 +1,139 @@
+"""
+Embedding Batching for CFR Agentic AI Application
+Length-sorted, token-budget batches for transformer embedding models
+"""
+
+from typing import Callable, Iterator, List, Optional, Sequence
+
+from app.config import (
+    EMBEDDING_TOKEN_BUDGET, EMBEDDING_MAX_BATCH_SIZE, EMBEDDING_MAX_SEQ_LENGTH,
+    EMBEDDING_BYTES_PER_TOKEN, EMBEDDING_MEMORY_FRACTION,
+    EMBEDDING_MIN_TOKEN_BUDGET, EMBEDDING_MAX_TOKEN_BUDGET
+)
+from app.process_memory import available_memory
+
+
+def estimate_token_length(text: str, max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH) -> int:
+    """
+    Approximate WordPiece length of a text, capped at the model's sequence length
+
+    English regulatory text averages about 4 tokens per 3 words; 2 tokens
+    are added for [CLS] and [SEP].
+    """
+    if not text:
+        return 2
+    return min(max_seq_length, len(text.split()) * 4 // 3 + 2)
+
+
+def token_lengths(embedding_service, texts: Sequence[str],
+                  max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH) -> List[int]:
+    """Token length of each text, from the service's tokenizer if it has one"""
+    if hasattr(embedding_service, 'token_lengths'):
+        return [min(max_seq_length, length) for length in embedding_service.token_lengths(texts)]
+    return [estimate_token_length(text, max_seq_length) for text in texts]
+
+
+def auto_token_budget(memory: Optional[int] = None,
+                      bytes_per_token: int = EMBEDDING_BYTES_PER_TOKEN,
+                      memory_fraction: float = EMBEDDING_MEMORY_FRACTION) -> int:
+    """
+    Padded tokens per batch that fit in a fraction of available memory
+
+    Returns EMBEDDING_TOKEN_BUDGET when it is configured; otherwise sizes the
+    budget from available memory, clamped to the configured bounds.
+    """
+    if EMBEDDING_TOKEN_BUDGET:
+        return EMBEDDING_TOKEN_BUDGET
+    memory = memory if memory is not None else available_memory()
+    if memory is None:
+        return EMBEDDING_MIN_TOKEN_BUDGET
+    budget = int(memory * memory_fraction) // bytes_per_token
+    return max(EMBEDDING_MIN_TOKEN_BUDGET, min(EMBEDDING_MAX_TOKEN_BUDGET, budget))
+
+
+def token_budget_batches(lengths: Sequence[int], token_budget: int,
+                         max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE) -> Iterator[List[int]]:
+    """
+    Group texts into batches whose padded size fits a token budget
+
+    Texts are taken longest first, so each batch holds texts of similar
+    length and pads little; a batch's cost is its size times its longest
+    text. Long texts therefore go in small batches and short texts in large
+    ones, and the most memory-hungry batch runs first.
+
+    Args:
+        lengths: Token length of each text
+        token_budget: Maximum padded tokens per batch
+        max_batch_size: Maximum texts per batch
+
+    Yields:
+        Lists of indices into lengths
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batch, batch_max = [], 0
+    for index in order:
+        longest = max(batch_max, lengths[index])
+        if batch and (longest * (len(batch) + 1) > token_budget or len(batch) >= max_batch_size):
+            yield batch
+            batch, longest = [], lengths[index]
+        batch.append(index)
+        batch_max = longest
+    if batch:
+        yield batch
+
+
+def _is_out_of_memory(error: Exception) -> bool:
+    return isinstance(error, MemoryError) or (
+        isinstance(error, RuntimeError) and 'memory' in str(error).lower()
+    )
+
+
+def embed_in_token_batches(embedding_service, texts: Sequence[str], token_budget: int = None,
+                           max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+                           on_batch: Callable[[List[int], List], None] = None) -> List:
+    """
+    Embed texts in length-sorted, token-budget batches
+
+    The budget starts at auto_token_budget() unless given. If a batch runs
+    out of memory, the budget is halved and the batch retried, down to one
+    text per batch, and the smaller budget is kept for the remaining batches.
+
+    Args:
+        embedding_service: Service with generate_embeddings(texts, batch_size=...)
+        texts: Texts to embed
+        token_budget: Padded tokens per batch (default: auto-tuned)
+        max_batch_size: Maximum texts per batch
+        on_batch: Called with (indices, embeddings) after every batch, e.g. to
+            write the batch; when given, embeddings are not collected
+
+    Returns:
+        Embeddings in the order of texts (empty if on_batch is given)
+    """
+    budget = token_budget or auto_token_budget()
+    lengths = token_lengths(embedding_service, texts)
+    results = [None] * len(texts) if on_batch is None else []
+
+    pending = list(token_budget_batches(lengths, budget, max_batch_size))
+    while pending:
+        batch = pending.pop(0)
+        try:
+            embeddings = embedding_service.generate_embeddings([texts[i] for i in batch], batch_size=len(batch))
+        except Exception as e:
+            if not _is_out_of_memory(e) or len(batch) == 1:
+                raise
+            budget = max(1, budget // 2)
+            print(f"    [WARNING] Embedding batch of {len(batch)} ran out of memory, token budget lowered to {budget}")
+            remaining = [i for rest in pending for i in rest]
+            half = len(batch) // 2
+            pending = [batch[:half], batch[half:]] + [
+                [remaining[j] for j in rest]
+                for rest in token_budget_batches([lengths[i] for i in remaining], budget, max_batch_size)
+            ]
+            continue
+
+        if on_batch is not None:
+            on_batch(batch, embeddings)
+        else:
+            for index, embedding in zip(batch, embeddings):
+                results[index] = embedding
+    return results
@@ -0,0 +1,125 @@
+"""
+Embedding Cache for CFR Agentic AI Application
+Persistent embeddings keyed by (model name, SHA-256 of the normalized text)
+"""
+
+import hashlib
+import threading
+from typing import Callable, Dict, List, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models.embedding_cache_database import CachedEmbedding, SessionLocal, init_embedding_cache_db
+from app.services.embedding_service import pack_embedding, unpack_embedding
+
+# Keys per lookup query, below SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """Collapse runs of whitespace, which the tokenizer ignores anyway"""
+    return ' '.join(text.split())
+
+
+def text_hash(text: str) -> str:
+    """Cache key of a text: SHA-256 hex digest of its normalized form"""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Read-through cache in front of an embedding model
+
+    Embeddings are stored as float32 BLOBs in their own SQLite database
+    (EMBEDDING_CACHE_DATABASE_URL). Texts that differ only in whitespace
+    share an entry. If the cache database cannot be read or written, texts
+    are encoded as if the cache were empty.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _ensure_table(self):
+        with self._lock:
+            if not self._initialized:
+                init_embedding_cache_db()
+                self._initialized = True
+
+    def get_many(self, model_name: str, hashes: Sequence[str]) -> Dict[str, bytes]:
+        """Cached embeddings for the given text hashes, as {hash: packed embedding}"""
+        self._ensure_table()
+        found = {}
+        db = SessionLocal()
+        try:
+            for start in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+                chunk = hashes[start:start + LOOKUP_CHUNK_SIZE]
+                found.update(db.query(CachedEmbedding.text_hash, CachedEmbedding.embedding).filter(
+                    CachedEmbedding.model_name == model_name,
+                    CachedEmbedding.text_hash.in_(chunk)
+                ))
+        finally:
+            db.close()
+        return found
+
+    def put_many(self, model_name: str, embeddings: Dict[str, bytes], dimension: int):
+        """Store packed embeddings by text hash; existing entries are kept"""
+        if not embeddings:
+            return
+        self._ensure_table()
+        statement = insert(CachedEmbedding.__table__).prefix_with('OR IGNORE')
+        db = SessionLocal()
+        try:
+            db.execute(statement, [
+                {'model_name': model_name, 'text_hash': key, 'dimension': dimension, 'embedding': embedding}
+                for key, embedding in embeddings.items()
+            ])
+            db.commit()
+        finally:
+            db.close()
+
+    def embed(self, model_name: str, texts: List[str], encode: Callable[[List[str]], List]) -> List[List[float]]:
+        """
+        Embed texts, encoding only those not already cached
+
+        Args:
+            model_name: Cache namespace; embeddings from different models never mix
+            texts: Non-empty texts to embed
+            encode: Function embedding a list of texts with the model
+
+        Returns:
+            Embeddings in the order of texts
+        """
+        hashes = [text_hash(text) for text in texts]
+        try:
+            cached = self.get_many(model_name, list(set(hashes)))
+        except SQLAlchemyError as e:
+            print(f"[WARNING] Embedding cache unavailable, encoding all texts: {e}")
+            return encode(texts)
+
+        # Encode each missing text once, even if it repeats
+        missing = {}
+        for text, key in zip(texts, hashes):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - sum(1 for key in hashes if key in missing)
+        self.misses += sum(1 for key in hashes if key in missing)
+
+        if missing:
+            encoded = {key: pack_embedding(embedding)
+                       for key, embedding in zip(missing, encode(list(missing.values())))}
+            try:
+                dimension = len(unpack_embedding(next(iter(encoded.values()))))
+                self.put_many(model_name, encoded, dimension)
+            except SQLAlchemyError as e:
+                print(f"[WARNING] Could not write to embedding cache: {e}")
+            cached.update(encoded)
+
+        return [unpack_embedding(cached[key]).tolist() for key in hashes]
+
+
+# Global instance
+embedding_cache = EmbeddingCache()
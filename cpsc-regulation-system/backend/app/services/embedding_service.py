@@ -7,13 +7,62 @@ import numpy as np
 from typing import List, Union
 import json
 import hashlib
-from app.config import EMBEDDING_MODEL, EMBEDDING_DIMENSION
+from app.config import EMBEDDING_MODEL, EMBEDDING_DIMENSION, EMBEDDING_CACHE_ENABLED
+
+# Embeddings are stored as packed little-endian float32 BLOBs
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+
+def pack_embedding(embedding: Union[List[float], np.ndarray]) -> bytes:
+    """Pack an embedding into the float32 BLOB format used by the *_embeddings tables"""
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def unpack_embedding(embedding: Union[bytes, str, List[float], np.ndarray]) -> np.ndarray:
+    """
+    Convert a stored embedding into a NumPy vector
+    
+    BLOB values are wrapped with np.frombuffer, so the result is a read-only
+    view over the row bytes and no copy is made. Legacy JSON strings and
+    plain lists are still accepted.
+    """
+    if isinstance(embedding, (bytes, bytearray, memoryview)):
+        return np.frombuffer(embedding, dtype=EMBEDDING_DTYPE)
+    if isinstance(embedding, str):
+        embedding = json.loads(embedding)
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPE)
+
+
+def embeddings_to_matrix(embeddings: List[Union[bytes, str, List[float], np.ndarray]]) -> np.ndarray:
+    """
+    Stack stored embeddings into a contiguous (n, dimension) float32 matrix
+    
+    When every value is a BLOB the bytes are joined once and viewed as a
+    matrix, avoiding a per-row decode.
+    """
+    if not embeddings:
+        return np.empty((0, EMBEDDING_DIMENSION), dtype=EMBEDDING_DTYPE)
+    if all(isinstance(emb, (bytes, bytearray, memoryview)) for emb in embeddings):
+        return np.frombuffer(b"".join(embeddings), dtype=EMBEDDING_DTYPE).reshape(len(embeddings), -1)
+    return np.vstack([unpack_embedding(emb) for emb in embeddings])
+
 
 class EmbeddingService:
-    def __init__(self, model_name: str = EMBEDDING_MODEL):
+    def __init__(self, model_name: str = EMBEDDING_MODEL, use_cache: bool = EMBEDDING_CACHE_ENABLED):
         """Initialize the mock embedding service"""
         self.model_name = model_name
         self.dimension = EMBEDDING_DIMENSION
+        # Mock vectors are cached apart from the real model's
+        self.cache_namespace = f"mock:{model_name}"
+        self.cache = None
+        # Constructor arguments, besides model_name, that worker processes rebuild the service with
+        self.worker_kwargs = {}
+        # Set to an EmbeddingWorkerPool to encode in worker processes (see embedding_workers.py)
+        self.executor = None
+        if use_cache:
+            # Imported here because the cache module uses pack_embedding from this one
+            from app.services.embedding_cache import embedding_cache
+            self.cache = embedding_cache
     
     def _text_to_mock_embedding(self, text: str) -> List[float]:
         """Create a deterministic mock embedding from text"""
@@ -47,12 +96,15 @@ class EmbeddingService:
         
         return self._text_to_mock_embedding(text)
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
         """
         Generate mock embeddings for multiple texts
         
+        Texts already in the embedding cache are not encoded again.
+        
         Args:
             texts: List of input texts to embed
+            batch_size: Texts per model forward pass (unused by the mock)
             
         Returns:
             List of embeddings
@@ -60,36 +112,62 @@ class EmbeddingService:
         if not texts:
             return []
         
-        embeddings = []
-        for text in texts:
-            if text and text.strip():
-                embeddings.append(self._text_to_mock_embedding(text))
-            else:
-                embeddings.append([0.0] * self.dimension)
+        embeddings = [[0.0] * self.dimension for _ in texts]
+        present = [i for i, text in enumerate(texts) if text and text.strip()]
+        
+        def encode(batch: List[str]) -> List[List[float]]:
+            if self.executor is not None:
+                return self.executor.encode(batch, batch_size).tolist()
+            return [self._text_to_mock_embedding(text) for text in batch]
+        
+        batch = [texts[i] for i in present]
+        if self.cache is not None:
+            vectors = self.cache.embed(self.cache_namespace, batch, encode)
+        else:
+            vectors = encode(batch)
+        for i, vector in zip(present, vectors):
+            embeddings[i] = vector
         
         return embeddings
     
-    def compute_similarity(self, embedding1: Union[List[float], str], 
-                          embedding2: Union[List[float], str]) -> float:
+    def to_numpy(self, embedding: Union[bytes, str, List[float]]) -> np.ndarray:
+        """
+        Convert a stored embedding (BLOB, legacy JSON string or list) to a NumPy vector
+        
+        Args:
+            embedding: Embedding value as read from an *_embeddings row
+            
+        Returns:
+            float32 vector (a zero-copy view for BLOB values)
+        """
+        return unpack_embedding(embedding)
+    
+    def to_matrix(self, embeddings: List[Union[bytes, str, List[float]]]) -> np.ndarray:
+        """
+        Stack stored embeddings into a contiguous float32 matrix
+        
+        Args:
+            embeddings: Embedding values as read from *_embeddings rows
+            
+        Returns:
+            Matrix of shape (len(embeddings), dimension)
+        """
+        return embeddings_to_matrix(embeddings)
+    
+    def compute_similarity(self, embedding1: Union[List[float], bytes, str], 
+                          embedding2: Union[List[float], bytes, str]) -> float:
         """
         Compute cosine similarity between two embeddings
         
         Args:
-            embedding1: First embedding (list or JSON string)
-            embedding2: Second embedding (list or JSON string)
+            embedding1: First embedding (list, float32 BLOB or JSON string)
+            embedding2: Second embedding (list, float32 BLOB or JSON string)
             
         Returns:
             Similarity score between 0 and 1
         """
-        # Parse JSON strings if necessary
-        if isinstance(embedding1, str):
-            embedding1 = json.loads(embedding1)
-        if isinstance(embedding2, str):
-            embedding2 = json.loads(embedding2)
-        
-        # Convert to numpy arrays
-        vec1 = np.array(embedding1)
-        vec2 = np.array(embedding2)
+        vec1 = unpack_embedding(embedding1)
+        vec2 = unpack_embedding(embedding2)
         
         # Compute cosine similarity
         dot_product = np.dot(vec1, vec2)
@@ -102,7 +180,7 @@ class EmbeddingService:
         similarity = dot_product / (norm1 * norm2)
         return float(similarity)
     
-    def compute_similarity_matrix(self, embeddings: List[Union[List[float], str]]) -> np.ndarray:
+    def compute_similarity_matrix(self, embeddings: List[Union[List[float], bytes, str]]) -> np.ndarray:
         """
         Compute similarity matrix for a list of embeddings
         
@@ -112,16 +190,7 @@ class EmbeddingService:
         Returns:
             Similarity matrix as numpy array
         """
-        # Parse JSON strings if necessary
-        parsed_embeddings = []
-        for emb in embeddings:
-            if isinstance(emb, str):
-                parsed_embeddings.append(json.loads(emb))
-            else:
-                parsed_embeddings.append(emb)
-        
-        # Convert to numpy array
-        emb_matrix = np.array(parsed_embeddings)
+        emb_matrix = embeddings_to_matrix(embeddings)
         
         # Compute cosine similarity matrix
         norms = np.linalg.norm(emb_matrix, axis=1, keepdims=True)
@@ -130,8 +199,8 @@ class EmbeddingService:
         
         return similarity_matrix
     
-    def find_similar_items(self, query_embedding: Union[List[float], str],
-                          candidate_embeddings: List[Union[List[float], str]],
+    def find_similar_items(self, query_embedding: Union[List[float], bytes, str],
+                          candidate_embeddings: List[Union[List[float], bytes, str]],
                           top_k: int = 10) -> List[tuple]:
         """
         Find top-k most similar items to the query
@@ -144,25 +213,24 @@ class EmbeddingService:
         Returns:
             List of (index, similarity_score) tuples sorted by similarity
         """
-        # Parse query embedding
-        if isinstance(query_embedding, str):
-            query_embedding = json.loads(query_embedding)
+        if not candidate_embeddings:
+            return []
         
-        query_vec = np.array(query_embedding)
+        query_vec = unpack_embedding(query_embedding)
+        candidates = embeddings_to_matrix(candidate_embeddings)
         
-        # Compute similarities
-        similarities = []
-        for idx, candidate in enumerate(candidate_embeddings):
-            if isinstance(candidate, str):
-                candidate = json.loads(candidate)
-            
-            candidate_vec = np.array(candidate)
-            similarity = self.compute_similarity(query_vec.tolist(), candidate_vec.tolist())
-            similarities.append((idx, similarity))
+        # Compute cosine similarities in one pass
+        query_norm = np.linalg.norm(query_vec)
+        candidate_norms = np.linalg.norm(candidates, axis=1)
+        if query_norm == 0:
+            similarities = np.zeros(len(candidates), dtype=np.float32)
+        else:
+            similarities = (candidates @ query_vec) / np.maximum(candidate_norms * query_norm, 1e-10)
+            similarities[candidate_norms == 0] = 0.0
         
         # Sort by similarity (descending) and return top-k
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:top_k]
+        order = np.argsort(-similarities, kind='stable')[:top_k]
+        return [(int(idx), float(similarities[idx])) for idx in order]
 
 # Global instance
 embedding_service = EmbeddingService()
\ No newline at end of file
@@ -1,19 +1,61 @@
 """
 Embedding Service for CFR Agentic AI Application
-Uses sentence-transformers for generating embeddings
+Uses sentence-transformers (PyTorch) or its ONNX export for generating embeddings
 """
 
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from typing import List, Union
-import json
-from app.config import EMBEDDING_MODEL, EMBEDDING_DIMENSION
+from app.config import (
+    EMBEDDING_MODEL, EMBEDDING_DIMENSION, EMBEDDING_MAX_SEQ_LENGTH, EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_BACKEND, EMBEDDING_ONNX_QUANTIZE
+)
+from app.services.embedding_service import unpack_embedding, embeddings_to_matrix
+from app.services.embedding_cache import embedding_cache
+from app.services.model_registry import model_registry
 
 class EmbeddingService:
-    def __init__(self, model_name: str = EMBEDDING_MODEL):
-        """Initialize the embedding service with a sentence transformer model"""
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str = EMBEDDING_MODEL, use_cache: bool = EMBEDDING_CACHE_ENABLED,
+                 backend: str = EMBEDDING_BACKEND, quantize: bool = EMBEDDING_ONNX_QUANTIZE):
+        """
+        Initialize the embedding service
+        
+        Args:
+            model_name: sentence-transformers model name
+            use_cache: Consult the embedding cache before encoding
+            backend: 'torch' for SentenceTransformer, 'onnx' for onnxruntime
+            quantize: With the ONNX backend, use int8-quantized weights
+        """
+        if backend not in ('torch', 'onnx'):
+            raise ValueError(f"Unknown embedding backend: {backend!r} (expected 'torch' or 'onnx')")
+        self.model_name = model_name
+        self.quantize = quantize
+        variant = 'onnx-int8' if backend == 'onnx' and quantize else backend
+        # Registry key; the model is shared by every service instance in the process
+        self.model_key = f"{variant}:{model_name}@{EMBEDDING_MAX_SEQ_LENGTH}"
+        self.backend = backend
         self.dimension = EMBEDDING_DIMENSION
+        # The backend and sequence length change the vectors, so they are part of the cache namespace
+        self.cache_namespace = f"{model_name}@{EMBEDDING_MAX_SEQ_LENGTH}/{variant}"
+        self.cache = embedding_cache if use_cache else None
+        # Constructor arguments, besides model_name, that worker processes rebuild the service with
+        self.worker_kwargs = {'backend': backend, 'quantize': quantize}
+        # Set to an EmbeddingWorkerPool to encode in worker processes (see embedding_workers.py)
+        self.executor = None
+    
+    def _load_model(self):
+        if self.backend == 'onnx':
+            from app.services.onnx_embedding import OnnxSentenceEncoder
+            return OnnxSentenceEncoder(self.model_name, quantize=self.quantize, max_seq_length=EMBEDDING_MAX_SEQ_LENGTH)
+        # Imported here so the ONNX backend runs without loading torch
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(self.model_name)
+        model.max_seq_length = EMBEDDING_MAX_SEQ_LENGTH
+        return model
+    
+    @property
+    def model(self):
+        """The shared model, loaded through the model registry on first use"""
+        return model_registry.get(self.model_key, self._load_model)
     
     def generate_embedding(self, text: str) -> List[float]:
         """
@@ -31,12 +73,23 @@ class EmbeddingService:
         embedding = self.model.encode(text, convert_to_numpy=True)
         return embedding.tolist()
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """Tokenized length of each text, including special tokens, capped at max_seq_length"""
+        encoded = self.model.tokenizer(
+            list(texts), truncation=True, max_length=self.model.max_seq_length, add_special_tokens=True
+        )
+        return [len(ids) for ids in encoded['input_ids']]
+    
+    def generate_embeddings(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
         """
         Generate embeddings for multiple texts in batch
         
+        Texts already in the embedding cache are not encoded again.
+        
         Args:
             texts: List of input texts to embed
+            batch_size: Texts per model forward pass; callers that plan their
+                own batches (see embedding_batching) pass len(texts)
             
         Returns:
             List of embeddings
@@ -47,30 +100,56 @@ class EmbeddingService:
         # Replace empty strings with placeholder
         processed_texts = [text if text and text.strip() else " " for text in texts]
         
-        embeddings = self.model.encode(processed_texts, convert_to_numpy=True, show_progress_bar=True)
-        return embeddings.tolist()
+        def encode(batch: List[str]) -> List[List[float]]:
+            if self.executor is not None:
+                return self.executor.encode(batch, batch_size).tolist()
+            return self.model.encode(
+                batch, batch_size=batch_size, convert_to_numpy=True,
+                show_progress_bar=len(batch) > batch_size
+            ).tolist()
+        
+        if self.cache is not None:
+            return self.cache.embed(self.cache_namespace, processed_texts, encode)
+        return encode(processed_texts)
+    
+    def to_numpy(self, embedding: Union[bytes, str, List[float]]) -> np.ndarray:
+        """
+        Convert a stored embedding (BLOB, legacy JSON string or list) to a NumPy vector
+        
+        Args:
+            embedding: Embedding value as read from an *_embeddings row
+            
+        Returns:
+            float32 vector (a zero-copy view for BLOB values)
+        """
+        return unpack_embedding(embedding)
+    
+    def to_matrix(self, embeddings: List[Union[bytes, str, List[float]]]) -> np.ndarray:
+        """
+        Stack stored embeddings into a contiguous float32 matrix
+        
+        Args:
+            embeddings: Embedding values as read from *_embeddings rows
+            
+        Returns:
+            Matrix of shape (len(embeddings), dimension)
+        """
+        return embeddings_to_matrix(embeddings)
     
-    def compute_similarity(self, embedding1: Union[List[float], str], 
-                          embedding2: Union[List[float], str]) -> float:
+    def compute_similarity(self, embedding1: Union[List[float], bytes, str], 
+                          embedding2: Union[List[float], bytes, str]) -> float:
         """
         Compute cosine similarity between two embeddings
         
         Args:
-            embedding1: First embedding (list or JSON string)
-            embedding2: Second embedding (list or JSON string)
+            embedding1: First embedding (list, float32 BLOB or JSON string)
+            embedding2: Second embedding (list, float32 BLOB or JSON string)
             
         Returns:
             Similarity score between 0 and 1
         """
-        # Parse JSON strings if necessary
-        if isinstance(embedding1, str):
-            embedding1 = json.loads(embedding1)
-        if isinstance(embedding2, str):
-            embedding2 = json.loads(embedding2)
-        
-        # Convert to numpy arrays
-        vec1 = np.array(embedding1)
-        vec2 = np.array(embedding2)
+        vec1 = unpack_embedding(embedding1)
+        vec2 = unpack_embedding(embedding2)
         
         # Compute cosine similarity
         dot_product = np.dot(vec1, vec2)
@@ -83,7 +162,7 @@ class EmbeddingService:
         similarity = dot_product / (norm1 * norm2)
         return float(similarity)
     
-    def compute_similarity_matrix(self, embeddings: List[Union[List[float], str]]) -> np.ndarray:
+    def compute_similarity_matrix(self, embeddings: List[Union[List[float], bytes, str]]) -> np.ndarray:
         """
         Compute similarity matrix for a list of embeddings
         
@@ -93,16 +172,7 @@ class EmbeddingService:
         Returns:
             Similarity matrix as numpy array
         """
-        # Parse JSON strings if necessary
-        parsed_embeddings = []
-        for emb in embeddings:
-            if isinstance(emb, str):
-                parsed_embeddings.append(json.loads(emb))
-            else:
-                parsed_embeddings.append(emb)
-        
-        # Convert to numpy array
-        emb_matrix = np.array(parsed_embeddings)
+        emb_matrix = embeddings_to_matrix(embeddings)
         
         # Compute cosine similarity matrix
         norms = np.linalg.norm(emb_matrix, axis=1, keepdims=True)
@@ -111,8 +181,8 @@ class EmbeddingService:
         
         return similarity_matrix
     
-    def find_similar_items(self, query_embedding: Union[List[float], str],
-                          candidate_embeddings: List[Union[List[float], str]],
+    def find_similar_items(self, query_embedding: Union[List[float], bytes, str],
+                          candidate_embeddings: List[Union[List[float], bytes, str]],
                           top_k: int = 10) -> List[tuple]:
         """
         Find top-k most similar items to the query
@@ -125,25 +195,24 @@ class EmbeddingService:
         Returns:
             List of (index, similarity_score) tuples sorted by similarity
         """
-        # Parse query embedding
-        if isinstance(query_embedding, str):
-            query_embedding = json.loads(query_embedding)
+        if not candidate_embeddings:
+            return []
         
-        query_vec = np.array(query_embedding)
+        query_vec = unpack_embedding(query_embedding)
+        candidates = embeddings_to_matrix(candidate_embeddings)
         
-        # Compute similarities
-        similarities = []
-        for idx, candidate in enumerate(candidate_embeddings):
-            if isinstance(candidate, str):
-                candidate = json.loads(candidate)
-            
-            candidate_vec = np.array(candidate)
-            similarity = self.compute_similarity(query_vec.tolist(), candidate_vec.tolist())
-            similarities.append((idx, similarity))
+        # Compute cosine similarities in one pass
+        query_norm = np.linalg.norm(query_vec)
+        candidate_norms = np.linalg.norm(candidates, axis=1)
+        if query_norm == 0:
+            similarities = np.zeros(len(candidates), dtype=np.float32)
+        else:
+            similarities = (candidates @ query_vec) / np.maximum(candidate_norms * query_norm, 1e-10)
+            similarities[candidate_norms == 0] = 0.0
         
         # Sort by similarity (descending) and return top-k
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:top_k]
+        order = np.argsort(-similarities, kind='stable')[:top_k]
+        return [(int(idx), float(similarities[idx])) for idx in order]
 
-# Global instance
+# Global instance; constructing it is cheap, the model loads on first use
 embedding_service = EmbeddingService()
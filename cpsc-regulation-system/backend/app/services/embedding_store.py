@@ -0,0 +1,306 @@
+"""
+Resident Embedding Store for CFR Agentic AI Application
+Keeps each level's embeddings in memory as a contiguous normalized matrix
+"""
+
+import time
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, update
+
+from app.models.cfr_database import (
+    Chapter, Subchapter, Part, Section,
+    ChapterEmbedding, SubchapterEmbedding, SectionEmbedding, EmbeddingGeneration
+)
+from app.services.embedding_service import embeddings_to_matrix, EMBEDDING_DTYPE
+
+LEVELS = ('chapter', 'subchapter', 'section')
+
+
+def embedding_generation(db: Session, level: str) -> Optional[int]:
+    """Current generation of a level's embeddings, or None before the first bump"""
+    return db.query(EmbeddingGeneration.generation).filter(EmbeddingGeneration.level == level).scalar()
+
+
+def bump_embedding_generation(db: Session, *levels: str):
+    """
+    Record that embeddings of the given levels were written or deleted
+
+    Call it after the writes, in the same transaction, so the change and
+    the new generation commit together. Generations are nanosecond
+    timestamps raised by at least one, so they keep increasing across
+    database resets and never repeat one a resident matrix or saved index
+    was built from. A single UPDATE, so it adds no read to the writer's
+    transaction. Does not commit.
+    """
+    stamp = time.time_ns()
+    for level in levels:
+        updated = db.execute(
+            update(EmbeddingGeneration).where(EmbeddingGeneration.level == level).values(
+                generation=func.max(EmbeddingGeneration.generation + 1, stamp)
+            )
+        ).rowcount
+        if not updated:
+            # A concurrent first writer may insert the row meanwhile; its generation is as new
+            db.execute(insert(EmbeddingGeneration).prefix_with('OR IGNORE').values(level=level, generation=stamp))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize matrix rows; all-zero rows stay zero"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.ascontiguousarray(matrix / np.maximum(norms, 1e-10), dtype=EMBEDDING_DTYPE)
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k highest scores, best first, using argpartition"""
+    if top_k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < len(scores):
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class LevelMatrix:
+    """Embeddings for one level: normalized matrix, parallel id array and hierarchy metadata"""
+
+    def __init__(self, level: str, ids: List[int], embeddings: List[bytes],
+                 metadata: List[Dict[str, Any]], fingerprint: Optional[int]):
+        self.level = level
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.matrix = normalize_rows(embeddings_to_matrix(embeddings))
+        self.metadata = metadata
+        self.fingerprint = fingerprint
+        self.positions = {item_id: row for row, item_id in enumerate(ids)}
+        self._groups: Dict[str, Tuple[np.ndarray, np.ndarray, List[np.ndarray]]] = {}
+        self._part_parents: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get_vector(self, item_id: int) -> Optional[np.ndarray]:
+        """Normalized embedding for an item, or None if it has none"""
+        row = self.positions.get(item_id)
+        return None if row is None else self.matrix[row]
+
+    def group_centroids(self, key: str) -> Tuple[np.ndarray, np.ndarray, List[np.ndarray]]:
+        """
+        Normalized mean vector of the rows sharing a metadata key, e.g. 'part_id'
+
+        Args:
+            key: Metadata field to group rows by
+
+        Returns:
+            Tuple of (group ids, normalized centroid matrix, member rows per group)
+        """
+        if key not in self._groups:
+            keys = np.array([meta.get(key) or -1 for meta in self.metadata], dtype=np.int64)
+            group_ids, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+            sums = np.zeros((len(group_ids), self.matrix.shape[1]), dtype=self.matrix.dtype)
+            np.add.at(sums, inverse, self.matrix)
+
+            members = np.split(np.argsort(inverse, kind='stable'), np.cumsum(counts)[:-1])
+            self._groups[key] = (group_ids, normalize_rows(sums), members)
+        return self._groups[key]
+
+    def hierarchical_search(self, query_vec: np.ndarray, top_k: int, branches: int,
+                            parts_per_branch: int) -> List[Tuple[int, float]]:
+        """
+        Coarse-to-fine search: subchapter centroids, then part centroids, then sections
+
+        Only sections inside the best-scoring parts of the best-scoring
+        subchapters are scored, so per-query work grows with the number of
+        branches kept rather than with the corpus.
+
+        Args:
+            query_vec: Query embedding
+            top_k: Number of results to return
+            branches: Subchapters kept after the first stage
+            parts_per_branch: Parts kept per subchapter branch
+
+        Returns:
+            List of (row, cosine similarity) tuples, best first
+        """
+        query_vec = np.asarray(query_vec, dtype=self.matrix.dtype)
+        query_norm = np.linalg.norm(query_vec)
+        if len(self) == 0 or query_norm == 0:
+            return self.search(query_vec, top_k)
+        query_vec = query_vec / query_norm
+
+        subchapter_ids, subchapter_centroids, _ = self.group_centroids('subchapter_id')
+        best_subchapters = subchapter_ids[top_k_indices(subchapter_centroids @ query_vec, branches)]
+
+        _, part_centroids, part_members = self.group_centroids('part_id')
+        if self._part_parents is None:
+            self._part_parents = np.array(
+                [self.metadata[members[0]].get('subchapter_id') or -1 for members in part_members],
+                dtype=np.int64
+            )
+        candidate_parts = np.flatnonzero(np.isin(self._part_parents, best_subchapters))
+        part_scores = part_centroids[candidate_parts] @ query_vec
+        best_parts = candidate_parts[top_k_indices(part_scores, branches * parts_per_branch)]
+
+        if len(best_parts) == 0:
+            return []
+        rows = np.concatenate([part_members[part] for part in best_parts])
+        scores = self.matrix[rows] @ query_vec
+        best = top_k_indices(scores, top_k)
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def search(self, query_vec: np.ndarray, top_k: int,
+               exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Score every row against the query with one matrix-vector product
+
+        Args:
+            query_vec: Query embedding (need not be normalized)
+            top_k: Number of results to return
+            exclude_id: Optional item id to leave out of the results
+
+        Returns:
+            List of (row, cosine similarity) tuples, best first
+        """
+        if len(self) == 0:
+            return []
+
+        query_vec = np.asarray(query_vec, dtype=EMBEDDING_DTYPE)
+        query_norm = np.linalg.norm(query_vec)
+        if query_norm == 0:
+            scores = np.zeros(len(self), dtype=EMBEDDING_DTYPE)
+        else:
+            scores = self.matrix @ (query_vec / query_norm)
+
+        exclude_row = self.positions.get(exclude_id) if exclude_id is not None else None
+        if exclude_row is not None:
+            scores[exclude_row] = -np.inf
+
+        rows = top_k_indices(scores, top_k)
+        return [(int(row), float(scores[row])) for row in rows if row != exclude_row]
+
+
+class EmbeddingStore:
+    """
+    Process-wide cache of per-level embedding matrices
+
+    Each level is loaded from SQLite on first use and kept resident until
+    invalidate() is called (the pipeline does this when a run finishes) or
+    the level's embedding generation changes underneath it, e.g. after a
+    run in another worker process. Every writer of embeddings calls
+    bump_embedding_generation.
+    """
+
+    def __init__(self):
+        self._levels: Dict[str, LevelMatrix] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, level: str = None):
+        """Drop the cached matrix for one level, or for all levels"""
+        with self._lock:
+            if level is None:
+                self._levels.clear()
+            else:
+                self._levels.pop(level, None)
+
+    def get_level(self, level: str, db: Session) -> LevelMatrix:
+        """
+        Get the resident matrix for a level, loading it if needed
+
+        Args:
+            level: One of 'chapter', 'subchapter', 'section'
+            db: Database session used for loading
+
+        Returns:
+            LevelMatrix for the level
+        """
+        if level not in LEVELS:
+            raise ValueError(f"Invalid level: {level}. Must be 'chapter', 'subchapter', or 'section'")
+
+        fingerprint = self._fingerprint(level, db)
+        cached = self._levels.get(level)
+        if cached is not None and cached.fingerprint == fingerprint:
+            return cached
+
+        with self._lock:
+            cached = self._levels.get(level)
+            if cached is None or cached.fingerprint != fingerprint:
+                cached = self._load_level(level, db, fingerprint)
+                self._levels[level] = cached
+            return cached
+
+    def _fingerprint(self, level: str, db: Session) -> Optional[int]:
+        """Generation of a level's embeddings; a primary-key lookup, so it is cheap to check per query"""
+        return embedding_generation(db, level)
+
+    def _load_level(self, level: str, db: Session, fingerprint: Optional[int]) -> LevelMatrix:
+        """Load all embeddings and hierarchy metadata for a level in one query"""
+        if level == 'chapter':
+            rows = db.query(
+                ChapterEmbedding.chapter_id, ChapterEmbedding.embedding, Chapter.name
+            ).join(
+                Chapter, Chapter.id == ChapterEmbedding.chapter_id
+            ).order_by(ChapterEmbedding.id).all()
+            make_metadata = lambda row: {'name': row[2]}
+
+        elif level == 'subchapter':
+            rows = db.query(
+                SubchapterEmbedding.subchapter_id, SubchapterEmbedding.embedding,
+                Subchapter.name, Chapter.id, Chapter.name
+            ).join(
+                Subchapter, Subchapter.id == SubchapterEmbedding.subchapter_id
+            ).outerjoin(
+                Chapter, Chapter.id == Subchapter.chapter_id
+            ).order_by(SubchapterEmbedding.id).all()
+            make_metadata = lambda row: {
+                'name': row[2],
+                'chapter_id': row[3],
+                'chapter_name': row[4] or ''
+            }
+
+        else:
+            rows = db.query(
+                SectionEmbedding.section_id, SectionEmbedding.embedding,
+                Section.section_number, Section.subject, Section.citation, Section.section_label,
+                Part.id, Part.heading, Subchapter.id, Subchapter.name, Chapter.id, Chapter.name
+            ).join(
+                Section, Section.id == SectionEmbedding.section_id
+            ).outerjoin(
+                Part, Part.id == Section.part_id
+            ).outerjoin(
+                Subchapter, Subchapter.id == Part.subchapter_id
+            ).outerjoin(
+                Chapter, Chapter.id == Subchapter.chapter_id
+            ).order_by(SectionEmbedding.id).all()
+            make_metadata = lambda row: {
+                'section_number': row[2],
+                'subject': row[3],
+                'citation': row[4],
+                'section_label': row[5],
+                'part_id': row[6],
+                'part_heading': row[7] or '',
+                'subchapter_id': row[8],
+                'subchapter_name': row[9] or '',
+                'chapter_id': row[10],
+                'chapter_name': row[11] or ''
+            }
+
+        # Keep the first embedding per item, matching the previous .first() lookups
+        ids, embeddings, metadata = [], [], []
+        seen = set()
+        for row in rows:
+            if row[0] in seen:
+                continue
+            seen.add(row[0])
+            ids.append(row[0])
+            embeddings.append(row[1])
+            metadata.append(make_metadata(row))
+
+        print(f"[EmbeddingStore] Loaded {len(ids)} {level} embeddings")
+        return LevelMatrix(level, ids, embeddings, metadata, fingerprint)
+
+
+# Global instance
+embedding_store = EmbeddingStore()
@@ -0,0 +1,145 @@
+"""
+Embedding Worker Pool for CFR Agentic AI Application
+Encodes embedding batches in parallel worker processes, each with its own model copy
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import EMBEDDING_WORKERS, EMBEDDING_WORKER_THREADS
+from app.services.embedding_service import EMBEDDING_DTYPE
+
+# Service built by each worker process in _init_worker
+_worker_service = None
+
+
+def _limit_threads(threads: int):
+    """Cap the intra-op threads of torch and the BLAS libraries in this process"""
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[variable] = str(threads)
+    # Workers already run in parallel; tokenizer threads would only oversubscribe the cores
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _init_worker(service_class, model_name: str, service_kwargs: Dict[str, Any], threads: int):
+    global _worker_service
+    _limit_threads(threads)
+    # The parent consults the embedding cache; workers only encode misses
+    _worker_service = service_class(model_name, use_cache=False, **service_kwargs)
+
+
+def _encode_shard(shm_name: str, shape: tuple, offset: int, texts: List[str], batch_size: int) -> int:
+    """Encode texts and write them into rows offset.. of the shared result matrix"""
+    embeddings = _worker_service.generate_embeddings(texts, batch_size=batch_size)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        matrix = np.ndarray(shape, dtype=EMBEDDING_DTYPE, buffer=shm.buf)
+        matrix[offset:offset + len(texts)] = embeddings
+        del matrix
+    finally:
+        shm.close()
+    return len(texts)
+
+
+class EmbeddingWorkerPool:
+    """
+    Process pool that encodes texts with one model copy per worker
+
+    Each call is split into one contiguous shard per worker. Workers write
+    their vectors straight into a shared-memory matrix at their shard's
+    offset, so results come back in input order without pickling them.
+    Each worker caps torch at `threads` intra-op threads, so the workers
+    together use the host's cores without oversubscribing them.
+    """
+
+    def __init__(self, service_class, model_name: str, dimension: int,
+                 workers: int, threads: Optional[int] = None,
+                 service_kwargs: Optional[Dict[str, Any]] = None):
+        self.workers = workers
+        self.dimension = dimension
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        # Spawned, not forked: the parent may hold torch thread pools and running pipeline threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(service_class, model_name, service_kwargs or {}, self.threads)
+        )
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Encode texts across the workers
+
+        Args:
+            texts: Texts to encode
+            batch_size: Texts per forward pass, split between the workers
+
+        Returns:
+            (len(texts), dimension) float32 matrix in the order of texts
+        """
+        shape = (len(texts), self.dimension)
+        if not texts:
+            return np.empty(shape, dtype=EMBEDDING_DTYPE)
+
+        shard_size = -(-len(texts) // self.workers)
+        shard_batch_size = max(1, -(-batch_size // self.workers))
+        shm = shared_memory.SharedMemory(create=True, size=len(texts) * self.dimension * EMBEDDING_DTYPE.itemsize)
+        try:
+            futures = [
+                self._executor.submit(_encode_shard, shm.name, shape, start,
+                                      texts[start:start + shard_size], shard_batch_size)
+                for start in range(0, len(texts), shard_size)
+            ]
+            for future in futures:
+                future.result()
+            return np.ndarray(shape, dtype=EMBEDDING_DTYPE, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+@contextmanager
+def embedding_worker_pool(embedding_service, workers: Optional[int] = EMBEDDING_WORKERS,
+                          threads: Optional[int] = EMBEDDING_WORKER_THREADS):
+    """
+    Encode with a worker pool for the duration of the block
+
+    While the block runs, the service hands its cache misses to the pool
+    instead of encoding in the calling thread. With one worker the service
+    is left as it is.
+
+    Args:
+        embedding_service: Service to attach the pool to
+        workers: Worker processes (None = one per CPU core)
+        threads: Torch threads per worker (None = cores divided by workers)
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        yield embedding_service
+        return
+
+    # Workers build the same service, e.g. with the same backend, so their vectors match the parent's
+    pool = EmbeddingWorkerPool(type(embedding_service), embedding_service.model_name,
+                               embedding_service.dimension, workers, threads,
+                               service_kwargs=embedding_service.worker_kwargs)
+    print(f"  Embedding with {workers} worker processes, {pool.threads} threads each")
+    embedding_service.executor = pool
+    try:
+        yield embedding_service
+    finally:
+        embedding_service.executor = None
+        pool.shutdown()
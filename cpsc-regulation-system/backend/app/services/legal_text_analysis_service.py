@@ -11,8 +11,10 @@ import json
 from typing import Dict, Any, List, Tuple
 from sqlalchemy.orm import Session
 from app.models.database import Section, SectionEmbedding
-from app.services.embedding_service_original import EmbeddingService
+from app.services.embedding_service_original import embedding_service
 from app.services.llm_service import llm_service
+from app.services.near_duplicate import text_similarity
+from app.config import NEAR_DUPLICATE_THRESHOLD
 import numpy as np
 
 
@@ -22,8 +24,9 @@ class LegalTextAnalysisService:
     """
 
     def __init__(self):
-        self.embedding_service = EmbeddingService()
+        self.embedding_service = embedding_service
         self.redundancy_threshold = 1.0   # 100% similarity - exact duplicates
+        self.text_redundancy_threshold = NEAR_DUPLICATE_THRESHOLD  # Shingle Jaccard - duplicated text
         self.parity_threshold_min = 0.90  # 90% similarity - near duplicates
         self.parity_threshold_max = 1.0   # Up to 100%
         self.overlap_threshold_min = 0.80  # 80% similarity - significant overlap
@@ -51,8 +54,12 @@ class LegalTextAnalysisService:
         print(f"\n[Legal Analysis] Analyzing regulations {regulation_a_id} and {regulation_b_id}")
 
         # Fetch regulations
-        reg_a = db.query(Section).filter(Section.id == regulation_a_id).first()
-        reg_b = db.query(Section).filter(Section.id == regulation_b_id).first()
+        reg_a = db.query(Section).filter(
+            Section.id == regulation_a_id, Section.removed_at.is_(None)
+        ).first()
+        reg_b = db.query(Section).filter(
+            Section.id == regulation_b_id, Section.removed_at.is_(None)
+        ).first()
 
         if not reg_a or not reg_b:
             return {
@@ -78,9 +85,12 @@ class LegalTextAnalysisService:
 
         # Compute similarity scores
         similarity_scores = self._compute_similarity_scores(emb_a, emb_b)
+        similarity_scores['text_similarity'] = text_similarity(reg_a.text, reg_b.text)
 
         # Categorize relationship
-        category = self._categorize_relationship(similarity_scores['overall'])
+        category = self._categorize_relationship(
+            similarity_scores['overall'], similarity_scores['text_similarity']
+        )
 
         # Basic structural analysis
         structural_analysis = self._analyze_structure(reg_a, reg_b)
@@ -112,8 +122,8 @@ class LegalTextAnalysisService:
         """
         Compute various similarity metrics
         """
-        vec_a = np.array(json.loads(emb_a.embedding))
-        vec_b = np.array(json.loads(emb_b.embedding))
+        vec_a = self.embedding_service.to_numpy(emb_a.embedding)
+        vec_b = self.embedding_service.to_numpy(emb_b.embedding)
 
         # Cosine similarity
         dot_product = np.dot(vec_a, vec_b)
@@ -129,10 +139,22 @@ class LegalTextAnalysisService:
             'overlap_score': float(cosine_similarity * 100) if cosine_similarity >= 0.70 else 0.0
         }
 
-    def _categorize_relationship(self, similarity: float) -> Dict[str, str]:
+    def _categorize_relationship(self, similarity: float, text_similarity: float = 0.0) -> Dict[str, str]:
         """
         Categorize the relationship based on similarity score
+
+        Pairs whose texts are near duplicates (shingle Jaccard at or above
+        text_redundancy_threshold) are redundant even when float rounding
+        keeps their cosine similarity just under 1.0.
         """
+        if text_similarity >= self.text_redundancy_threshold and similarity < self.redundancy_threshold:
+            return {
+                'type': 'REDUNDANCY',
+                'color': '#dc2626',
+                'icon': '🔴',
+                'description': f'Duplicated regulatory text ({text_similarity*100:.1f}% shingle overlap)',
+                'recommendation': 'CONSOLIDATE: The text is duplicated - merge into one regulation'
+            }
         if similarity >= self.redundancy_threshold:
             return {
                 'type': 'REDUNDANCY',
@@ -475,6 +497,7 @@ Now analyze and return ONLY the JSON result with a summary that explains WHY par
                 'redundancy_score': f"{similarity_scores['redundancy_score']:.2f}%",
                 'parity_score': f"{similarity_scores['parity_score']:.2f}%",
                 'overlap_score': f"{similarity_scores['overlap_score']:.2f}%",
+                'text_similarity': f"{similarity_scores.get('text_similarity', 0.0)*100:.2f}%",
                 'category': category['type'],
                 'category_description': category['description'],
                 'category_icon': category['icon'],
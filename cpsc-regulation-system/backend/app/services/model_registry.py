@@ -0,0 +1,89 @@
+"""
+Model Registry for CFR Agentic AI Application
+Loads each model once per process, on first use, and shares it between services
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from app.process_memory import current_rss
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models
+
+    Services resolve their models through get() instead of loading them in
+    __init__, so however many service instances exist, a process holds one
+    copy of each model, and only once something uses it. Load time and the
+    RSS growth during the load are recorded for each model; the RSS figure
+    also counts anything other threads allocated meanwhile.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, loader: Callable[[], Any]) -> Any:
+        """
+        Return the model registered under name, loading it on first use
+
+        Args:
+            name: Registry key; include everything that changes the loaded
+                model (backend, model name, sequence length, ...)
+            loader: Called without arguments to load the model
+
+        Returns:
+            The shared model
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        # One lock per model, so concurrent first uses load it once without blocking other models
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name in self._models:
+                return self._models[name]
+
+            rss_before = current_rss()
+            start = time.perf_counter()
+            model = loader()
+            seconds = time.perf_counter() - start
+            rss_after = current_rss()
+
+            rss_mb = None
+            if rss_before is not None and rss_after is not None:
+                rss_mb = round((rss_after - rss_before) / 2 ** 20, 1)
+            self._stats[name] = {
+                'name': name,
+                'load_seconds': round(seconds, 3),
+                'rss_delta_mb': rss_mb,
+                'loaded_at': datetime.utcnow().isoformat()
+            }
+            self._models[name] = model
+            print(f"[OK] Loaded model {name} in {seconds:.2f}s"
+                  + (f" (+{rss_mb} MB RSS)" if rss_mb is not None else ""))
+        return model
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Load time and memory of every loaded model"""
+        return [dict(record) for record in self._stats.values()]
+
+    def unload(self, name: str):
+        """Drop a model; the next get() loads it again"""
+        with self._lock:
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+
+
+# Global instance
+model_registry = ModelRegistry()
@@ -0,0 +1,240 @@
+"""
+Near-Duplicate Detection for CFR Agentic AI Application
+MinHash signatures over section-text shingles with LSH banding
+"""
+
+import re
+import zlib
+import numpy as np
+from typing import List, Dict, Any
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+
+from app.models.cfr_database import Section, SectionSignature
+from app.config import (
+    NEAR_DUPLICATE_SHINGLE_SIZE, NEAR_DUPLICATE_THRESHOLD,
+    MINHASH_NUM_PERM, LSH_BANDS
+)
+
+SIGNATURE_DTYPE = np.dtype('<u4')
+
+# Hash values live in the field of this Mersenne prime (2^31 - 1)
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def shingle_hashes(text: str, size: int = NEAR_DUPLICATE_SHINGLE_SIZE) -> np.ndarray:
+    """
+    Hashes of the distinct word k-grams of a text
+
+    Text is lower-cased and split on non-word characters, so differences in
+    whitespace, punctuation and case do not count as differences. Texts
+    shorter than one shingle hash to a single shingle of all their words.
+
+    Args:
+        text: Section text
+        size: Words per shingle
+
+    Returns:
+        Sorted array of distinct 32-bit shingle hashes (empty for empty text)
+    """
+    tokens = _TOKEN_PATTERN.findall((text or '').lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint32)
+    if len(tokens) < size:
+        grams = [' '.join(tokens)]
+    else:
+        grams = [' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    return np.unique(np.fromiter(
+        (zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint32, count=len(grams)
+    ))
+
+
+def jaccard(shingles_a: np.ndarray, shingles_b: np.ndarray) -> float:
+    """Exact Jaccard similarity of two sorted shingle-hash arrays"""
+    if len(shingles_a) == 0 and len(shingles_b) == 0:
+        return 0.0
+    common = len(np.intersect1d(shingles_a, shingles_b, assume_unique=True))
+    return common / (len(shingles_a) + len(shingles_b) - common)
+
+
+def text_similarity(text_a: str, text_b: str) -> float:
+    """Jaccard similarity of the shingle sets of two texts"""
+    return jaccard(shingle_hashes(text_a), shingle_hashes(text_b))
+
+
+class MinHasher:
+    """
+    MinHash with universal hashing h(x) = (a * x + b) mod p
+
+    The (a, b) pairs are drawn from a fixed seed, so signatures written at
+    ingest stay comparable with signatures computed later.
+    """
+
+    def __init__(self, num_perm: int = MINHASH_NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    @property
+    def empty_value(self) -> int:
+        """Signature value of an empty shingle set; larger than any hash"""
+        return int(_MERSENNE_PRIME)
+
+    def signature(self, shingles: np.ndarray) -> np.ndarray:
+        """
+        MinHash signature of a shingle-hash array
+
+        Args:
+            shingles: Output of shingle_hashes()
+
+        Returns:
+            uint32 array of num_perm minimum hash values
+        """
+        if len(shingles) == 0:
+            return np.full(self.num_perm, self.empty_value, dtype=SIGNATURE_DTYPE)
+
+        x = shingles.astype(np.uint64) % _MERSENNE_PRIME
+        # a, x < 2^31 so a * x + b stays well inside uint64
+        hashed = (np.outer(self._a, x) + self._b[:, None]) % _MERSENNE_PRIME
+        return hashed.min(axis=1).astype(SIGNATURE_DTYPE)
+
+    def text_signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text's shingles"""
+        return self.signature(shingle_hashes(text))
+
+
+def pack_signature(signature: np.ndarray) -> bytes:
+    """Serialize a signature as little-endian uint32 bytes"""
+    return np.asarray(signature, dtype=SIGNATURE_DTYPE).tobytes()
+
+
+def lsh_candidate_pairs(signatures: np.ndarray, bands: int = LSH_BANDS,
+                        skip_rows: np.ndarray = None) -> np.ndarray:
+    """
+    Candidate pairs that share at least one LSH band bucket
+
+    The signature is split into `bands` bands of rows; two items become a
+    candidate when all rows of any band match. Bucketing is a sort per
+    band, so the cost grows with n log n plus the number of candidates.
+
+    Args:
+        signatures: (n, num_perm) signature matrix
+        bands: Number of bands; num_perm must be divisible by it
+        skip_rows: Optional boolean mask of rows never paired (e.g. empty texts)
+
+    Returns:
+        (m, 2) array of distinct row pairs (i < j)
+    """
+    n, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError(f"MinHash size {num_perm} is not divisible by {bands} bands")
+    rows_per_band = num_perm // bands
+
+    keep = np.arange(n) if skip_rows is None else np.flatnonzero(~skip_rows)
+    pairs = []
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[keep, band * rows_per_band:(band + 1) * rows_per_band])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows_per_band))).ravel()
+
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]]))
+        ends = np.append(starts[1:], len(keys))
+
+        for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+            members = np.sort(keep[order[start:end]])
+            i, j = np.triu_indices(len(members), k=1)
+            pairs.append(np.stack([members[i], members[j]], axis=1))
+
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+# Shared hasher so every caller uses the same hash family
+minhasher = MinHasher()
+
+
+def build_section_signatures(db: Session, batch_size: int = 1000) -> int:
+    """
+    Compute and store MinHash signatures for sections that have none
+
+    Args:
+        db: Database session
+        batch_size: Sections read and inserted per batch
+
+    Returns:
+        Number of signatures written
+    """
+    statement = insert(SectionSignature.__table__)
+    pending = db.query(Section.id, Section.text).outerjoin(
+        SectionSignature, SectionSignature.section_id == Section.id
+    ).filter(SectionSignature.id.is_(None), Section.removed_at.is_(None)).order_by(Section.id).all()
+
+    for start in range(0, len(pending), batch_size):
+        db.execute(statement, [
+            {'section_id': section_id, 'signature': pack_signature(minhasher.text_signature(text))}
+            for section_id, text in pending[start:start + batch_size]
+        ])
+    db.commit()
+    return len(pending)
+
+
+def find_near_duplicates(db: Session, threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                         bands: int = LSH_BANDS) -> List[Dict[str, Any]]:
+    """
+    Section pairs whose texts are near duplicates
+
+    Candidates come from LSH over the stored signatures; each candidate is
+    then verified with the exact Jaccard similarity of its shingle sets, so
+    no pair below the threshold is reported.
+
+    Args:
+        db: Database session
+        threshold: Minimum Jaccard similarity of the shingle sets
+        bands: LSH bands (more bands = higher recall, more candidates)
+
+    Returns:
+        List of pairs with their text similarity, most similar first
+    """
+    rows = db.query(SectionSignature.section_id, SectionSignature.signature).order_by(
+        SectionSignature.section_id
+    ).all()
+    if len(rows) < 2:
+        return []
+
+    section_ids = np.array([section_id for section_id, _ in rows], dtype=np.int64)
+    signatures = np.frombuffer(b''.join(signature for _, signature in rows), dtype=SIGNATURE_DTYPE)
+    signatures = signatures.reshape(len(rows), -1)
+    empty = (signatures == minhasher.empty_value).all(axis=1)
+
+    candidates = lsh_candidate_pairs(signatures, bands, skip_rows=empty)
+    print(f"  [OK] {len(candidates)} LSH candidate pairs from {len(rows)} sections")
+    if len(candidates) == 0:
+        return []
+
+    candidate_ids = section_ids[np.unique(candidates)].tolist()
+    sections = {}
+    for start in range(0, len(candidate_ids), 500):
+        for section in db.query(Section).filter(Section.id.in_(candidate_ids[start:start + 500])):
+            sections[section.id] = (section, shingle_hashes(section.text))
+
+    results = []
+    for i, j in candidates.tolist():
+        section_a, shingles_a = sections[int(section_ids[i])]
+        section_b, shingles_b = sections[int(section_ids[j])]
+        similarity = jaccard(shingles_a, shingles_b)
+        if similarity >= threshold:
+            results.append({
+                'item1_id': section_a.id,
+                'item2_id': section_b.id,
+                'item1_name': f"{section_a.section_number}: {section_a.subject}",
+                'item2_name': f"{section_b.section_number}: {section_b.subject}",
+                'text_similarity': similarity
+            })
+
+    results.sort(key=lambda x: x['text_similarity'], reverse=True)
+    return results
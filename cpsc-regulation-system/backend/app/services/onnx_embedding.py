@@ -0,0 +1,126 @@
+"""
+ONNX Runtime Embedding Backend for CFR Agentic AI Application
+Runs the sentence-transformers model exported to ONNX, optionally int8-quantized
+"""
+
+import os
+from typing import List, Union
+
+import numpy as np
+
+from app.config import EMBEDDING_ONNX_DIR, EMBEDDING_MAX_SEQ_LENGTH
+
+# Model inputs in the order of BertModel.forward
+ONNX_INPUT_NAMES = ('input_ids', 'attention_mask', 'token_type_ids')
+
+
+def onnx_model_dir(model_name: str, model_dir: str = EMBEDDING_ONNX_DIR) -> str:
+    """Directory holding the exported model and tokenizer for a model name"""
+    return os.path.join(model_dir, model_name.replace('/', '__'))
+
+
+def export_onnx_model(model_name: str, target_dir: str, quantize: bool = True) -> str:
+    """
+    Export a sentence-transformers model to ONNX
+
+    Writes the tokenizer, model.onnx (fp32) and, with quantize, model.int8.onnx
+    with dynamically quantized int8 weights. Needs torch and transformers;
+    running the exported model only needs onnxruntime and a tokenizer.
+
+    Args:
+        model_name: Hugging Face model name, e.g. sentence-transformers/all-MiniLM-L6-v2
+        target_dir: Directory to write to
+        quantize: Also write the int8 model
+
+    Returns:
+        Path of the model to run (int8 if quantize)
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(target_dir, exist_ok=True)
+    fp32_path = os.path.join(target_dir, 'model.onnx')
+    int8_path = os.path.join(target_dir, 'model.int8.onnx')
+
+    if not os.path.exists(fp32_path):
+        print(f"  Exporting {model_name} to ONNX...")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        tokenizer.save_pretrained(target_dir)
+        model = AutoModel.from_pretrained(model_name).eval()
+        example = tokenizer(['An example regulation section.'], return_tensors='pt')
+        input_names = [name for name in ONNX_INPUT_NAMES if name in example]
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']}
+        with torch.no_grad():
+            torch.onnx.export(
+                model, tuple(example[name] for name in input_names), fp32_path,
+                input_names=input_names, output_names=['last_hidden_state'],
+                dynamic_axes=dynamic_axes, opset_version=14
+            )
+
+    if not quantize:
+        return fp32_path
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        print("  Quantizing ONNX model weights to int8...")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+class OnnxSentenceEncoder:
+    """
+    Sentence encoder running an exported model with onnxruntime
+
+    Reproduces the all-MiniLM-L6-v2 sentence-transformers pipeline (mean
+    pooling over the attention mask, then L2 normalization) and offers the
+    parts of the SentenceTransformer interface EmbeddingService uses:
+    encode(), tokenizer and max_seq_length. The model is exported on first
+    use if the directory has no export yet.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = True,
+                 model_dir: str = EMBEDDING_ONNX_DIR, max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        target_dir = onnx_model_dir(model_name, model_dir)
+        model_path = os.path.join(target_dir, 'model.int8.onnx' if quantize else 'model.onnx')
+        if not os.path.exists(model_path):
+            model_path = export_onnx_model(model_name, target_dir, quantize)
+
+        options = onnxruntime.SessionOptions()
+        # Honour the thread cap set for embedding worker processes
+        threads = int(os.environ.get('OMP_NUM_THREADS', 0))
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        # Hidden size, fixed in the export (the batch and sequence axes are dynamic)
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+        self.tokenizer = AutoTokenizer.from_pretrained(target_dir)
+        self.max_seq_length = max_seq_length
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True,
+                                 max_length=self.max_seq_length, return_tensors='np')
+        inputs = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, inputs)[0]
+        mask = inputs['attention_mask'][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               convert_to_numpy: bool = True, show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Encode sentences into normalized float32 embeddings
+
+        Sentences are encoded longest first, as SentenceTransformer does, so
+        each batch pads little; results are returned in input order.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            embeddings[batch] = self._encode_batch([texts[i] for i in batch])
+        return embeddings[0] if single else embeddings
@@ -13,11 +13,11 @@ from app.models.cfr_database import (
     ChapterEmbedding, SubchapterEmbedding, SectionEmbedding,
     SessionLocal
 )
-from app.services.embedding_service import EmbeddingService
-from app.config import TOP_K_RESULTS
+from app.services.embedding_service import embedding_service
+from app.services.embedding_store import embedding_store
+from app.services.ann_index import get_index_for
+from app.config import TOP_K_RESULTS, HIERARCHICAL_BRANCHES, HIERARCHICAL_PARTS_PER_BRANCH
 
-# Create embedding service instance
-embedding_service = EmbeddingService()
 
 
 class RAGService:
@@ -26,7 +26,8 @@ class RAGService:
         self.top_k = TOP_K_RESULTS
     
     def query_database(self, query: str, level: str, db: Session, 
-                      top_k: int = None) -> List[Dict[str, Any]]:
+                      top_k: int = None, search_mode: str = 'auto',
+                      nprobe: int = None, branches: int = None) -> List[Dict[str, Any]]:
         """
         Query the database using semantic search
         
@@ -35,6 +36,11 @@ class RAGService:
             level: One of 'chapter', 'subchapter', 'section', 'all'
             db: Database session
             top_k: Number of top results to return (default: TOP_K_RESULTS)
+            search_mode: 'auto' (ANN index when available), 'ann', 'exact' or
+                'hierarchical' (subchapter -> part -> section) for section search
+            nprobe: ANN lists scanned per query; higher trades latency for recall
+            branches: Subchapter branches kept in hierarchical mode
+                (default: HIERARCHICAL_BRANCHES)
             
         Returns:
             List of relevant items with similarity scores
@@ -57,7 +63,10 @@ class RAGService:
             results.extend(subchapter_results)
         
         if level in ['section', 'all']:
-            section_results = self._search_sections(query_embedding, db, top_k)
+            section_results = self._search_sections(
+                query_embedding, db, top_k, search_mode=search_mode,
+                nprobe=nprobe, branches=branches
+            )
             results.extend(section_results)
         
         # Sort by similarity and return top-k
@@ -68,97 +77,100 @@ class RAGService:
     def _search_chapters(self, query_embedding: List[float], db: Session, 
                         top_k: int) -> List[Dict[str, Any]]:
         """Search chapters for relevant content"""
-        results = []
+        store = embedding_store.get_level('chapter', db)
         
-        chapters = db.query(Chapter).all()
-        for chapter in chapters:
-            emb = db.query(ChapterEmbedding).filter(
-                ChapterEmbedding.chapter_id == chapter.id
-            ).first()
-            
-            if emb:
-                similarity = embedding_service.compute_similarity(
-                    query_embedding,
-                    emb.embedding
-                )
-                
-                results.append({
-                    'type': 'chapter',
-                    'id': chapter.id,
-                    'name': chapter.name,
-                    'similarity_score': similarity,
-                    'content': chapter.name
-                })
-        
-        return results
+        return [
+            self._format_chapter(store, row, similarity)
+            for row, similarity in store.search(query_embedding, top_k)
+        ]
     
     def _search_subchapters(self, query_embedding: List[float], db: Session,
                            top_k: int) -> List[Dict[str, Any]]:
         """Search subchapters for relevant content"""
-        results = []
+        store = embedding_store.get_level('subchapter', db)
         
-        subchapters = db.query(Subchapter).all()
-        for subchapter in subchapters:
-            emb = db.query(SubchapterEmbedding).filter(
-                SubchapterEmbedding.subchapter_id == subchapter.id
-            ).first()
-            
-            if emb:
-                similarity = embedding_service.compute_similarity(
-                    query_embedding,
-                    emb.embedding
-                )
-                
-                results.append({
-                    'type': 'subchapter',
-                    'id': subchapter.id,
-                    'name': subchapter.name,
-                    'chapter_name': subchapter.chapter.name,
-                    'similarity_score': similarity,
-                    'content': f"{subchapter.chapter.name} - {subchapter.name}"
-                })
-        
-        return results
+        return [
+            self._format_subchapter(store, row, similarity)
+            for row, similarity in store.search(query_embedding, top_k)
+        ]
     
     def _search_sections(self, query_embedding: List[float], db: Session,
-                        top_k: int) -> List[Dict[str, Any]]:
+                        top_k: int, search_mode: str = 'auto',
+                        nprobe: int = None, branches: int = None) -> List[Dict[str, Any]]:
         """Search sections for relevant content"""
-        results = []
+        store = embedding_store.get_level('section', db)
         
-        sections = db.query(Section).all()
-        for section in sections:
-            emb = db.query(SectionEmbedding).filter(
-                SectionEmbedding.section_id == section.id
-            ).first()
-            
-            if emb:
-                similarity = embedding_service.compute_similarity(
-                    query_embedding,
-                    emb.embedding
-                )
-                
-                # Get part and hierarchy info
-                part = section.part
-                subchapter = part.subchapter if part else None
-                chapter = subchapter.chapter if subchapter else None
-                
-                results.append({
-                    'type': 'section',
-                    'id': section.id,
-                    'section_number': section.section_number,
-                    'subject': section.subject,
-                    'text': section.text,
-                    'citation': section.citation,
-                    'section_label': section.section_label,
-                    'part_heading': part.heading if part else '',
-                    'subchapter_name': subchapter.name if subchapter else '',
-                    'chapter_name': chapter.name if chapter else '',
-                    'similarity_score': similarity,
-                    'content': f"{section.section_number}: {section.subject}\n{section.text}"
-                })
+        if search_mode == 'hierarchical':
+            hits = store.hierarchical_search(
+                query_embedding, top_k,
+                branches=branches or HIERARCHICAL_BRANCHES,
+                parts_per_branch=HIERARCHICAL_PARTS_PER_BRANCH
+            )
+        else:
+            index = get_index_for(store, search_mode)
+            hits = index.search(store, query_embedding, top_k, nprobe=nprobe)
+        
+        # Section text is not kept resident; fetch it for the hits only
+        texts = self._load_section_texts([int(store.ids[row]) for row, _ in hits], db)
+        
+        results = []
+        for row, similarity in hits:
+            result = self._format_section(store, row, similarity, texts)
+            result['content'] = f"{result['section_number']}: {result['subject']}\n{result['text']}"
+            results.append(result)
         
         return results
     
+    def _load_section_texts(self, section_ids: List[int], db: Session) -> Dict[int, str]:
+        """Fetch section text for a set of section ids in one query"""
+        if not section_ids:
+            return {}
+        
+        rows = db.query(Section.id, Section.text).filter(Section.id.in_(section_ids)).all()
+        return {section_id: text for section_id, text in rows}
+    
+    def _format_chapter(self, store, row: int, similarity: float) -> Dict[str, Any]:
+        """Build a chapter result from a resident store row"""
+        meta = store.metadata[row]
+        return {
+            'type': 'chapter',
+            'id': int(store.ids[row]),
+            'name': meta['name'],
+            'similarity_score': similarity,
+            'content': meta['name']
+        }
+    
+    def _format_subchapter(self, store, row: int, similarity: float) -> Dict[str, Any]:
+        """Build a subchapter result from a resident store row"""
+        meta = store.metadata[row]
+        return {
+            'type': 'subchapter',
+            'id': int(store.ids[row]),
+            'name': meta['name'],
+            'chapter_name': meta['chapter_name'],
+            'similarity_score': similarity,
+            'content': f"{meta['chapter_name']} - {meta['name']}"
+        }
+    
+    def _format_section(self, store, row: int, similarity: float,
+                        texts: Dict[int, str]) -> Dict[str, Any]:
+        """Build a section result from a resident store row"""
+        meta = store.metadata[row]
+        section_id = int(store.ids[row])
+        return {
+            'type': 'section',
+            'id': section_id,
+            'section_number': meta['section_number'],
+            'subject': meta['subject'],
+            'text': texts.get(section_id),
+            'citation': meta['citation'],
+            'section_label': meta['section_label'],
+            'part_heading': meta['part_heading'],
+            'subchapter_name': meta['subchapter_name'],
+            'chapter_name': meta['chapter_name'],
+            'similarity_score': similarity
+        }
+    
     def find_similar_by_name(self, name: str, search_type: str, db: Session,
                             top_k: int = None) -> List[Dict[str, Any]]:
         """
@@ -236,6 +248,7 @@ class RAGService:
         
         elif search_type == 'section':
             item = db.query(Section).filter(
+                Section.removed_at.is_(None),
                 or_(
                     Section.section_number.ilike(f"%{name}%"),
                     Section.subject.ilike(f"%{name}%")
@@ -258,91 +271,24 @@ class RAGService:
         
         return None
     
-    def _find_similar_items(self, target_embedding: str, search_type: str,
+    def _find_similar_items(self, target_embedding: bytes, search_type: str,
                            db: Session, exclude_id: int, top_k: int) -> List[Dict[str, Any]]:
         """Find similar items based on embedding similarity"""
-        results = []
+        if search_type not in ('chapter', 'subchapter', 'section'):
+            return []
         
-        if search_type == 'chapter':
-            chapters = db.query(Chapter).filter(Chapter.id != exclude_id).all()
-            
-            for chapter in chapters:
-                emb = db.query(ChapterEmbedding).filter(
-                    ChapterEmbedding.chapter_id == chapter.id
-                ).first()
-                
-                if emb:
-                    similarity = embedding_service.compute_similarity(
-                        target_embedding,
-                        emb.embedding
-                    )
-                    
-                    results.append({
-                        'type': 'chapter',
-                        'id': chapter.id,
-                        'name': chapter.name,
-                        'similarity_score': similarity
-                    })
+        store = embedding_store.get_level(search_type, db)
+        query_vec = embedding_service.to_numpy(target_embedding)
+        hits = store.search(query_vec, top_k, exclude_id=exclude_id)
         
-        elif search_type == 'subchapter':
-            subchapters = db.query(Subchapter).filter(Subchapter.id != exclude_id).all()
-            
-            for subchapter in subchapters:
-                emb = db.query(SubchapterEmbedding).filter(
-                    SubchapterEmbedding.subchapter_id == subchapter.id
-                ).first()
-                
-                if emb:
-                    similarity = embedding_service.compute_similarity(
-                        target_embedding,
-                        emb.embedding
-                    )
-                    
-                    results.append({
-                        'type': 'subchapter',
-                        'id': subchapter.id,
-                        'name': subchapter.name,
-                        'chapter_name': subchapter.chapter.name,
-                        'similarity_score': similarity
-                    })
-        
-        elif search_type == 'section':
-            sections = db.query(Section).filter(Section.id != exclude_id).all()
-            
-            for section in sections:
-                emb = db.query(SectionEmbedding).filter(
-                    SectionEmbedding.section_id == section.id
-                ).first()
-                
-                if emb:
-                    similarity = embedding_service.compute_similarity(
-                        target_embedding,
-                        emb.embedding
-                    )
-                    
-                    # Get hierarchy info
-                    part = section.part
-                    subchapter = part.subchapter if part else None
-                    chapter = subchapter.chapter if subchapter else None
-                    
-                    results.append({
-                        'type': 'section',
-                        'id': section.id,
-                        'section_number': section.section_number,
-                        'subject': section.subject,
-                        'text': section.text,
-                        'citation': section.citation,
-                        'section_label': section.section_label,
-                        'part_heading': part.heading if part else '',
-                        'subchapter_name': subchapter.name if subchapter else '',
-                        'chapter_name': chapter.name if chapter else '',
-                        'similarity_score': similarity
-                    })
+        if search_type == 'chapter':
+            return [self._format_chapter(store, row, similarity) for row, similarity in hits]
         
-        # Sort by similarity and return top-k
-        results.sort(key=lambda x: x['similarity_score'], reverse=True)
+        if search_type == 'subchapter':
+            return [self._format_subchapter(store, row, similarity) for row, similarity in hits]
         
-        return results[:top_k]
+        texts = self._load_section_texts([int(store.ids[row]) for row, _ in hits], db)
+        return [self._format_section(store, row, similarity, texts) for row, similarity in hits]
     
     def get_context_for_query(self, query: str, db: Session,
                              max_context_items: int = 5) -> str:
@@ -0,0 +1,237 @@
+"""
+Similarity Engine for CFR Agentic AI Application
+Blocked, thresholded all-pairs cosine similarity over an embedding matrix
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from app.config import SIMILARITY_TILE_MEMORY_MB
+
+
+def tile_size_for_budget(memory_mb: float = SIMILARITY_TILE_MEMORY_MB) -> int:
+    """
+    Largest square tile whose float32 score block fits in the memory budget
+
+    Args:
+        memory_mb: Memory budget for one tile of scores, in megabytes
+
+    Returns:
+        Tile edge length in rows
+    """
+    return max(1, int(np.sqrt(memory_mb * 1024 * 1024 / 4)))
+
+
+def iter_tiles(n: int, tile_size: int) -> Iterator[Tuple[int, int, int, int]]:
+    """Yield (row_start, row_end, col_start, col_end) for upper-triangle tiles of an n x n matrix"""
+    for row_start in range(0, n, tile_size):
+        row_end = min(row_start + tile_size, n)
+        for col_start in range(row_start, n, tile_size):
+            yield row_start, row_end, col_start, min(col_start + tile_size, n)
+
+
+def similar_pairs_in_tile(matrix: np.ndarray, tile: Tuple[int, int, int, int],
+                          threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Score one tile and keep pairs at or above the threshold
+
+    Args:
+        matrix: L2-normalized embedding matrix
+        tile: (row_start, row_end, col_start, col_end)
+        threshold: Minimum cosine similarity to keep
+
+    Returns:
+        Tuple of (row indices, column indices, scores) with row < column
+    """
+    row_start, row_end, col_start, col_end = tile
+    scores = matrix[row_start:row_end] @ matrix[col_start:col_end].T
+
+    mask = scores >= threshold
+    if row_start == col_start:
+        # Diagonal tile: keep the strict upper triangle only
+        mask &= np.triu(np.ones(mask.shape, dtype=bool), k=1)
+
+    rows, cols = np.nonzero(mask)
+    return rows + row_start, cols + col_start, scores[rows, cols]
+
+
+def iter_similar_pairs(matrix: np.ndarray, threshold: float,
+                       memory_mb: float = SIMILARITY_TILE_MEMORY_MB,
+                       progress_callback: Optional[Callable[[int, int], None]] = None
+                       ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Stream the sparse set of pairs at or above the threshold, one tile at a time
+
+    Args:
+        matrix: L2-normalized embedding matrix
+        threshold: Minimum cosine similarity to keep
+        memory_mb: Memory budget for one tile of scores
+        progress_callback: Optional callable(tiles_done, total_tiles)
+
+    Yields:
+        (row indices, column indices, scores) for each tile with any hits
+    """
+    tiles = list(iter_tiles(len(matrix), tile_size_for_budget(memory_mb)))
+    for done, tile in enumerate(tiles, 1):
+        rows, cols, scores = similar_pairs_in_tile(matrix, tile, threshold)
+        if progress_callback:
+            progress_callback(done, len(tiles))
+        if len(rows):
+            yield rows, cols, scores
+
+
+def iter_similar_pairs_for_rows(matrix: np.ndarray, query_rows: np.ndarray, threshold: float,
+                                memory_mb: float = SIMILARITY_TILE_MEMORY_MB,
+                                progress_callback: Optional[Callable[[int, int], None]] = None
+                                ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Stream pairs at or above the threshold that involve at least one of the query rows
+
+    Used by incremental analysis to score (changed x all) instead of all
+    pairs. A pair of two query rows is produced once, and every pair is
+    returned as (lower row, higher row) like iter_similar_pairs.
+
+    Args:
+        matrix: L2-normalized embedding matrix
+        query_rows: Matrix rows to score against every row
+        threshold: Minimum cosine similarity to keep
+        memory_mb: Memory budget for one tile of scores
+        progress_callback: Optional callable(tiles_done, total_tiles)
+
+    Yields:
+        (row indices, column indices, scores) for each tile with any hits
+    """
+    query_rows = np.unique(np.asarray(query_rows, dtype=np.int64))
+    is_query = np.zeros(len(matrix), dtype=bool)
+    is_query[query_rows] = True
+
+    tile_size = tile_size_for_budget(memory_mb)
+    tiles = [
+        (q_start, min(q_start + tile_size, len(query_rows)), col_start, min(col_start + tile_size, len(matrix)))
+        for q_start in range(0, len(query_rows), tile_size)
+        for col_start in range(0, len(matrix), tile_size)
+    ]
+    for done, (q_start, q_end, col_start, col_end) in enumerate(tiles, 1):
+        block_rows = query_rows[q_start:q_end]
+        scores = matrix[block_rows] @ matrix[col_start:col_end].T
+
+        q_idx, c_idx = np.nonzero(scores >= threshold)
+        rows, cols = block_rows[q_idx], c_idx + col_start
+        # Query x query pairs are seen from both sides; keep the one with row < column
+        keep = (rows != cols) & (~is_query[cols] | (rows < cols))
+        rows, cols, hits = rows[keep], cols[keep], scores[q_idx[keep], c_idx[keep]]
+
+        if progress_callback:
+            progress_callback(done, len(tiles))
+        if len(rows):
+            yield np.minimum(rows, cols), np.maximum(rows, cols), hits
+
+
+def _merge_pairs(parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+                 dtype: np.dtype) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Concatenate per-tile results into one sparse result ordered by (row, column)"""
+    parts = [part for part in parts if len(part[0])]
+    if not parts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=dtype)
+    rows, cols, scores = (np.concatenate(arrays) for arrays in zip(*parts))
+    order = np.lexsort((cols, rows))
+    return rows[order], cols[order], scores[order]
+
+
+def _score_tile(matrix_path: str, tile: Tuple[int, int, int, int],
+                threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Worker entry point: score one tile against the memory-mapped matrix"""
+    matrix = np.load(matrix_path, mmap_mode='r')
+    return similar_pairs_in_tile(matrix, tile, threshold)
+
+
+def iter_similar_pairs_parallel(matrix: np.ndarray, threshold: float,
+                                memory_mb: float = SIMILARITY_TILE_MEMORY_MB,
+                                workers: int = 2,
+                                progress_callback: Optional[Callable[[int, int], None]] = None
+                                ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Stream pairs like iter_similar_pairs, scoring the tiles in worker processes
+
+    The matrix is written once to a temporary .npy file that every worker
+    memory-maps, so it is shared through the page cache instead of being
+    pickled to each process. At most two tiles per worker are in flight,
+    so a slow consumer holds back the workers rather than letting finished
+    tiles pile up; the pairs held at once stay bounded by the tile budget
+    even with a threshold of -1. Tiles are yielded as they complete, not
+    in matrix order.
+
+    Args:
+        matrix: L2-normalized embedding matrix
+        threshold: Minimum cosine similarity to keep
+        memory_mb: Memory budget for one tile of scores (per worker)
+        workers: Number of worker processes
+        progress_callback: Optional callable(tiles_done, total_tiles)
+
+    Yields:
+        (row indices, column indices, scores) for each tile with any hits
+    """
+    tiles = list(iter_tiles(len(matrix), tile_size_for_budget(memory_mb)))
+    if workers <= 1 or len(tiles) <= 1:
+        yield from iter_similar_pairs(matrix, threshold, memory_mb, progress_callback)
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix="cfr_similarity_")
+    try:
+        matrix_path = os.path.join(tmp_dir, "embeddings.npy")
+        np.save(matrix_path, np.ascontiguousarray(matrix))
+
+        pending_tiles = iter(tiles)
+        with ProcessPoolExecutor(max_workers=min(workers, len(tiles))) as executor:
+            def submit(count: int) -> set:
+                return {executor.submit(_score_tile, matrix_path, tile, threshold)
+                        for tile in islice(pending_tiles, count)}
+
+            in_flight = submit(workers * 2)
+            done_count = 0
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                in_flight |= submit(len(done))
+                for future in done:
+                    rows, cols, scores = future.result()
+                    done_count += 1
+                    if progress_callback:
+                        progress_callback(done_count, len(tiles))
+                    if len(rows):
+                        yield rows, cols, scores
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def compute_similar_pairs(matrix: np.ndarray, threshold: float,
+                          memory_mb: float = SIMILARITY_TILE_MEMORY_MB,
+                          workers: int = 1,
+                          progress_callback: Optional[Callable[[int, int], None]] = None
+                          ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    All pairs (i < j) with cosine similarity at or above the threshold
+
+    With workers > 1 the upper-triangle tiles are scored in a
+    ProcessPoolExecutor (see iter_similar_pairs_parallel). Every pair is
+    held in memory at once; callers that can consume pairs incrementally
+    should use the iterators instead.
+
+    Args:
+        matrix: L2-normalized embedding matrix
+        threshold: Minimum cosine similarity to keep
+        memory_mb: Memory budget for one tile of scores (per worker)
+        workers: Number of worker processes
+        progress_callback: Optional callable(tiles_done, total_tiles)
+
+    Returns:
+        Tuple of (row indices, column indices, scores) as parallel arrays,
+        ordered by (row, column)
+    """
+    parts = list(iter_similar_pairs_parallel(matrix, threshold, memory_mb, workers, progress_callback))
+    return _merge_pairs(parts, matrix.dtype)
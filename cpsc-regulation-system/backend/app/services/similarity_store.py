@@ -0,0 +1,220 @@
+"""
+Similarity Result Store for CFR Agentic AI Application
+Bulk, run-partitioned persistence of pairwise similarity results
+"""
+
+import hashlib
+import numpy as np
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import insert, delete, select, func, literal
+
+from app.models.cfr_database import SimilarityRun, SimilarityResult
+from app.config import SIMILARITY_WRITE_CHUNK_SIZE, SIMILARITY_RUNS_TO_KEEP
+
+
+class SimilarityResultWriter:
+    """
+    Streams pairs into similarity_results with batched Core inserts
+
+    Each write() call is split into chunks of chunk_size rows and sent as a
+    single executemany INSERT, so no ORM objects are created per pair.
+    """
+
+    def __init__(self, db: Session, run_id: int, item_type: str, item_ids: np.ndarray,
+                 overlap_threshold: float, redundancy_threshold: float,
+                 chunk_size: int = SIMILARITY_WRITE_CHUNK_SIZE):
+        self.db = db
+        self.run_id = run_id
+        self.item_type = item_type
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.overlap_threshold = overlap_threshold
+        self.redundancy_threshold = redundancy_threshold
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        self._statement = insert(SimilarityResult.__table__)
+
+    def write(self, rows: np.ndarray, cols: np.ndarray, scores: np.ndarray):
+        """
+        Insert a batch of pairs
+
+        Args:
+            rows: Matrix row of the first item of each pair
+            cols: Matrix row of the second item of each pair
+            scores: Cosine similarity of each pair
+        """
+        created_at = datetime.utcnow()
+        for start in range(0, len(rows), self.chunk_size):
+            end = start + self.chunk_size
+            item1_ids = self.item_ids[rows[start:end]].tolist()
+            item2_ids = self.item_ids[cols[start:end]].tolist()
+            chunk_scores = scores[start:end].tolist()
+
+            self.db.execute(self._statement, [
+                {
+                    'run_id': self.run_id,
+                    'item1_type': self.item_type,
+                    'item1_id': item1_id,
+                    'item2_type': self.item_type,
+                    'item2_id': item2_id,
+                    'similarity_score': score,
+                    'is_overlap': score >= self.overlap_threshold,
+                    'is_redundant': score >= self.redundancy_threshold,
+                    'created_at': created_at
+                }
+                for item1_id, item2_id, score in zip(item1_ids, item2_ids, chunk_scores)
+            ])
+            self.rows_written += len(chunk_scores)
+
+
+# Digest length per vector in a run snapshot
+DIGEST_SIZE = 8
+
+# Ids per statement when deleting by item, kept under SQLite's variable limit
+DELETE_CHUNK_SIZE = 500
+
+
+def vector_digests(matrix: np.ndarray) -> bytes:
+    """Packed fixed-size digests of each matrix row, used to detect changed vectors"""
+    return b''.join(
+        hashlib.blake2b(row.tobytes(), digest_size=DIGEST_SIZE).digest() for row in matrix
+    )
+
+
+def run_snapshot(run: SimilarityRun) -> Optional[Dict[int, bytes]]:
+    """Map item id -> vector digest for the items a run analysed, or None if it has no snapshot"""
+    if not run.item_ids or run.item_digests is None:
+        return None
+    item_ids = np.frombuffer(run.item_ids, dtype='<i8').tolist()
+    digests = run.item_digests
+    return {
+        item_id: digests[k * DIGEST_SIZE:(k + 1) * DIGEST_SIZE]
+        for k, item_id in enumerate(item_ids)
+    }
+
+
+def start_run(db: Session, level: str, similarity_threshold: float,
+              persist_threshold: float, item_ids: np.ndarray = None,
+              item_digests: bytes = None, embedding_fingerprint: int = None,
+              mode: str = 'full', base_run_id: int = None) -> SimilarityRun:
+    """
+    Create the run record that partitions this analysis' results
+
+    Args:
+        db: Database session
+        level: One of 'chapter', 'subchapter', 'section'
+        similarity_threshold: Threshold used for reported pairs
+        persist_threshold: Lowest score written to similarity_results
+        item_ids: Ids of the analysed items, stored as the run snapshot
+        item_digests: vector_digests() of their vectors, parallel to item_ids
+        embedding_fingerprint: Embedding-set version the run was computed from
+        mode: 'full' or 'incremental'
+        base_run_id: Run an incremental run carries unchanged pairs over from
+
+    Returns:
+        The new SimilarityRun, flushed so its id is available
+    """
+    run = SimilarityRun(
+        level=level,
+        status='running',
+        similarity_threshold=similarity_threshold,
+        persist_threshold=persist_threshold,
+        mode=mode,
+        base_run_id=base_run_id,
+        embedding_fingerprint=embedding_fingerprint,
+        item_ids=None if item_ids is None else np.asarray(item_ids, dtype='<i8').tobytes(),
+        item_digests=item_digests
+    )
+    db.add(run)
+    db.flush()
+    return run
+
+
+def carry_over_results(db: Session, base_run_id: int, run_id: int,
+                       stale_item_ids: Iterable[int]) -> int:
+    """
+    Copy a previous run's pairs into a new run, minus pairs touching stale items
+
+    Pairs are copied with a single INSERT ... SELECT inside the database,
+    then pairs involving changed or deleted items are retired by id.
+
+    Returns:
+        Number of pairs carried over
+    """
+    table = SimilarityResult.__table__
+    columns = [column.name for column in table.columns if column.name not in ('id', 'run_id')]
+
+    db.execute(insert(table).from_select(
+        ['run_id'] + columns,
+        select(literal(run_id), *[table.c[name] for name in columns]).where(table.c.run_id == base_run_id)
+    ))
+
+    stale_item_ids = sorted(set(stale_item_ids))
+    for start in range(0, len(stale_item_ids), DELETE_CHUNK_SIZE):
+        chunk = stale_item_ids[start:start + DELETE_CHUNK_SIZE]
+        db.execute(delete(SimilarityResult).where(
+            SimilarityResult.run_id == run_id,
+            SimilarityResult.item1_id.in_(chunk) | SimilarityResult.item2_id.in_(chunk)
+        ))
+
+    return db.query(func.count(SimilarityResult.id)).filter(SimilarityResult.run_id == run_id).scalar()
+
+
+def finish_run(db: Session, run: SimilarityRun, pair_count: int, status: str = 'completed'):
+    """Mark a run finished and drop superseded runs for the same level"""
+    run.status = status
+    run.pair_count = pair_count
+    run.completed_at = datetime.utcnow()
+    db.flush()
+    if status == 'completed':
+        drop_old_runs(db, run.level, keep=SIMILARITY_RUNS_TO_KEEP)
+
+
+def drop_old_runs(db: Session, level: str, keep: int = SIMILARITY_RUNS_TO_KEEP) -> int:
+    """
+    Delete all but the newest `keep` completed runs for a level, with their results
+
+    Results are deleted by the indexed run_id, so dropping a run is a single
+    range delete rather than a scan of the table.
+
+    Returns:
+        Number of runs dropped
+    """
+    completed = db.query(SimilarityRun.id).filter(
+        SimilarityRun.level == level,
+        SimilarityRun.status == 'completed'
+    ).order_by(SimilarityRun.id.desc()).all()
+    stale_ids = [run_id for (run_id,) in completed[keep:]]
+
+    # Failed runs and legacy (pre-run) rows are never read once a run completes
+    stale_ids += [run_id for (run_id,) in db.query(SimilarityRun.id).filter(
+        SimilarityRun.level == level,
+        SimilarityRun.status == 'error'
+    ).all()]
+
+    if stale_ids:
+        db.execute(delete(SimilarityResult).where(SimilarityResult.run_id.in_(stale_ids)))
+        db.execute(delete(SimilarityRun).where(SimilarityRun.id.in_(stale_ids)))
+    db.execute(delete(SimilarityResult).where(
+        SimilarityResult.run_id.is_(None),
+        SimilarityResult.item1_type == level
+    ))
+    return len(stale_ids)
+
+
+def latest_run(db: Session, level: str) -> Optional[SimilarityRun]:
+    """Newest completed run for a level, or None if there is none"""
+    return db.query(SimilarityRun).filter(
+        SimilarityRun.level == level,
+        SimilarityRun.status == 'completed'
+    ).order_by(SimilarityRun.id.desc()).first()
+
+
+def latest_run_id(db: Session, level: str) -> Optional[int]:
+    """Id of the newest completed run for a level, or None if there is none"""
+    row = db.query(SimilarityRun.id).filter(
+        SimilarityRun.level == level,
+        SimilarityRun.status == 'completed'
+    ).order_by(SimilarityRun.id.desc()).first()
+    return row[0] if row else None
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Migrate embedding tables in cfr_data.db from JSON text to packed float32 BLOBs
+
+Older databases store every embedding as a JSON array in a TEXT column.
+This tool rebuilds chapter_embeddings, subchapter_embeddings and
+section_embeddings with a BLOB column holding little-endian float32 values
+(the format written by app.services.embedding_service.pack_embedding),
+then VACUUMs the file to reclaim the freed pages.
+
+Usage:
+    python migrate_embeddings.py [path/to/cfr_data.db] [--batch-size N]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import BASE_DIR
+
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+# table name -> (foreign key column, parent table)
+EMBEDDING_TABLES = {
+    'chapter_embeddings': ('chapter_id', 'chapters'),
+    'subchapter_embeddings': ('subchapter_id', 'subchapters'),
+    'section_embeddings': ('section_id', 'sections'),
+}
+
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
+
+
+def _needs_migration(conn: sqlite3.Connection, table: str) -> bool:
+    """A table needs migrating if the column is not declared BLOB or any row still holds text"""
+    columns = {row[1]: (row[2] or '').upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+    if columns.get('embedding') != 'BLOB':
+        return True
+    row = conn.execute(
+        f"SELECT 1 FROM {table} WHERE typeof(embedding) != 'blob' LIMIT 1"
+    ).fetchone()
+    return row is not None
+
+
+def _to_blob(value) -> bytes:
+    """Convert a stored embedding (JSON text or BLOB) to packed float32 bytes"""
+    if isinstance(value, bytes):
+        return value
+    return np.asarray(json.loads(value), dtype=EMBEDDING_DTYPE).tobytes()
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    """
+    Explicit transaction on an autocommit connection
+
+    sqlite3 in its default mode commits DDL such as ALTER TABLE and CREATE
+    TABLE outside the transaction it opens for DML, so `with conn:` cannot
+    roll back a table rebuild. SQLite itself supports transactional DDL.
+    """
+    conn.execute("BEGIN")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _legacy_table(table: str) -> str:
+    return f"{table}_json_legacy"
+
+
+def restore_legacy_table(conn: sqlite3.Connection, table: str) -> bool:
+    """
+    Put back a table left renamed by an interrupted migration
+
+    Earlier versions of this tool committed the rename before the rows were
+    converted, so a failure could leave the data in {table}_json_legacy
+    next to an empty or partial {table}. Returns True if a table was restored.
+    """
+    legacy_table = _legacy_table(table)
+    if not _table_exists(conn, legacy_table):
+        return False
+    with _transaction(conn):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"ALTER TABLE {legacy_table} RENAME TO {table}")
+    return True
+
+
+def migrate_table(conn: sqlite3.Connection, table: str, batch_size: int = 1000) -> int:
+    """
+    Rebuild one embedding table with a BLOB column, returning the number of rows converted
+
+    Must run inside a transaction (see _transaction), so a failed conversion
+    leaves the table as it was.
+    """
+    fk_column, parent_table = EMBEDDING_TABLES[table]
+    legacy_table = _legacy_table(table)
+
+    conn.execute(f"ALTER TABLE {table} RENAME TO {legacy_table}")
+    conn.execute(f"""
+        CREATE TABLE {table} (
+            id INTEGER NOT NULL PRIMARY KEY,
+            {fk_column} INTEGER NOT NULL REFERENCES {parent_table} (id),
+            embedding BLOB NOT NULL,
+            created_at DATETIME
+        )
+    """)
+
+    converted = 0
+    cursor = conn.execute(f"SELECT id, {fk_column}, embedding, created_at FROM {legacy_table}")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        conn.executemany(
+            f"INSERT INTO {table} (id, {fk_column}, embedding, created_at) VALUES (?, ?, ?, ?)",
+            [(row_id, fk, _to_blob(value), created_at) for row_id, fk, value, created_at in rows]
+        )
+        converted += len(rows)
+        print(f"    {converted} rows converted")
+
+    conn.execute(f"DROP TABLE {legacy_table}")
+    return converted
+
+
+def migrate_database(db_path: str, batch_size: int = 1000) -> dict:
+    """Migrate every embedding table in db_path, returning per-table row counts"""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Database not found: {db_path}")
+
+    size_before = os.path.getsize(db_path)
+    results = {}
+
+    # Autocommit mode, so transactions are only those opened by _transaction
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        for table in EMBEDDING_TABLES:
+            if restore_legacy_table(conn, table):
+                print(f"  [WARNING] {table}: restored from {_legacy_table(table)} left by an interrupted migration")
+            if not _table_exists(conn, table):
+                print(f"  [SKIP] {table}: table does not exist")
+                continue
+            if not _needs_migration(conn, table):
+                print(f"  [SKIP] {table}: already stored as float32 BLOBs")
+                continue
+
+            print(f"  Migrating {table}...")
+            with _transaction(conn):
+                results[table] = migrate_table(conn, table, batch_size)
+            print(f"  [OK] {table}: {results[table]} rows")
+
+        if results:
+            print("  Reclaiming space (VACUUM)...")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    size_after = os.path.getsize(db_path)
+    print(f"  Database size: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('db_path', nargs='?', default=os.path.join(BASE_DIR, 'cfr_data.db'),
+                        help="Path to cfr_data.db (default: backend/cfr_data.db)")
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help="Rows converted per INSERT batch")
+    args = parser.parse_args()
+
+    print("Migrating embeddings to float32 BLOB storage")
+    print("=" * 50)
+    try:
+        migrate_database(args.db_path, args.batch_size)
+        print("\n[OK] Migration completed")
+    except Exception as e:
+        print(f"\n[ERROR] Migration failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test persisting the ANN index and matching it to the resident embeddings
+
+Builds an IVF-flat index over a resident section matrix loaded from a
+temporary SQLite database, saves and reloads it, and checks that
+get_index_for serves it only while the embedding generation it was built
+from is current.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+N_SECTIONS = 400
+DIMENSION = 32
+
+
+def volume(n_sections):
+    """Parsed volume with n_sections sections spread over four parts"""
+    parts = [{'heading': f'PART {1000 + p}—PART {1000 + p}', 'sections': [
+        {'section_number': f'§ {1000 + p}.{k}', 'subject': f'Subject {k}', 'text': f'Text {p}.{k}',
+         'citation': '', 'section_label': ''}
+        for k in range(p, n_sections, 4)
+    ]} for p in range(4)]
+    return {'title': '16', 'chapters': [{
+        'chapter_name': 'CHAPTER II—CONSUMER PRODUCT SAFETY COMMISSION',
+        'subchapters': [{'subchapter_name': 'SUBCHAPTER B—CONSUMER PRODUCT SAFETY ACT REGULATIONS',
+                         'parts': parts}]
+    }]}
+
+
+def test_ann_index():
+    """Run the save/load/match checks, returning True if they pass"""
+    print("=" * 70)
+    print("  ANN INDEX ROUND-TRIP TEST")
+    print("=" * 70)
+
+    from app.models.cfr_database import Base, SectionEmbedding
+    from app.pipeline.bulk_loader import HierarchyUpserter
+    from app.services.ann_index import build_index, load_index, get_index_for
+    from app.services.embedding_store import EmbeddingStore, bump_embedding_generation
+
+    work_dir = tempfile.mkdtemp(prefix="cfr_ann_test_")
+    engine = create_engine(f"sqlite:///{os.path.join(work_dir, 'ann.db')}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    index_path = os.path.join(work_dir, 'indexes', 'section_ivf_flat.npz')
+    rng = np.random.default_rng(0)
+
+    def add_embeddings(db, section_ids):
+        db.add_all(SectionEmbedding(section_id=section_id,
+                                    embedding=rng.standard_normal(DIMENSION).astype('<f4').tobytes())
+                   for section_id in section_ids)
+        db.flush()
+        bump_embedding_generation(db, 'section')
+        db.commit()
+
+    db = Session()
+    try:
+        upserter = HierarchyUpserter(db)
+        section_ids = upserter.upsert([volume(N_SECTIONS)])
+        upserter.finish()
+        add_embeddings(db, section_ids[:-1])
+
+        # Test 1: Save and load keep the resident matrix's fingerprint
+        print("\n[1/3] Building, saving and loading the index...")
+        store = EmbeddingStore().get_level('section', db)
+        assert isinstance(store.fingerprint, int), f"fingerprint {store.fingerprint!r} is not an int"
+        index = build_index(store, n_lists=8)
+        index.save(index_path)
+        loaded = load_index(index_path)
+        assert loaded.fingerprint == store.fingerprint, (loaded.fingerprint, store.fingerprint)
+        assert np.array_equal(loaded.list_ids, index.list_ids) and loaded.n_lists == 8
+        print(f"  ✓ {len(store)} vectors in {loaded.n_lists} lists, fingerprint {loaded.fingerprint}")
+
+        # Test 2: The saved index serves queries against the same embeddings
+        print("\n[2/3] Matching the index to the current embeddings...")
+        served = get_index_for(store, 'auto', path=index_path)
+        assert served is loaded, f"got {served.kind} index"
+        row = len(store) // 2
+        results = served.search(store, store.matrix[row], top_k=5, nprobe=8)
+        assert results[0][0] == row and abs(results[0][1] - 1.0) < 1e-5, results[:2]
+        assert get_index_for(store, 'exact', path=index_path).kind == 'exact'
+        print("  ✓ Persisted index served; a vector finds itself first")
+
+        # Test 3: New embeddings make the saved index stale
+        print("\n[3/3] Adding an embedding...")
+        add_embeddings(db, section_ids[-1:])
+        current = EmbeddingStore().get_level('section', db)
+        assert current.fingerprint != store.fingerprint and len(current) == len(store) + 1
+        assert get_index_for(current, 'ann', path=index_path).kind == 'exact', "stale index served"
+        print("  ✓ Stale index ignored; exact search used")
+
+        print("\n" + "=" * 70)
+        print("  ✅ ALL TESTS PASSED!")
+        print("=" * 70)
+        return True
+
+    except Exception as e:
+        print(f"\n  ❌ TEST FAILED: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        db.close()
+        engine.dispose()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_ann_index() else 1)
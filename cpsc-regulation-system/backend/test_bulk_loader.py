@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test the natural-key upsert of parsed CFR volumes
+
+Loads small parsed volumes into a temporary SQLite database with
+HierarchyUpserter and checks re-loads, edits, removals, revivals,
+repeated section numbers and volumes that failed to parse.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def section(number, text):
+    return {'section_number': number, 'subject': f'Subject {number}', 'text': text,
+            'citation': '', 'section_label': ''}
+
+
+def volume(title, part, sections):
+    """Parsed volume holding one part"""
+    return {'title': title, 'chapters': [{
+        'chapter_name': 'CHAPTER II—CONSUMER PRODUCT SAFETY COMMISSION',
+        'subchapters': [{'subchapter_name': 'SUBCHAPTER B—CONSUMER PRODUCT SAFETY ACT REGULATIONS',
+                         'parts': [{'heading': f'PART {part}—PART {part}', 'sections': sections}]}]
+    }]}
+
+
+def volume_one(text_1=None, with_2=True):
+    sections = [section('§ 1000.1', text_1 or 'Original text of 1000.1')]
+    if with_2:
+        sections.append(section('§ 1000.2', 'Text of 1000.2'))
+    # Repeated numbers, as with several reserved sections in one part
+    sections += [section('§ 1000.9', '[Reserved]'), section('§ 1000.9', '[Reserved]')]
+    return volume('16', 1000, sections)
+
+
+def volume_two():
+    return volume('16', 1001, [section('§ 1001.1', 'Text of 1001.1'), section('§ 1001.2', 'Text of 1001.2')])
+
+
+def test_bulk_loader():
+    """Run all upsert checks, returning True if they pass"""
+    print("=" * 70)
+    print("  NATURAL-KEY UPSERT TEST")
+    print("=" * 70)
+
+    from app.models.cfr_database import Base, Section, SectionEmbedding
+    from app.pipeline.bulk_loader import HierarchyUpserter
+
+    work_dir = tempfile.mkdtemp(prefix="cfr_upsert_test_")
+    engine = create_engine(f"sqlite:///{os.path.join(work_dir, 'upsert.db')}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    def load(volumes, incomplete_titles=()):
+        """Upsert volumes, embed the returned sections and commit; returns (counts, section IDs)"""
+        db = Session()
+        try:
+            upserter = HierarchyUpserter(db, incomplete_titles=incomplete_titles)
+            section_ids = upserter.upsert(volumes)
+            counts = upserter.finish()
+            db.add_all(SectionEmbedding(section_id=section_id, embedding=b'\0' * 4) for section_id in section_ids)
+            db.commit()
+            return counts, section_ids
+        finally:
+            db.close()
+
+    def active():
+        """Natural key -> (id, has embedding) of every active section"""
+        db = Session()
+        try:
+            embedded = {section_id for (section_id,) in db.query(SectionEmbedding.section_id)}
+            return {key: (row_id, row_id in embedded) for row_id, key in
+                    db.query(Section.id, Section.natural_key).filter(Section.removed_at.is_(None))}
+        finally:
+            db.close()
+
+    try:
+        # Test 1: Initial load, with distinct keys for repeated section numbers
+        print("\n[1/6] Loading two volumes...")
+        counts, section_ids = load([volume_one(), volume_two()])
+        loaded = active()
+        assert counts['sections_inserted'] == 6 and len(section_ids) == 6, counts
+        assert '16|1000|§ 1000.9' in loaded and '16|1000|§ 1000.9#2' in loaded, sorted(loaded)
+        assert all(embedded for _, embedded in loaded.values()), "section without an embedding"
+        print("  ✓ 6 sections inserted; repeated section numbers got distinct keys")
+
+        # Test 2: Re-loading the same data writes nothing
+        print("\n[2/6] Re-loading unchanged volumes...")
+        counts, section_ids = load([volume_one(), volume_two()])
+        assert section_ids == [] and counts['sections_unchanged'] == 6, counts
+        assert counts['sections_updated'] == counts['sections_removed'] == counts['sections_inserted'] == 0, counts
+        assert active() == loaded, "re-load changed stored sections"
+        print("  ✓ All sections unchanged; nothing rewritten or re-embedded")
+
+        # Test 3: An edited section is rewritten in place and its embedding dropped
+        print("\n[3/6] Editing one section...")
+        db = Session()
+        stale = db.query(SectionEmbedding.id).filter(
+            SectionEmbedding.section_id == loaded['16|1000|§ 1000.1'][0]).scalar()
+        db.close()
+        counts, section_ids = load([volume_one(text_1='Amended text of 1000.1'), volume_two()])
+        assert counts['sections_updated'] == 1 and section_ids == [loaded['16|1000|§ 1000.1'][0]], counts
+        db = Session()
+        assert db.get(SectionEmbedding, stale) is None, "stale embedding kept"
+        assert db.get(Section, section_ids[0]).text == 'Amended text of 1000.1'
+        db.close()
+        print("  ✓ Edited section kept its ID, was rewritten and queued for re-embedding")
+
+        # Test 4: A section missing from its title is tombstoned
+        print("\n[4/6] Removing one section...")
+        counts, _ = load([volume_one(text_1='Amended text of 1000.1', with_2=False), volume_two()])
+        after = active()
+        assert counts['sections_removed'] == 1 and '16|1000|§ 1000.2' not in after, counts
+        db = Session()
+        removed_id = loaded['16|1000|§ 1000.2'][0]
+        assert db.get(Section, removed_id).removed_at is not None, "removed section not tombstoned"
+        assert db.query(SectionEmbedding).filter(SectionEmbedding.section_id == removed_id).count() == 0
+        db.close()
+        print("  ✓ Removed section tombstoned and its embedding deleted")
+
+        # Test 5: A section that reappears is revived under its old ID
+        print("\n[5/6] Reviving the removed section...")
+        counts, section_ids = load([volume_one(text_1='Amended text of 1000.1'), volume_two()])
+        revived = active()
+        assert counts['sections_updated'] == 1 and section_ids == [removed_id], (counts, section_ids)
+        assert revived['16|1000|§ 1000.2'] == (removed_id, True), revived['16|1000|§ 1000.2']
+        print("  ✓ Section untombstoned with its original ID and re-embedded")
+
+        # Test 6: A title with a failed volume is not tombstoned
+        print("\n[6/6] Loading a title with a volume that failed to parse...")
+        counts, _ = load([volume_one(text_1='Amended text of 1000.1')], incomplete_titles={'16'})
+        assert counts['sections_removed'] == 0, counts
+        assert active() == revived, "sections of the failed volume lost"
+        print("  ✓ Sections of the failed volume kept with their embeddings")
+
+        print("\n" + "=" * 70)
+        print("  ✅ ALL TESTS PASSED!")
+        print("=" * 70)
+        return True
+
+    except Exception as e:
+        print(f"\n  ❌ TEST FAILED: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        engine.dispose()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_bulk_loader() else 1)
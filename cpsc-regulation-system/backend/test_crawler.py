@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Test the bulk-data downloader against a local HTTP stand-in for govinfo.gov
+
+Covers streaming to disk, resuming with HTTP Range after a dropped
+connection, servers that ignore Range, size verification and concurrent
+downloads, plus the download cache's conditional re-fetching and offline
+mode. No network access is needed.
+"""
+import io
+import hashlib
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_zip(name, size):
+    """Build an in-memory ZIP holding one XML file of roughly `size` bytes"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        archive.writestr(name, b'<CFRGRANULE>' + os.urandom(size) + b'</CFRGRANULE>')
+    return buffer.getvalue()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves server.files; behaviour per path is set in server.modes:
+      'range'    honour Range requests (default)
+      'drop'     honour Range, but cut the first response off half way
+      'no-range' ignore Range and always send the whole body
+      'short'    advertise more bytes than are sent
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        mode = self.server.modes.get(self.path, 'range')
+        self.server.requests.append((self.path, self.headers.get('Range')))
+
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header and mode != 'no-range':
+            start = int(range_header.split('=')[1].split('-')[0])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(body)}')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+        else:
+            self.send_response(200)
+
+        payload = body[start:]
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(payload) + (10 if mode == 'short' else 0)))
+        self.end_headers()
+
+        if mode == 'drop' and not self.server.dropped.get(self.path):
+            self.server.dropped[self.path] = True
+            self.wfile.write(payload[:len(payload) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(payload)
+
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.files, server.modes, server.dropped, server.requests = {}, {}, {}, []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_downloader():
+    """Run all downloader checks, returning True if they pass"""
+    print("=" * 70)
+    print("  BULK-DATA DOWNLOADER TEST")
+    print("=" * 70)
+
+    import requests
+    from app.pipeline.crawler import download_file, download_and_extract_all, DownloadError
+
+    server = start_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    work_dir = tempfile.mkdtemp(prefix="cfr_crawler_test_")
+
+    try:
+        # Test 1: Plain streamed download
+        print("\n[1/6] Streaming a download to disk...")
+        server.files['/plain.zip'] = make_zip('plain.xml', 200_000)
+        path = download_file(f"{base_url}/plain.zip", os.path.join(work_dir, 'plain.zip'), chunk_size=4096)
+        assert open(path, 'rb').read() == server.files['/plain.zip'], "content differs"
+        assert not os.path.exists(path + '.part'), ".part file left behind"
+        print("  ✓ Downloaded file matches the served bytes")
+
+        # Test 2: Resume with Range after a dropped connection
+        print("\n[2/6] Resuming after a dropped connection...")
+        server.files['/drop.zip'] = make_zip('drop.xml', 300_000)
+        server.modes['/drop.zip'] = 'drop'
+        path = download_file(f"{base_url}/drop.zip", os.path.join(work_dir, 'drop.zip'), chunk_size=4096)
+        assert open(path, 'rb').read() == server.files['/drop.zip'], "content differs after resume"
+        ranges = [r for p, r in server.requests if p == '/drop.zip']
+        assert ranges[0] is None and ranges[-1] and ranges[-1].startswith('bytes='), f"no Range resume: {ranges}"
+        print(f"  ✓ Resumed with '{ranges[-1]}' and completed")
+
+        # Test 3: Resume a .part file left by an earlier run; restart if Range is ignored
+        print("\n[3/6] Continuing a .part file from a previous run...")
+        for name, mode in (('resume.zip', 'range'), ('norange.zip', 'no-range')):
+            server.files[f'/{name}'] = make_zip(name, 100_000)
+            server.modes[f'/{name}'] = mode
+            dest = os.path.join(work_dir, name)
+            with open(dest + '.part', 'wb') as part:
+                part.write(server.files[f'/{name}'][:1000])
+            download_file(f"{base_url}/{name}", dest)
+            assert open(dest, 'rb').read() == server.files[f'/{name}'], f"{name} content differs"
+        print("  ✓ Partial file resumed, and restarted when the server ignored Range")
+
+        # Test 4: Size verification
+        print("\n[4/6] Rejecting a truncated download...")
+        server.files['/short.zip'] = make_zip('short.xml', 10_000)
+        server.modes['/short.zip'] = 'short'
+        rejected = False
+        try:
+            download_file(f"{base_url}/short.zip", os.path.join(work_dir, 'short.zip'), retries=0)
+        except (DownloadError, requests.RequestException):
+            rejected = True
+        assert rejected, "truncated download was accepted"
+        assert not os.path.exists(os.path.join(work_dir, 'short.zip')), "truncated file was published"
+        print("  ✓ Size mismatch detected and the file was not published")
+
+        # Test 5: Concurrent download and extraction
+        print("\n[5/6] Downloading several archives concurrently...")
+        urls = []
+        for k in range(4):
+            server.files[f'/CFR-2025-title-{k}.zip'] = make_zip(f'CFR-2025-title{k}-vol1.xml', 50_000)
+            urls.append(f"{base_url}/CFR-2025-title-{k}.zip")
+        urls.append(f"{base_url}/missing.zip")
+        extract_dir = os.path.join(work_dir, 'extracted')
+        results = download_and_extract_all(urls, extract_dir, max_workers=4)
+        assert [url for url, _, _ in results] == urls, "results not in input order"
+        assert all(error is None for _, error, _ in results[:4]), results
+        assert results[4][1] is not None, "missing archive did not report an error"
+        for k in range(4):
+            assert os.path.exists(os.path.join(extract_dir, f'CFR-2025-title{k}-vol1.xml'))
+        print("  ✓ Archives extracted; the failing URL was reported without stopping the others")
+
+        # Test 6: Download cache with conditional requests and offline mode
+        print("\n[6/6] Re-fetching through the download cache...")
+        from app.pipeline.download_cache import DownloadCache
+        cache = DownloadCache(os.path.join(work_dir, 'cache'))
+        cache_dir = os.path.join(work_dir, 'cached')
+        url = f"{base_url}/CFR-2025-title-0.zip"
+        first = download_and_extract_all([url], cache_dir, cache=cache)
+        second = download_and_extract_all([url], cache_dir, cache=cache)
+        assert first[0][1:] == (None, True) and second[0][1:] == (None, False), (first, second)
+        assert server.requests[-1] == ('/CFR-2025-title-0.zip', None)
+
+        server.files['/CFR-2025-title-0.zip'] = make_zip('CFR-2025-title0-vol1.xml', 50_000)
+        third = download_and_extract_all([url], cache_dir, cache=cache)
+        assert third[0][1:] == (None, True), third
+        entry = DownloadCache(cache.cache_dir).get(url)
+        assert entry and entry['sha256'] == hashlib.sha256(server.files['/CFR-2025-title-0.zip']).hexdigest()
+        blobs = sum(len(files) for _, _, files in os.walk(cache.objects_dir))
+        assert blobs == 1, f"superseded archive kept ({blobs} blobs)"
+
+        requests_before = len(server.requests)
+        os.remove(os.path.join(cache_dir, 'CFR-2025-title0-vol1.xml'))
+        offline = download_and_extract_all([url, f"{base_url}/uncached.zip"], cache_dir, cache=cache, offline=True)
+        assert offline[0][1:] == (None, True) and isinstance(offline[1][1], DownloadError), offline
+        assert len(server.requests) == requests_before, "offline mode contacted the server"
+        print("  ✓ 304 skipped extraction, new content re-extracted, offline mode served from the cache")
+
+        print("\n" + "=" * 70)
+        print("  ✅ ALL TESTS PASSED!")
+        print("=" * 70)
+        return True
+
+    except Exception as e:
+        print(f"\n  ❌ TEST FAILED: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_downloader() else 1)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Check that the ONNX embedding backends agree with the PyTorch backend
+
+Encodes sample CFR sections with SentenceTransformer, with the fp32 ONNX
+export and with the int8-quantized export, and compares the vectors by
+cosine similarity. Also reports encoding speed. The first run exports the
+model to EMBEDDING_ONNX_DIR, which needs torch, transformers, onnx and
+onnxruntime, plus network access to fetch the model.
+"""
+import os
+import sys
+import time
+import importlib.util
+
+import numpy as np
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Minimum cosine similarity to the PyTorch embedding of the same text
+MIN_COSINE = {'onnx': 0.999, 'onnx-int8': 0.98}
+
+SAMPLE_SECTIONS = [
+    "Scope. This part prescribes requirements for children's toys intended for use by children under 3 years of age.",
+    "Definitions. As used in this part, small part means any object which fits entirely within the cylinder shown in figure 1.",
+    "Cribs shall meet the requirements of ASTM F1169-19, Standard Consumer Safety Specification for Full-Size Baby Cribs.",
+    "The manufacturer shall maintain records of testing for a period of five years and make them available upon request.",
+    "Labeling. Each product shall bear a permanent label stating the name of the manufacturer and the date of manufacture.",
+    "Test for flammability of clothing textiles; specimens are exposed to a flame for one second and the burn time recorded.",
+    "Bicycle helmets must not exceed a peak acceleration of 300 g when tested on any anvil at specified impact velocities.",
+    "Lead content. Paint and similar surface coatings shall not contain lead in excess of 0.009 percent of the total weight.",
+    "Reserved.",
+    "Effective date. This regulation is effective on January 1, 2025 and applies to products manufactured after that date.",
+]
+
+
+def missing_modules():
+    modules = ('torch', 'transformers', 'sentence_transformers', 'onnx', 'onnxruntime')
+    return [name for name in modules if importlib.util.find_spec(name) is None]
+
+
+def encode_timed(service, texts):
+    start = time.perf_counter()
+    embeddings = np.asarray(service.generate_embeddings(texts, batch_size=32), dtype=np.float32)
+    return embeddings, time.perf_counter() - start
+
+
+def test_embedding_backends():
+    print("=" * 70)
+    print("  EMBEDDING BACKEND PARITY TEST")
+    print("=" * 70)
+
+    missing = missing_modules()
+    if missing:
+        print(f"\n  ⚠️  Skipped: {', '.join(missing)} not installed")
+        return True
+
+    try:
+        from app.services.embedding_service_original import EmbeddingService
+
+        # Repeat the samples so the timing covers more than one batch
+        texts = SAMPLE_SECTIONS * 20
+
+        print("\n[1] PyTorch backend")
+        reference, reference_seconds = encode_timed(EmbeddingService(use_cache=False, backend='torch'), texts)
+        print(f"  ✓ {len(texts)} texts in {reference_seconds:.2f}s")
+
+        for step, (variant, quantize) in enumerate((('onnx', False), ('onnx-int8', True)), 2):
+            print(f"\n[{step}] {variant} backend")
+            service = EmbeddingService(use_cache=False, backend='onnx', quantize=quantize)
+            embeddings, seconds = encode_timed(service, texts)
+            assert embeddings.shape == reference.shape, f"shape {embeddings.shape} != {reference.shape}"
+
+            cosines = np.sum(embeddings * reference, axis=1) / (
+                np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference, axis=1)
+            )
+            print(f"  ✓ {len(texts)} texts in {seconds:.2f}s ({reference_seconds / seconds:.1f}x PyTorch)")
+            print(f"  ✓ Cosine to PyTorch: min {cosines.min():.5f}, mean {cosines.mean():.5f}")
+            assert cosines.min() >= MIN_COSINE[variant], \
+                f"{variant} cosine {cosines.min():.5f} below {MIN_COSINE[variant]}"
+
+            # Nearest neighbours among the distinct samples should not change between backends
+            unique = len(SAMPLE_SECTIONS)
+            neighbours = lambda matrix: np.argsort(-(matrix[:unique] @ matrix[:unique].T), axis=1)[:, 1]
+            assert np.array_equal(neighbours(embeddings), neighbours(reference)), \
+                f"{variant} changes nearest neighbours"
+            print("  ✓ Nearest neighbours match PyTorch")
+
+        print("\n" + "=" * 70)
+        print("  ✅ ALL TESTS PASSED!")
+        print("=" * 70)
+        return True
+
+    except Exception as e:
+        print(f"\n  ❌ TEST FAILED: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_embedding_backends() else 1)
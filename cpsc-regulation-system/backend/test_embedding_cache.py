@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test the persistent embedding cache
+
+Embeds texts through an EmbeddingCache backed by a temporary SQLite
+database and counts what reaches the encoder: repeated and
+whitespace-variant texts are encoded once, cached texts not at all, and
+an unreadable cache falls back to encoding everything.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_embedding_cache():
+    """Run all cache checks, returning True if they pass"""
+    print("=" * 70)
+    print("  EMBEDDING CACHE TEST")
+    print("=" * 70)
+
+    from app.models.embedding_cache_database import Base
+    from app.services.embedding_service import EmbeddingService
+    from app.services import embedding_cache as cache_module
+    from app.services.embedding_cache import EmbeddingCache
+
+    work_dir = tempfile.mkdtemp(prefix="cfr_cache_test_")
+    engine = create_engine(f"sqlite:///{os.path.join(work_dir, 'embedding_cache.db')}")
+
+    # Point the cache at the temporary database
+    original = cache_module.SessionLocal, cache_module.init_embedding_cache_db
+    cache_module.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    cache_module.init_embedding_cache_db = lambda: Base.metadata.create_all(bind=engine)
+
+    service = EmbeddingService(use_cache=False)
+    encoded = []
+
+    def encode(texts):
+        encoded.extend(texts)
+        return service.generate_embeddings(texts)
+
+    try:
+        texts = ["Scope of this part.", "Definitions.", "Scope  of\nthis part.", "Definitions.", "Labeling."]
+        cache = EmbeddingCache()
+
+        # Test 1: Each distinct normalized text is encoded once
+        print("\n[1/4] Embedding with an empty cache...")
+        first = cache.embed('model-a', texts, encode)
+        assert encoded == ["Scope of this part.", "Definitions.", "Labeling."], encoded
+        assert first[0] == first[2] and first[1] == first[3], "whitespace variants or repeats differ"
+        assert cache.hits == 0 and cache.misses == 5, (cache.hits, cache.misses)
+        print("  ✓ 5 texts, 3 encoded; repeats and whitespace variants share an entry")
+
+        # Test 2: A second cache instance reads everything from the database
+        print("\n[2/4] Embedding the same texts again...")
+        encoded.clear()
+        cache = EmbeddingCache()
+        second = cache.embed('model-a', texts, encode)
+        assert encoded == [] and cache.hits == 5, (encoded, cache.hits)
+        assert np.array_equal(np.float32(second), np.float32(first)), "cached embeddings differ"
+        print("  ✓ Nothing encoded; cached vectors identical")
+
+        # Test 3: Another model namespace never sees these entries
+        print("\n[3/4] Embedding under another model name...")
+        encoded.clear()
+        cache.embed('model-b', texts[:2], encode)
+        assert encoded == texts[:2], encoded
+        print("  ✓ Entries are not shared between models")
+
+        # Test 4: An unreadable cache falls back to the encoder
+        print("\n[4/4] Embedding with the cache database unavailable...")
+        broken = create_engine(f"sqlite:///{os.path.join(work_dir, 'missing', 'cache.db')}")
+        cache_module.SessionLocal = sessionmaker(bind=broken)
+        cache_module.init_embedding_cache_db = lambda: None
+        encoded.clear()
+        fallback = EmbeddingCache().embed('model-a', texts, encode)
+        assert encoded == texts and fallback == service.generate_embeddings(texts), encoded
+        broken.dispose()
+        print("  ✓ Every text encoded without the cache")
+
+        print("\n" + "=" * 70)
+        print("  ✅ ALL TESTS PASSED!")
+        print("=" * 70)
+        return True
+
+    except Exception as e:
+        print(f"\n  ❌ TEST FAILED: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        cache_module.SessionLocal, cache_module.init_embedding_cache_db = original
+        engine.dispose()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_embedding_cache() else 1)
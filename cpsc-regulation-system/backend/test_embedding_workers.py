@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test encoding embeddings in worker processes
+
+Encodes texts with the mock embedding service in-process and through
+embedding_worker_pool, and checks that the pooled vectors match and come
+back in input order, and that workers rebuild the parent's service.
+"""
+import os
+import sys
+
+import numpy as np
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+class RecordingService:
+    """Records the arguments a worker constructs its service with"""
+    def __init__(self, model_name, use_cache=True, backend='torch', quantize=True):
+        self.args = (model_name, use_cache, backend, quantize)
+
+
+def test_embedding_workers():
+    """Run all worker pool checks, returning True if they pass"""
+    print("=" * 70)
+    print("  EMBEDDING WORKER POOL TEST")
+    print("=" * 70)
+
+    from app.services import embedding_workers
+    from app.services.embedding_service import EmbeddingService
+    from app.services.embedding_workers import embedding_worker_pool
+
+    try:
+        service = EmbeddingService(use_cache=False)
+        # Not a multiple of the worker count, so the last shard is short
+        texts = [f"Section {k}. " + "Requirements for consumer products. " * (k % 7) for k in range(101)]
+        expected = np.asarray(service.generate_embeddings(texts), dtype=np.float32)
+
+        # Test 1: Pooled vectors match in-process encoding, in input order
+        print("\n[1/3] Encoding with three worker processes...")
+        with embedding_worker_pool(service, workers=3, threads=1):
+            assert service.executor is not None, "pool not attached"
+            pooled = np.asarray(service.generate_embeddings(texts, batch_size=16), dtype=np.float32)
+            empty = service.executor.encode([])
+        assert service.executor is None, "pool left attached"
+        assert pooled.shape == expected.shape and np.allclose(pooled, expected, atol=1e-6), "vectors differ"
+        assert empty.shape == (0, service.dimension), empty.shape
+        print(f"  ✓ {len(texts)} texts match in-process encoding")
+
+        # Test 2: One worker encodes in-process
+        print("\n[2/3] Encoding with one worker...")
+        with embedding_worker_pool(service, workers=1):
+            assert service.executor is None, "pool created for one worker"
+        print("  ✓ No pool for a single worker")
+
+        # Test 3: Workers build the service with the parent's constructor arguments
+        print("\n[3/3] Building a worker's service...")
+        embedding_workers._init_worker(RecordingService, 'model-a', {'backend': 'onnx', 'quantize': False}, 1)
+        assert embedding_workers._worker_service.args == ('model-a', False, 'onnx', False), \
+            embedding_workers._worker_service.args
+        print("  ✓ Backend and quantization passed through; worker cache disabled")
+
+        print("\n" + "=" * 70)
+        print("  ✅ ALL TESTS PASSED!")
+        print("=" * 70)
+        return True
+
+    except Exception as e:
+        print(f"\n  ❌ TEST FAILED: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_embedding_workers() else 1)
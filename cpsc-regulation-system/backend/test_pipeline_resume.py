@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test resuming a pipeline run after a failed stage
+
+Runs DataPipeline.run_full_pipeline against a temporary SQLite database
+with the stages replaced by stubs, fails it in the embeddings stage and
+checks that a resumed run continues at that stage with its checkpoint.
+"""
+import os
+import sys
+import shutil
+import tempfile
+from functools import partial
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def stub_stages(pipeline, ran, fail_at=None):
+    """Replace the pipeline's stages with stubs that record their names, failing at fail_at"""
+    def run_stage(stage, metrics=None):
+        ran.append(stage)
+        if stage == 'parse':
+            pipeline.save_checkpoint(parsed_outputs=['title-16-vol1.json'])
+        if stage == fail_at:
+            raise RuntimeError(f"simulated {stage} failure")
+    pipeline.run_stage = run_stage
+
+
+def test_pipeline_resume():
+    """Fail a run, resume it and start a fresh one, returning True if all checks pass"""
+    print("=" * 70)
+    print("  PIPELINE RESUME TEST")
+    print("=" * 70)
+
+    from app.models.cfr_database import Base, PipelineRun
+    from app.pipeline import data_pipeline
+    from app.pipeline.data_pipeline import DataPipeline
+    from app.pipeline.run_store import PIPELINE_STAGES, completed_stages
+
+    work_dir = tempfile.mkdtemp(prefix="cfr_resume_test_")
+    engine = create_engine(f"sqlite:///{os.path.join(work_dir, 'resume.db')}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    # Point the pipeline's run records and reports at the temporary directory
+    original = data_pipeline.SessionLocal, data_pipeline.write_run_report
+    data_pipeline.SessionLocal = Session
+    data_pipeline.write_run_report = partial(data_pipeline.write_run_report, report_dir=work_dir)
+
+    def load_run(run_id):
+        db = Session()
+        try:
+            return db.get(PipelineRun, run_id)
+        finally:
+            db.close()
+
+    try:
+        # Test 1: A failing stage leaves the run unfinished with its completed stages
+        print("\n[1/3] Failing a run in the embeddings stage...")
+        pipeline, ran = DataPipeline(), []
+        stub_stages(pipeline, ran, fail_at='embeddings')
+        try:
+            pipeline.run_full_pipeline()
+            raise AssertionError("run_full_pipeline did not raise")
+        except RuntimeError as e:
+            assert 'simulated embeddings failure' in str(e), e
+        run = load_run(pipeline.run_id)
+        assert run.status == 'error' and 'simulated embeddings failure' in run.error_message, run.status
+        assert completed_stages(run) == ['crawl', 'parse', 'store'], completed_stages(run)
+        assert run.current_stage == 'embeddings', run.current_stage
+        print(f"  ✓ Run {run.id} failed after {', '.join(completed_stages(run))}")
+
+        # Test 2: A new process resumes the run at the failed stage
+        print("\n[2/3] Resuming the failed run...")
+        failed_run_id = run.id
+        pipeline, ran = DataPipeline(), []
+        stub_stages(pipeline, ran)
+        pipeline.run_full_pipeline(resume=True)
+        run = load_run(pipeline.run_id)
+        assert run.id == failed_run_id, f"started run {run.id} instead of resuming {failed_run_id}"
+        assert ran == ['embeddings', 'index', 'statistics'], ran
+        assert run.status == 'completed' and run.resume_count == 1, (run.status, run.resume_count)
+        assert completed_stages(run) == list(PIPELINE_STAGES), completed_stages(run)
+        assert pipeline.checkpoint.get('parsed_outputs') == ['title-16-vol1.json'], pipeline.checkpoint
+        print(f"  ✓ Ran only {', '.join(ran)}; parse checkpoint restored")
+
+        # Test 3: Resuming after a completed run starts a new one
+        print("\n[3/3] Resuming with no unfinished run...")
+        pipeline, ran = DataPipeline(), []
+        stub_stages(pipeline, ran)
+        pipeline.run_full_pipeline(resume=True)
+        assert pipeline.run_id != failed_run_id and ran == list(PIPELINE_STAGES), (pipeline.run_id, ran)
+        assert load_run(pipeline.run_id).status == 'completed'
+        print(f"  ✓ Started run {pipeline.run_id} and ran every stage")
+
+        print("\n" + "=" * 70)
+        print("  ✅ ALL TESTS PASSED!")
+        print("=" * 70)
+        return True
+
+    except Exception as e:
+        print(f"\n  ❌ TEST FAILED: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        data_pipeline.SessionLocal, data_pipeline.write_run_report = original
+        engine.dispose()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_pipeline_resume() else 1)
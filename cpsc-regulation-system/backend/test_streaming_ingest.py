@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test the streaming parse → store → embed ingest
+
+Streams small parsed volumes through run_streaming_ingest into a temporary
+SQLite database, with queues of one item so every stage waits on the next,
+and checks the stored sections and embeddings, a failed volume and a
+failing stage.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Volume file -> (part, number of sections); parse_volume fails for 'broken.xml'
+VOLUMES = {'vol1.xml': (1000, 3), 'vol2.xml': (1001, 4), 'vol3.xml': (1002, 2)}
+
+
+def parse_volume(xml_file, output_dir):
+    """Stand-in for DataPipeline.parse_volume returning (parsed data or None, timing)"""
+    timing = {'volume': xml_file, 'title': '16', 'seconds': 0.0, 'sections': 0, 'error': None}
+    if xml_file not in VOLUMES:
+        timing['error'] = 'XMLSyntaxError: not well-formed'
+        return None, timing
+    part, count = VOLUMES[xml_file]
+    sections = [{'section_number': f'§ {part}.{k}', 'subject': f'Subject {part}.{k}',
+                 'text': f'Text of section {part}.{k}. ' * k, 'citation': '', 'section_label': ''}
+                for k in range(1, count + 1)]
+    timing['sections'] = count
+    return {'title': '16', 'chapters': [{
+        'chapter_name': 'CHAPTER II—CONSUMER PRODUCT SAFETY COMMISSION',
+        'subchapters': [{'subchapter_name': 'SUBCHAPTER B—CONSUMER PRODUCT SAFETY ACT REGULATIONS',
+                         'parts': [{'heading': f'PART {part}—PART {part}', 'sections': sections}]}]
+    }]}, timing
+
+
+class FailingEmbeddingService:
+    """Embedding service whose every call fails"""
+    def generate_embeddings(self, texts, batch_size=32):
+        raise RuntimeError("simulated embedding failure")
+
+
+def test_streaming_ingest():
+    """Run all streaming checks, returning True if they pass"""
+    print("=" * 70)
+    print("  STREAMING INGEST TEST")
+    print("=" * 70)
+
+    from app.models.cfr_database import Base, Section, SectionEmbedding
+    from app.pipeline import bulk_loader, streaming
+    from app.services.embedding_service import EmbeddingService, unpack_embedding
+
+    work_dir = tempfile.mkdtemp(prefix="cfr_streaming_test_")
+    engine = create_engine(f"sqlite:///{os.path.join(work_dir, 'streaming.db')}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    # Point the store and embed stages at the temporary database
+    original = streaming.SessionLocal, bulk_loader.SessionLocal, bulk_loader.engine
+    streaming.SessionLocal = bulk_loader.SessionLocal = Session
+    bulk_loader.engine = engine
+    service = EmbeddingService(use_cache=False)
+
+    def ingest(xml_files, embedding_service=service):
+        return streaming.run_streaming_ingest(
+            xml_files, work_dir, workers=1, parse=parse_volume,
+            embedding_service=embedding_service, queue_size=1, embed_batch_size=2
+        )
+
+    def stored():
+        """Natural key -> (subject and text, embedding or None) of every active section"""
+        db = Session()
+        try:
+            return {key: (f"{subject} {text}", None if embedding is None else unpack_embedding(embedding))
+                    for key, subject, text, embedding in db.query(
+                        Section.natural_key, Section.subject, Section.text, SectionEmbedding.embedding
+                    ).outerjoin(SectionEmbedding, SectionEmbedding.section_id == Section.id
+                    ).filter(Section.removed_at.is_(None))}
+        finally:
+            db.close()
+
+    try:
+        total = sum(count for _, count in VOLUMES.values())
+
+        # Test 1: Every section is stored and embedded once
+        print("\n[1/3] Streaming three volumes...")
+        result = ingest(list(VOLUMES))
+        sections = stored()
+        assert result['sections_inserted'] == result['sections_embedded'] == total, result
+        assert len(sections) == total and result['failed_volumes'] == 0, (len(sections), result)
+        db = Session()
+        assert db.query(SectionEmbedding).count() == total, "duplicate or missing embeddings"
+        db.close()
+        texts = [text for text, _ in sections.values()]
+        expected = np.asarray(service.generate_embeddings(texts), dtype=np.float32)
+        actual = np.stack([embedding for _, embedding in sections.values()])
+        assert np.allclose(actual, expected, atol=1e-6), "embeddings do not match their sections"
+        print(f"  ✓ {total} sections stored, each with its own embedding")
+
+        # Test 2: A volume that fails to parse keeps its stored sections
+        print("\n[2/3] Streaming with a volume that fails to parse...")
+        result = ingest(['vol1.xml', 'broken.xml', 'vol3.xml'])
+        assert result['failed_volumes'] == 1 and result['sections_removed'] == 0, result
+        assert result['sections_embedded'] == 0 and set(stored()) == set(sections), result
+        print("  ✓ Failure counted; sections of the missing volume kept")
+
+        # Test 3: A failing stage stops the others and its error is raised
+        print("\n[3/3] Streaming with a failing embed stage...")
+        VOLUMES['vol4.xml'] = (1003, 5)
+        try:
+            ingest(list(VOLUMES), embedding_service=FailingEmbeddingService())
+            raise AssertionError("run_streaming_ingest did not raise")
+        except RuntimeError as e:
+            assert 'simulated embedding failure' in str(e), e
+        missing = [key for key, (_, embedding) in stored().items() if embedding is None]
+        assert missing and all(key.startswith('16|1003|') for key in missing), missing
+        print(f"  ✓ Error raised; {len(missing)} new sections left for the embeddings stage")
+
+        print("\n" + "=" * 70)
+        print("  ✅ ALL TESTS PASSED!")
+        print("=" * 70)
+        return True
+
+    except Exception as e:
+        print(f"\n  ❌ TEST FAILED: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        VOLUMES.pop('vol4.xml', None)
+        streaming.SessionLocal, bulk_loader.SessionLocal, bulk_loader.engine = original
+        engine.dispose()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_streaming_ingest() else 1)